@@ -1,1102 +1,1422 @@
-#!/usr/bin/env python3
-# coding: utf-8
-"""
-EpiMind — IAAM Predictor (Single-file, Professional, Mobile-friendly)
-UMF "Grigore T. Popa" Iași — Dr. Boghian Lucian
-Version: 2.2.0 — Complete single-file Streamlit application (Analize adăugate)
-
-Această versiune adaugă o secțiune profesională "Analize" cu markeri biologici importanți
-(WBC, Neutrofile, CRP, VSH/ESR, Procalcitonină, Presepsină, Lactat, Hemocultură) și integrează
-acești markeri în motorul de risc IAAM printr-un modul de scor dedicat.
-
-Rulează:
-    streamlit run EpiMind_IAAM_Predictor_Full.py
-"""
-
-from __future__ import annotations
-
-import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-import json
-from datetime import datetime
-from pathlib import Path
-import os
-from typing import Dict, List, Tuple, Any, Optional
-
-# ---------------- App configuration ----------------
-APP_TITLE = "EpiMind — IAAM Predictor"
-APP_ICON = "🏥"
-VERSION = "2.2.0"
-AUDIT_CSV = "epimind_audit.csv"
-EXPORT_DIR = Path("exports")
-EXPORT_DIR.mkdir(exist_ok=True)
-
-st.set_page_config(page_title=APP_TITLE, page_icon=APP_ICON, layout="wide", initial_sidebar_state="collapsed")
-
-# ---------------- Minimal responsive CSS (improved) ----------------
-st.markdown(
-    """
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600;700&display=swap');
-    :root{--bg:#071019;--card:#0f1720;--muted:#9fb0c6;--accent:#1f78d1;--accent-2:#00a859;--danger:#dc2626;}
-    body {background: linear-gradient(180deg,#061018,#08121a) !important; color: #EAF2FF;}
-    .stApp { font-family: 'Inter', sans-serif; }
-    .header { padding:12px; border-radius:10px; background: linear-gradient(90deg, rgba(31,120,209,0.04), rgba(0,168,89,0.02)); margin-bottom:12px; border:1px solid rgba(255,255,255,0.02);}    
-    .title { font-weight:700; font-size:20px; color:#EAF2FF; }
-    .subtitle { color:var(--muted); font-size:13px; margin-top:4px }
-    .card { background: var(--card); border-radius:10px; padding:14px; border:1px solid rgba(255,255,255,0.02); color:#EAF2FF; }
-    .metric { text-align:center; padding:8px; border-radius:8px; background: rgba(255,255,255,0.01); }
-    .metric-value { font-weight:800; font-size:26px; color:var(--accent); }
-    .small-muted { color: var(--muted); font-size:12px; }
-    .risk-alert { padding:12px; border-radius:8px; font-weight:700; margin-bottom:8px; }
-    .risk-critical { background: rgba(220,38,38,0.08); border-left:4px solid var(--danger); color:#fecaca; }
-    .risk-high { background: rgba(245,158,11,0.06); border-left:4px solid #F59E0B; color:#fff4d1; }
-    .risk-moderate { background: rgba(59,130,246,0.05); border-left:4px solid #3B82F6; color:#cfe6ff; }
-    .risk-low { background: rgba(16,185,129,0.05); border-left:4px solid #10B981; color:#d7ffe6; }
-    .muted-box { background: rgba(255,255,255,0.01); border-radius:8px; padding:8px; }
-    @media (max-width: 760px) {
-      .title { font-size:18px; }
-      .metric-value { font-size:20px; }
-      .card { padding:10px; }
-    }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
-
-# ---------------- Domain knowledge (concise but extensible) ----------------
-REZISTENTA_PROFILE = {
-    "Escherichia coli": ["ESBL", "CRE", "AmpC", "NDM-1", "CTX-M"],
-    "Klebsiella pneumoniae": ["ESBL", "CRE", "KPC", "NDM", "OXA-48"],
-    "Pseudomonas aeruginosa": ["MDR", "XDR", "PDR"],
-    "Acinetobacter baumannii": ["OXA-23", "OXA-24", "MDR"],
-    "Staphylococcus aureus": ["MRSA", "VISA"],
-    "Enterococcus faecalis": ["VRE"],
-    "Candida auris": ["Fluconazol-R", "Echinocandin-R"]
-}
-
-ICD_CODES = {
-    "Bacteriemie/Septicemie": "A41.9",
-    "Pneumonie nosocomială": "J15.9",
-    "ITU nosocomială": "N39.0",
-    "Infecție CVC": "T80.2",
-    "Infecție plagă operatorie": "T81.4",
-    "Clostridioides difficile": "A04.7",
-}
-
-# Extensive comorbidity catalogue
-COMORBIDITATI = {
-    "Cardiovascular": {
-        "Hipertensiune arterială": {"Controlată": 3, "Necontrolată": 6, "Criză HTA": 12},
-        "Insuficiență cardiacă": {"NYHA I": 3, "NYHA II": 5, "NYHA III": 10, "NYHA IV": 15},
-        "Cardiopatie ischemică": {"Stabilă": 5, "Instabilă": 10},
-        "Infarct miocardic anterior": 8,
-        "Intervenții coronariene": {"PCI": 5, "CABG": 7},
-        "Aritmii": {"FA paroxistică": 5, "FA permanentă": 7, "TV/TVS": 10},
-        "Valvulopatii semnificative": 8,
-        "Boală arterială periferică": 7,
-        "Tromboembolism venos (ISTORIC)": 6
-    },
-    "Respirator": {
-        "BPOC": {"GOLD I": 3, "GOLD II": 5, "GOLD III": 10, "GOLD IV": 15},
-        "Astm bronșic": {"Controlat": 3, "Parțial controlat": 5, "Necontrolat": 8},
-        "Fibroză pulmonară": 12,
-        "Pneumopatie interstițială": 10,
-        "HTAP (hipertensiune pulmonară)": 12,
-        "Sindrom apnee somn (SAS)": 5,
-        "Bronșiectazii": 7,
-        "Tuberculoză pulmonară (istoric/activ)": {"Istoric": 3, "Activă": 10}
-    },
-    "Metabolic": {
-        "Diabet zaharat": {"Tip 1": 10, "Tip 2 controlat": 5, "Tip 2 necontrolat": 12, "Cu complicații micro/macrovasculare": 15},
-        "Obezitate": {"BMI 25-30": 2, "BMI 30-35": 3, "BMI 35-40": 5, "BMI >40": 8},
-        "Sindrom metabolic": 6,
-        "Dislipidemie": 3,
-        "Steatoză/NAFLD": 4,
-        "Guta/hiperuricemie": 4
-    },
-    "Renal": {
-        "BCR stadiul 1-2": 3,
-        "BCR stadiul 3a": 5,
-        "BCR stadiul 3b": 8,
-        "BCR stadiul 4": 12,
-        "BCR stadiul 5 (insuficiență renală severă)": 15,
-        "Hemodializă": 20,
-        "Dializă peritoneală": 18,
-        "Transplant renal": 15,
-        "Proteinurie/nephropatie diabetică": 8
-    },
-    "Hepatic": {
-        "Steatoză hepatică": 3,
-        "Hepatită cronică B/C": 10,
-        "Ciroză": {"Child A": 8, "Child B": 12, "Child C": 18},
-        "Insuficiență hepatică acută": 20,
-        "Transplant hepatic": 15
-    },
-    "Oncologic": {
-        "Neoplasm solid activ": 15,
-        "Neoplasm metastazat": 25,
-        "Neoplasm hematologic": 18,
-        "Chimioterapie curentă": 20,
-        "Radioterapie (în curs)": 12,
-        "Imunoterapie/terapii biologice": 15,
-        "Neutropenie": {"<1000": 15, "<500": 25, "<100": 35},
-        "Post-TCSH (transplant celule stem)": 25
-    },
-    "Imunologic/Infectios": {
-        "HIV/SIDA": {"CD4>500": 10, "CD4 200-500": 15, "CD4<200": 25},
-        "Transplant organ solid": 18,
-        "Imunosupresie medicamentoasă": {"Corticoterapie": 10, "Imunosupresoare": 15, "Biologice": 12},
-        "Splenectomie": 10,
-        "Deficit imun primar": 20,
-        "Corticoterapie cronică (doses med-high)": 10
-    },
-    "Neurologic": {
-        "AVC recent (<3 luni)": 10,
-        "AVC vechi": 5,
-        "Demență": 8,
-        "Boală Parkinson": 6,
-        "Epilepsie": 5,
-        "Scleroză multiplă": 8,
-        "Leziune medulară/neurologică severă": 12
-    },
-    "Hematologic/Coagulare": {
-        "Anemie moderată": 4,
-        "Anemie severă": 8,
-        "Tulburări de coagulare (hemofilie, VWD)": 10,
-        "Tromboză venoasă profundă activă": 8,
-        "Terapie anticoagulantă cronică": 5,
-        "Hemoglobinopatii (ex. drepanocitoză)": 10
-    },
-    "Endocrin/Alte": {
-        "Boli tiroidiene (hipo/hiper)": 3,
-        "Insuficiență suprarenală": 8,
-        "Sarcină": {"Trimestrul 1": 3, "Trimestrul 2": 4, "Trimestrul 3": 6},
-        "Malnutriție/IMC scăzut": {"Ușoară": 3, "Moderat": 6, "Severă": 10},
-        "Arsuri severe": 15,
-        "Fragilitate/geriatrie": 8
-    }
-}
-
-# ---------------- Calculators (detailed docstrings) ----------------
-
-def calculate_sofa_detailed(data: Dict[str, Any]) -> Tuple[int, Dict[str, int]]:
-    """Calculate an extended SOFA score with component breakdown."""
-    components = {"Respirator": 0, "Coagulare": 0, "Hepatic": 0, "Cardiovascular": 0, "SNC": 0, "Renal": 0}
-    pao2_fio2 = data.get("pao2_fio2", 400)
-    if pao2_fio2 < 400:
-        components["Respirator"] = 1
-    if pao2_fio2 < 300:
-        components["Respirator"] = 2
-    if pao2_fio2 < 200:
-        components["Respirator"] = 3
-    if pao2_fio2 < 100:
-        components["Respirator"] = 4
-
-    platelets = data.get("trombocite", 200)
-    if platelets < 150:
-        components["Coagulare"] = 1
-    if platelets < 100:
-        components["Coagulare"] = 2
-    if platelets < 50:
-        components["Coagulare"] = 3
-    if platelets < 20:
-        components["Coagulare"] = 4
-
-    bilirubin = data.get("bilirubina", 1.0)
-    if bilirubin >= 1.2:
-        components["Hepatic"] = 1
-    if bilirubin >= 2.0:
-        components["Hepatic"] = 2
-    if bilirubin >= 6.0:
-        components["Hepatic"] = 3
-    if bilirubin >= 12.0:
-        components["Hepatic"] = 4
-
-    if data.get("hipotensiune"):
-        components["Cardiovascular"] = max(components["Cardiovascular"], 2)
-    if data.get("vasopresoare"):
-        components["Cardiovascular"] = max(components["Cardiovascular"], 3)
-
-    glasgow = data.get("glasgow", 15)
-    if glasgow < 15:
-        components["SNC"] = 1
-    if glasgow < 13:
-        components["SNC"] = 2
-    if glasgow < 10:
-        components["SNC"] = 3
-    if glasgow < 6:
-        components["SNC"] = 4
-
-    creatinine = data.get("creatinina", 1.0)
-    urine_output = data.get("diureza_ml_kg_h", 1.0)
-    if creatinine >= 1.2 or urine_output < 0.5:
-        components["Renal"] = 1
-    if creatinine >= 2.0:
-        components["Renal"] = 2
-    if creatinine >= 3.5 or urine_output < 0.3:
-        components["Renal"] = 3
-    if creatinine >= 5.0 or urine_output < 0.1:
-        components["Renal"] = 4
-
-    total = sum(components.values())
-    return total, components
-
-
-def calculate_qsofa(data: Dict[str, Any]) -> int:
-    """Compute qSOFA: TAS<100, FR>=22, Glasgow<15"""
-    score = 0
-    tas = data.get("tas", 120)
-    fr = data.get("fr", 18)
-    glasgow = data.get("glasgow", 15)
-    if tas < 100:
-        score += 1
-    if fr >= 22:
-        score += 1
-    if glasgow < 15:
-        score += 1
-    return score
-
-
-def calculate_apache_like(data: Dict[str, Any]) -> int:
-    """A pragmatic APACHE-II-like aggregate (not a substitute for validated APACHE II)."""
-    score = 0
-    temp = data.get("temperatura", 37.0)
-    if temp >= 41 or temp < 30:
-        score += 4
-    elif 39 <= temp < 41:
-        score += 3
-    elif 38.5 <= temp < 39:
-        score += 1
-    elif 34 <= temp < 36:
-        score += 1
-    elif 32 <= temp < 34:
-        score += 2
-
-    mapv = data.get("tam", 70)
-    if mapv >= 160:
-        score += 4
-    elif 130 <= mapv < 160:
-        score += 3
-    elif 110 <= mapv < 130:
-        score += 2
-    elif 50 <= mapv < 70:
-        score += 2
-    elif mapv < 50:
-        score += 4
-
-    hr = data.get("fc", 80)
-    if hr >= 180:
-        score += 4
-    elif 140 <= hr < 180:
-        score += 3
-    elif 110 <= hr < 140:
-        score += 2
-    elif 55 <= hr < 70:
-        score += 2
-    elif 40 <= hr < 55:
-        score += 3
-    elif hr < 40:
-        score += 4
-
-    age = data.get("varsta")
-    if isinstance(age, int):
-        if age >= 75:
-            score += 6
-        elif age >= 65:
-            score += 5
-        elif age >= 55:
-            score += 3
-        elif age >= 45:
-            score += 2
-    return score
-
-
-def analyze_urinary_sediment(date: Dict[str, Any]) -> Tuple[List[str], int]:
-    """Detailed urinary sediment interpretation returning lines of interpretation and a risk % (0-100)."""
-    interp = []
-    risk = 0
-    leu = date.get("leu_urina", 0)
-    ery = date.get("eri_urina", 0)
-    bact = date.get("bact_urina", 0)
-    epit = date.get("cel_epit", 0)
-    nit = date.get("nitriti", False)
-    est = date.get("esteraza", False)
-    cilindri = date.get("cilindri", False)
-    tip = date.get("tip_cilindri", "")
-
-    if leu > 5:
-        interp.append(f"Leucociturie: {leu}/câmp")
-        risk += 20
-        if leu > 10:
-            interp.append("Piurie semnificativă")
-            risk += 15
-    if bact > 0:
-        interp.append(f"Bacteriurie: nivel {bact}")
-        risk += bact * 8
-    if nit:
-        interp.append("Nitriți pozitivi — sugestiv Gram-")
-        risk += 25
-    if est:
-        interp.append("Esterază leucocitară pozitivă")
-        risk += 20
-    if ery > 3:
-        interp.append(f"Hematurie: {ery}/câmp")
-        if ery > 50:
-            interp.append("Hematurie macroscopică — investigații")
-    if cilindri:
-        if "leucoc" in tip.lower():
-            interp.append("Cilindri leucocitari — sugestiv pielonefrită")
-            risk += 30
-        elif "granular" in tip.lower():
-            interp.append("Cilindri granulari — afectare tubulară")
-            risk += 10
-        else:
-            interp.append(f"Cilindri: {tip}")
-            risk += 5
-    if epit > 5:
-        interp.append("Contaminare probabilă (celule epiteliale crescute)")
-        risk = max(0, risk - 10)
-
-    risk = max(0, min(100, int(risk)))
-    return interp, risk
-
-
-def calculate_charlson_like(comorbidities: Dict[str, Dict[str, Any]]) -> int:
-    """Simplified Charlson-like aggregate based on the COMORBIDITATI mapping."""
-    score = 0
-    for cat, conds in (comorbidities or {}).items():
-        for cond, sev in conds.items():
-            mapping = COMORBIDITATI.get(cat, {}).get(cond)
-            pts = 5
-            if isinstance(mapping, dict):
-                pts = mapping.get(sev, 5) if isinstance(sev, str) else 5
-            elif isinstance(mapping, int):
-                pts = mapping
-            try:
-                score += int(pts)
-            except Exception:
-                score += 5
-    return score
-
-# ---------------- Laboratory module (new) ----------------
-
-def score_laboratory_markers(labs: Dict[str, Any]) -> Tuple[int, List[str]]:
-    """
-    Evaluate key laboratory markers and return a numeric lab score plus descriptive lines.
-
-    Markers considered (orientation/pragmatic thresholds):
-      - wbc: leucocite (x10^3/µL)
-      - neut_abs: neutrofile absolute (x10^3/µL)
-      - neut_pct: neutrophils percent
-      - crp: CRP (mg/L)
-      - esr: VSH/ESR (mm/h)
-      - pct: procalcitonin (ng/mL)
-      - presepsin: presepsin (pg/mL)
-      - lactate: lactat (mmol/L)
-      - blood_culture_positive: True/False
-    """
-    score = 0
-    lines: List[str] = []
-
-    if not labs:
-        return 0, ["Fără analize disponibile"]
-
-    # WBC
-    wbc = labs.get('wbc')
-    if wbc is not None:
-        try:
-            w = float(wbc)
-            if w >= 12:
-                score += 10
-                lines.append(f"Leucocitoză: WBC {w} (>12) +10")
-            elif w < 4:
-                score += 10
-                lines.append(f"Leucopenie: WBC {w} (<4) +10")
-            else:
-                lines.append(f"WBC: {w} (normal) +0")
-        except Exception:
-            lines.append(f"WBC: valoare nevalidă: {wbc}")
-
-    # Neutrophils absolute or percent
-    neut_abs = labs.get('neut_abs')
-    neut_pct = labs.get('neut_pct')
-    if neut_abs:
-        try:
-            na = float(neut_abs)
-            if na >= 8:
-                score += 5; lines.append(f"Neutrofilie absolută: {na} (+5)")
-        except Exception:
-            pass
-    elif neut_pct:
-        try:
-            npct = float(neut_pct)
-            if npct >= 80:
-                score += 3; lines.append(f"Neutrofile%: {npct}% (+3)")
-        except Exception:
-            pass
-
-    # CRP
-    crp = labs.get('crp')
-    if crp is not None:
-        try:
-            c = float(crp)
-            if c >= 100:
-                score += 15; lines.append(f"CRP {c} mg/L — mare inflamație (+15)")
-            elif c >= 50:
-                score += 8; lines.append(f"CRP {c} mg/L — moderat (+8)")
-            else:
-                lines.append(f"CRP {c} mg/L — scăzut (+0)")
-        except Exception:
-            lines.append(f"CRP: valoare nevalidă: {crp}")
-
-    # VSH / ESR
-    esr = labs.get('esr')
-    if esr is not None:
-        try:
-            e = float(esr)
-            if e >= 50:
-                score += 6; lines.append(f"VSH {e} mm/h — crescut (+6)")
-            else:
-                lines.append(f"VSH {e} mm/h — normal/moderat (+0)")
-        except Exception:
-            lines.append(f"VSH: valoare nevalidă: {esr}")
-
-    # Procalcitonin
-    pct = labs.get('pct')
-    if pct is not None:
-        try:
-            p = float(pct)
-            if p >= 2.0:
-                score += 20; lines.append(f"Procalcitonină {p} ng/mL — mare probabilitate infecție severă (+20)")
-            elif p >= 0.5:
-                score += 10; lines.append(f"Procalcitonină {p} ng/mL — sugestivă (+10)")
-            else:
-                lines.append(f"Procalcitonină {p} ng/mL — scăzută (+0)")
-        except Exception:
-            lines.append(f"PCT: valoare nevalidă: {pct}")
-
-    # Presepsin (orientativ)
-    presepsin = labs.get('presepsin')
-    if presepsin is not None:
-        try:
-            ps = float(presepsin)
-            if ps >= 600:
-                score += 20; lines.append(f"Presepsină {ps} pg/mL — foarte crescută (+20)")
-            elif ps >= 300:
-                score += 10; lines.append(f"Presepsină {ps} pg/mL — crescută (+10)")
-            else:
-                lines.append(f"Presepsină {ps} pg/mL — normală/negativă (+0)")
-        except Exception:
-            lines.append(f"Presepsină: valoare nevalidă: {presepsin}")
-
-    # Lactate
-    lact = labs.get('lactate')
-    if lact is not None:
-        try:
-            l = float(lact)
-            if l >= 4.0:
-                score += 20; lines.append(f"Lactat {l} mmol/L — hiperlactatemie (+20)")
-            elif l >= 2.0:
-                score += 10; lines.append(f"Lactat {l} mmol/L — ridicat (+10)")
-            else:
-                lines.append(f"Lactat {l} mmol/L — normal (+0)")
-        except Exception:
-            lines.append(f"Lactat: valoare nevalidă: {lact}")
-
-    # Hemocultura
-    hemoc = labs.get('blood_culture_positive')
-    if hemoc:
-        score += 25
-        lines.append("Hemocultură pozitivă — contribuție majoră (+25)")
-
-    score = max(0, int(score))
-    return score, lines
-
-# ---------------- Core IAAM deterministic risk engine (updated with labs) ----------------
-
-def calculate_iaam_risk(payload: Dict[str, Any]) -> Tuple[int, str, List[str], List[str]]:
-    """Deterministic IAAM risk engine extended with laboratory markers."""
-    hours = payload.get("ore_spitalizare", 0) or 0
-    details: List[str] = []
-    score = 0
-
-    if hours < 48:
-        return 0, "NU IAAM (temporal)", [f"Internare {hours}h <48h: criteriu temporal negat"], ["Monitorizare clinică"]
-
-    # Temporal
-    if 48 <= hours < 72:
-        score += 5; details.append(f"Timp spitalizare: {hours}h (+5)")
-    elif hours < 168:
-        score += 10; details.append(f"Timp spitalizare: {hours}h (+10)")
-    else:
-        score += 15; details.append(f"Timp spitalizare: {hours}h (+15)")
-
-    # Devices
-    device_weights = {"CVC": 20, "Ventilatie": 25, "Sonda urinara": 15, "Traheostomie": 20, "Drenaj": 10, "PEG": 12}
-    for dev, info in (payload.get("dispozitive") or {}).items():
-        if info.get("prezent"):
-            zile = info.get("zile", 0) or 0
-            base = device_weights.get(dev, 5)
-            extra = 10 if zile > 7 else 5 if zile > 3 else 0
-            add = base + extra
-            score += add
-            details.append(f"{dev} ({zile} zile): +{add}")
-
-    # Microbiology
-    if payload.get("cultura_pozitiva"):
-        agent = payload.get("bacterie", "")
-        score += 15
-        details.append(f"Cultură pozitivă: {agent} (+15)")
-        for rez in (payload.get("profil_rezistenta") or []):
-            rez_pts = {"ESBL": 15, "CRE": 25, "KPC": 30, "NDM": 35, "MRSA": 20, "VRE": 25, "XDR": 30, "PDR": 40}.get(rez, 10)
-            score += rez_pts
-            details.append(f"Rezistență {rez}: +{rez_pts}")
-
-    # Severity scores
-    sofa_val, sofa_comp = calculate_sofa_detailed(payload)
-    if sofa_val > 0:
-        score += sofa_val * 3
-        details.append(f"SOFA: {sofa_val} (+{sofa_val*3})")
-
-    qsofa_val = calculate_qsofa(payload)
-    if qsofa_val >= 2:
-        score += 15
-        details.append(f"qSOFA: {qsofa_val} (+15)")
-
-    apache_val = calculate_apache_like(payload)
-    if apache_val > 0:
-        score += int(apache_val / 2)
-        details.append(f"APACHE-like: {apache_val} (+{int(apache_val/2)})")
-
-    # Urine
-    if payload.get("analiza_urina"):
-        interp, risc = analyze_urinary_sediment(payload.get('sediment', {}))
-        if risc > 50:
-            score += 10
-            details.append(f"Risc ITU: {risc}% (+10)")
-        details.extend([f"Urină: {line}" for line in interp])
-
-    # Comorbidities
-    charlson = calculate_charlson_like(payload.get("comorbiditati", {}))
-    if charlson > 0:
-        score += charlson
-        details.append(f"Comorbidități (sumă puncte): +{charlson}")
-
-    # Laboratory markers
-    lab_score, lab_lines = score_laboratory_markers(payload.get('analize', {}))
-    if lab_score > 0:
-        score += lab_score
-        details.append(f"Markeri biologici: +{lab_score}")
-        details.extend(lab_lines)
-
-    # Final level & recommendations
-    if score >= 120:
-        level = "CRITIC"
-        recs = [
-            "Izolare imediată și notificare CPIAAM",
-            "Consult infecționist urgent",
-            "Recoltare probe și inițiere ATB empirică largă conform protocoalelor locale",
-            "Monitorizare intensivă și considerare terapie suport (vasopresoare, ventilație)"
-        ]
-    elif score >= 90:
-        level = "FOARTE ÎNALT"
-        recs = ["Consult infecționist în 2h", "Recoltare culturi și antibiogramă", "Izolare preventivă"]
-    elif score >= 60:
-        level = "ÎNALT"
-        recs = ["Supraveghere activă IAAM", "Recoltare culturi țintite", "Monitorizare parametri la 8h"]
-    elif score >= 35:
-        level = "MODERAT"
-        recs = ["Monitorizare extinsă", "Documentare completă în fișa de observație"]
-    else:
-        level = "SCĂZUT"
-        recs = ["Monitorizare standard", "Precauții standard"]
-
-    return int(score), level, details, recs
-
-# ---------------- Helpers: defaults, payload and audit (updated to include analize) ----------------
-
-def init_defaults():
-    """Initialize session state defaults to keep UI stateless and reproducible."""
-    defaults = {
-        'nume_pacient': 'Pacient_001', 'cnp': '', 'sectie': 'ATI',
-        'ore_spitalizare': 96, 'pao2_fio2': 400, 'trombocite': 200,
-        'bilirubina': 1.0, 'glasgow': 15, 'creatinina': 1.0,
-        'hipotensiune': False, 'vasopresoare': False,
-        'tas': 120, 'fr': 18, 'cultura_pozitiva': False,
-        'bacterie': '', 'profil_rezistenta': [], 'tip_infectie': list(ICD_CODES.keys())[0],
-        'comorbiditati_selectate': {}, 'analiza_urina': False, 'sediment': {},
-        'analize': {}, 'show_nav': True, 'current_page': 'home', 'last_result': None
-    }
-    for k, v in defaults.items():
-        if k not in st.session_state:
-            st.session_state[k] = v
-
-def collect_payload() -> Dict[str, Any]:
-    """Gather current session state into a structured payload for scoring and export."""
-    payload = {
-        'nume_pacient': st.session_state.get('nume_pacient'),
-        'cnp': st.session_state.get('cnp'),
-        'sectie': st.session_state.get('sectie'),
-        'ore_spitalizare': st.session_state.get('ore_spitalizare'),
-        'dispozitive': {},
-        'pao2_fio2': st.session_state.get('pao2_fio2'),
-        'trombocite': st.session_state.get('trombocite'),
-        'bilirubina': st.session_state.get('bilirubina'),
-        'glasgow': st.session_state.get('glasgow'),
-        'creatinina': st.session_state.get('creatinina'),
-        'hipotensiune': st.session_state.get('hipotensiune'),
-        'vasopresoare': st.session_state.get('vasopresoare'),
-        'tas': st.session_state.get('tas'),
-        'fr': st.session_state.get('fr'),
-        'cultura_pozitiva': st.session_state.get('cultura_pozitiva'),
-        'bacterie': st.session_state.get('bacterie'),
-        'profil_rezistenta': st.session_state.get('profil_rezistenta'),
-        'tip_infectie': st.session_state.get('tip_infectie'),
-        'comorbiditati': st.session_state.get('comorbiditati_selectate'),
-        'analiza_urina': st.session_state.get('analiza_urina'),
-        'sediment': st.session_state.get('sediment'),
-        'analize': st.session_state.get('analize', {}),
-    }
-    devices = ['CVC', 'Ventilatie', 'Sonda urinara', 'Traheostomie', 'Drenaj', 'PEG']
-    for d in devices:
-        payload['dispozitive'][d] = {
-            'prezent': st.session_state.get(f"disp_{d}", False),
-            'zile': st.session_state.get(f"zile_{d}", 0)
-        }
-    return payload
-
-def append_audit(result: Dict[str, Any]):
-    """Append a single result to the local CSV audit file. Minimal columns for privacy."""
-    row = {
-        'timestamp': result['timestamp'],
-        'pacient': result['payload'].get('nume_pacient'),
-        'sectie': result['payload'].get('sectie'),
-        'ore_spitalizare': result['payload'].get('ore_spitalizare'),
-        'scor': result['scor'],
-        'nivel': result['nivel'],
-        'agent': result['payload'].get('bacterie'),
-        'rezistente': ','.join(result['payload'].get('profil_rezistenta', []))
-    }
-    df = pd.DataFrame([row])
-    if not Path(AUDIT_CSV).exists():
-        df.to_csv(AUDIT_CSV, index=False)
-    else:
-        df.to_csv(AUDIT_CSV, mode='a', header=False, index=False)
-
-def load_audit_df() -> pd.DataFrame:
-    if Path(AUDIT_CSV).exists():
-        try:
-            return pd.read_csv(AUDIT_CSV)
-        except Exception:
-            return pd.DataFrame()
-    return pd.DataFrame()
-
-# ---------------- UI: header, nav, pages (includes Analize) ----------------
-
-def render_header():
-    st.markdown('<div class="header">', unsafe_allow_html=True)
-    cols = st.columns([0.6, 4])
-    with cols[0]:
-        if st.button("☰", key='toggle_nav_short'):
-            st.session_state['show_nav'] = not st.session_state.get('show_nav', True)
-        st.markdown('<div style="font-size:12px;color:#9fb0c6;margin-top:6px;">Meniu</div>', unsafe_allow_html=True)
-    with cols[1]:
-        st.markdown(f'<div class="title">{APP_TITLE} <span style="font-weight:400;font-size:12px;color:#9fb0c6">v{VERSION}</span></div>', unsafe_allow_html=True)
-        st.markdown('<div class="subtitle">Platformă demonstrativă — evaluare predictivă IAAM. Instrument academic pentru screening și suport decizional.</div>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
-
-def render_nav():
-    menu = [
-        ("🏠 Pagina principală", "home"),
-        ("🧾 Date pacient", "patient"),
-        ("🩺 Dispozitive invazive", "devices"),
-        ("📊 Scoruri severitate", "severity"),
-        ("🧫 Microbiologie", "microbio"),
-        ("⚕️ Comorbidități", "comorbid"),
-        ("🔬 Analiză urinară", "urine"),
-        ("🧪 Analize laborator", "analize"),
-        ("📁 Rezultate & Istoric", "results"),
-    ]
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    for label, key in menu:
-        if st.button(label, key=f"nav_{key}" + str(key)):
-            st.session_state['current_page'] = key
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# Page: Analize
-def page_analize():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h4>Analize laborator — markeri infecție și inflamație</h4>', unsafe_allow_html=True)
-    st.markdown('<div class="small-muted">Introduceți ultimele valori de laborator disponibile. Valorile introduse sunt utilizate pentru a ajusta scorul IAAM (orientativ).</div>', unsafe_allow_html=True)
-    c1, c2, c3 = st.columns(3)
-    with c1:
-        st.number_input('Leucocite (WBC, x10^3/µL)', min_value=0.0, max_value=200.0, value=float(st.session_state.get('analize', {}).get('wbc', 8.0)), key='lab_wbc')
-        st.number_input('Neutrofile absolute (x10^3/µL) — (opțional)', min_value=0.0, max_value=200.0, value=float(st.session_state.get('analize', {}).get('neut_abs', 5.0) or 0.0), key='lab_neut_abs')
-        st.number_input('Neutrofile % (opțional)', min_value=0.0, max_value=100.0, value=float(st.session_state.get('analize', {}).get('neut_pct', 70.0) or 0.0), key='lab_neut_pct')
-    with c2:
-        st.number_input('CRP (mg/L)', min_value=0.0, max_value=1000.0, value=float(st.session_state.get('analize', {}).get('crp', 20.0)), key='lab_crp')
-        st.number_input('VSH / ESR (mm/h)', min_value=0.0, max_value=200.0, value=float(st.session_state.get('analize', {}).get('esr', 20.0)), key='lab_esr')
-        st.number_input('Procalcitonină (ng/mL)', min_value=0.0, max_value=100.0, value=float(st.session_state.get('analize', {}).get('pct', 0.1)), key='lab_pct')
-    with c3:
-        st.number_input('Presepsină (pg/mL) — dacă este disponibil', min_value=0.0, max_value=20000.0, value=float(st.session_state.get('analize', {}).get('presepsin', 0.0)), key='lab_presepsin')
-        st.number_input('Lactat (mmol/L)', min_value=0.0, max_value=20.0, value=float(st.session_state.get('analize', {}).get('lactate', 1.0)), key='lab_lactate')
-        st.checkbox('Hemocultură pozitivă', key='lab_blood_culture')
-    # save to session_state['analize']
-    st.session_state['analize'] = {
-        'wbc': st.session_state.get('lab_wbc'),
-        'neut_abs': st.session_state.get('lab_neut_abs'),
-        'neut_pct': st.session_state.get('lab_neut_pct'),
-        'crp': st.session_state.get('lab_crp'),
-        'esr': st.session_state.get('lab_esr'),
-        'pct': st.session_state.get('lab_pct'),
-        'presepsin': st.session_state.get('lab_presepsin'),
-        'lactate': st.session_state.get('lab_lactate'),
-        'blood_culture_positive': st.session_state.get('lab_blood_culture')
-    }
-    st.markdown('<div class="small-muted">Note: pragurile utilizate sunt orientative. Adaptați-le la protocoalele locale.</div>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# ---------------- Other pages definitions ----------------
-
-def page_home():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h3>EpiMind — Context, scop și metodologie</h3>', unsafe_allow_html=True)
-    st.markdown(
-        """
-        <div class="small-muted">
-        <strong>Context:</strong> Infecțiile asociate asistenței medicale (IAAM) reprezintă un risc major pentru pacient
-        și o sursă semnificativă de morbiditate, mortalitate și costuri spitalicești. Screeningul proactiv facilitează
-        identificarea timpurie a pacienților cu risc crescut (MDR screening, izolare, antibioterapie direcționată).
-        <br/><br/>
-        <strong>Scop:</strong> EpiMind oferă un instrument academic pentru triere și suport decizional bazat pe reguli
-        clinice și scoruri validate (SOFA/qSOFA) combinate cu factori specifici spitalului: dispozitive invazive,
-        durata internării, culturi microbiologice și comorbidități.
-        <br/><br/>
-        <strong>Metodologie:</strong> Motorul de evaluare este determinist — combină reguli temporale, greutăți pentru
-        dispozitive invazive, penalizări pentru profiluri de rezistență și componente de severitate. Scorul rezultat
-        este orientativ și trebuie interpretat în context clinic.
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
-    st.markdown('<hr/>', unsafe_allow_html=True)
-    st.markdown('<h4>Module</h4>', unsafe_allow_html=True)
-    cols = st.columns([1,1,1])
-    with cols[0]:
-        st.markdown('<div class="muted-box"><strong>Evaluare pacient</strong><br/>Introduceți date demografice, durata internării și secția. Validare minimală pentru simulări reproducibile.</div>', unsafe_allow_html=True)
-    with cols[1]:
-        st.markdown('<div class="muted-box"><strong>Comorbidități</strong><br/>Catalog structurat al afecțiunilor principale (cardiovascular, respirator, metabolic etc.) cu greutăți predefinite pentru model.</div>', unsafe_allow_html=True)
-    with cols[2]:
-        st.markdown('<div class="muted-box"><strong>Microbiologie & Urină</strong><br/>Permite introducerea rezultatelor culturilor, profilurilor de rezistență și interpretarea sedimentului urinar pentru suspiciune ITU.</div>', unsafe_allow_html=True)
-    st.markdown('<hr/>', unsafe_allow_html=True)
-    st.markdown('<h4>Componente detaliate evaluate</h4>', unsafe_allow_html=True)
-    st.markdown(
-        """
-        <ul class="small-muted">
-          <li><strong>Timp de internare</strong> — criteriu temporal IAAM (>=48h)</li>
-          <li><strong>Dispozitive invazive</strong> — CVC, ventilație mecanică, sondă urinară, traheostomie etc. (durata influențează riscul)</li>
-          <li><strong>Scoruri de severitate</strong> — SOFA (detaliat), qSOFA, APACHE-like (simplificat)</li>
-          <li><strong>Microbiologie</strong> — cultură pozitivă, profil de rezistență (ESBL/CRE/KPC/MRSA etc.)</li>
-          <li><strong>Comorbidități</strong> — sumar ponderat în stil Charlson-like pentru evaluare a vulnerabilității</li>
-          <li><strong>Analiză urinară</strong> — interpretare sediment, nitriți, esteraă, poziționare rezultatelor</li>
-          <li><strong>Analize laborator</strong> — WBC, CRP, PCT, Presepsină, Lactat etc. integrate în scorul IAAM</li>
-        </ul>
-        """,
-        unsafe_allow_html=True,
-    )
-    st.markdown('<hr/>', unsafe_allow_html=True)
-    st.markdown('<div class="small-muted">Documentație: acest instrument servește ca suport academic. În mediul clinic producție se recomandă validare locală, audit regulat, criptare a datelor și control de acces.</div>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
-
-def page_patient():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h4>Date pacient</h4>', unsafe_allow_html=True)
-    c1, c2, c3 = st.columns([3,2,2])
-    with c1:
-        st.text_input('Nume / Cod pacient *', key='nume_pacient', placeholder='Pacient_001', help='Identificator pentru raport. Nu încărca date personale sensibile în demo.')
-        st.text_input('CNP (opțional)', key='cnp', help='Dacă este necesar pentru evidență locală — atenție la confidențialitate')
-        st.selectbox('Secția', ['ATI','Chirurgie','Medicină Internă','Pediatrie','Neonatologie'], key='sectie')
-    with c2:
-        st.number_input('Ore internare *', min_value=0, max_value=10000, value=st.session_state.get('ore_spitalizare',96), key='ore_spitalizare', help='Criteriu temporal: IAAM >=48h')
-        st.selectbox('Tip internare', ['Programat','Urgent'], key='tip_internare')
-    with c3:
-        st.date_input('Data evaluării', key='data_evaluare')
-        st.text_input('Cod intern (opțional)', key='cod_intern')
-    st.markdown('<div class="small-muted">Câmpurile cu * sunt esențiale.</div>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
-
-def page_devices():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h4>Dispozitive invazive (selectați prezența și durata)</h4>', unsafe_allow_html=True)
-    devices = ['CVC','Ventilatie','Sonda urinara','Traheostomie','Drenaj','PEG']
-    cols = st.columns(3)
-    for i, d in enumerate(devices):
-        with cols[i % 3]:
-            present = st.checkbox(d, key=f'disp_{d}')
-            if present:
-                st.number_input('Zile (durată)', 0, 365, 3, key=f'zile_{d}')
-    st.markdown('</div>', unsafe_allow_html=True)
-
-def page_severity():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h4>Parametri clinici și scoruri</h4>', unsafe_allow_html=True)
-    c1, c2 = st.columns(2)
-    with c1:
-        st.number_input('PaO2/FiO2', 50, 500, value=st.session_state.get('pao2_fio2',400), key='pao2_fio2')
-        st.number_input('Trombocite (x10^3/µL)', 0, 1000, value=st.session_state.get('trombocite',200), key='trombocite')
-        st.number_input('Bilirubină (mg/dL)', 0.0, 30.0, value=st.session_state.get('bilirubina',1.0), key='bilirubina')
-    with c2:
-        st.number_input('Glasgow', 3, 15, value=st.session_state.get('glasgow',15), key='glasgow')
-        st.number_input('Creatinină (mg/dL)', 0.1, 20.0, value=st.session_state.get('creatinina',1.0), key='creatinina')
-        st.checkbox('Hipotensiune', key='hipotensiune')
-        st.checkbox('Vasopresoare', key='vasopresoare')
-    st.number_input('TAS (mmHg)', 40, 220, value=st.session_state.get('tas',120), key='tas')
-    st.number_input('FR (/min)', 8, 60, value=st.session_state.get('fr',18), key='fr')
-    st.markdown('<div class="small-muted">SOFA și qSOFA sunt calculate automat pe baza acestor valori.</div>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
-
-def page_microbio():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h4>Microbiologie</h4>', unsafe_allow_html=True)
-    cultura = st.checkbox('Cultură pozitivă', key='cultura_pozitiva')
-    if cultura:
-        st.selectbox('Agent patogen', [''] + list(REZISTENTA_PROFILE.keys()), key='bacterie')
-        sel = st.session_state.get('bacterie', '')
-        if sel:
-            st.multiselect('Profil rezistență', REZISTENTA_PROFILE.get(sel, []), key='profil_rezistenta')
-    st.selectbox('Tip infecție (ICD-10)', list(ICD_CODES.keys()), key='tip_infectie')
-    st.markdown('</div>', unsafe_allow_html=True)
-
-def page_comorbid():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h4>Comorbidități (selectați severitatea dacă este cazul)</h4>', unsafe_allow_html=True)
-    com_select = {}
-    cats = list(COMORBIDITATI.keys())
-    cols = st.columns(3)
-    for i, cat in enumerate(cats):
-        with cols[i % 3]:
-            with st.expander(cat, expanded=False):
-                for cond, val in COMORBIDITATI[cat].items():
-                    key = f'com_{cat}_{cond}'
-                    if isinstance(val, dict):
-                        choice = st.selectbox(cond, ['Nu'] + list(val.keys()), key=key)
-                        if choice and choice != 'Nu':
-                            com_select.setdefault(cat, {})[cond] = choice
-                    else:
-                        v = st.checkbox(cond, key=key)
-                        if v:
-                            com_select.setdefault(cat, {})[cond] = True
-    st.session_state['comorbiditati_selectate'] = com_select
-    st.markdown('</div>', unsafe_allow_html=True)
-
-def page_urine():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h4>Analiză urinară — sediment</h4>', unsafe_allow_html=True)
-    st.checkbox('Analiză urinară disponibilă', key='analiza_urina')
-    if st.session_state.get('analiza_urina', False):
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            st.number_input('Leucocite / câmp', 0, 200, value=st.session_state.get('leu_urina',5), key='leu_urina')
-            st.number_input('Eritrocite / câmp', 0, 200, value=st.session_state.get('eri_urina',1), key='eri_urina')
-            st.slider('Bacterii (0-4+)', 0, 4, value=st.session_state.get('bact_urina',0), key='bact_urina')
-        with c2:
-            st.number_input('Celule epiteliale', 0, 50, value=st.session_state.get('cel_epit',2), key='cel_epit')
-            st.checkbox('Nitriți +', key='nitriti')
-            st.checkbox('Esterază +', key='esteraza')
-        with c3:
-            st.checkbox('Cilindri', key='cilindri')
-            if st.session_state.get('cilindri', False):
-                st.text_input('Tip cilindri', key='tip_cilindri')
-            st.text_input('Cristale (descriere)', key='cristale')
-        st.session_state['sediment'] = {
-            'leu_urina': st.session_state.get('leu_urina', 0),
-            'eri_urina': st.session_state.get('eri_urina', 0),
-            'bact_urina': st.session_state.get('bact_urina', 0),
-            'cel_epit': st.session_state.get('cel_epit', 0),
-            'nitriti': st.session_state.get('nitriti', False),
-            'esteraza': st.session_state.get('esteraza', False),
-            'cilindri': st.session_state.get('cilindri', False),
-            'tip_cilindri': st.session_state.get('tip_cilindri', ''),
-            'cristale': st.session_state.get('cristale', '')
-        }
-    st.markdown('</div>', unsafe_allow_html=True)
-
-def page_results_and_history():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h4>Rezultate & Istoric</h4>', unsafe_allow_html=True)
-    last = st.session_state.get('last_result')
-    if last:
-        payload = last['payload']; scor = last['scor']; nivel = last['nivel']; detalii = last['detalii']; recomandari = last['recomandari']
-        cols = st.columns(4)
-        with cols[0]:
-            st.markdown(f'<div class="metric"><div class="metric-value">{scor}</div><div class="small-muted">Scor IAAM</div></div>', unsafe_allow_html=True)
-        with cols[1]:
-            st.markdown(f'<div class="metric"><div style="font-weight:700;font-size:16px;">{nivel}</div><div class="small-muted">Nivel risc</div></div>', unsafe_allow_html=True)
-        with cols[2]:
-            sofa_val, _ = calculate_sofa_detailed(payload); st.markdown(f'<div class="metric"><div class="metric-value">{sofa_val}</div><div class="small-muted">SOFA</div></div>', unsafe_allow_html=True)
-        with cols[3]:
-            qsofa_val = calculate_qsofa(payload); st.markdown(f'<div class="metric"><div class="metric-value">{qsofa_val}</div><div class="small-muted">qSOFA</div></div>', unsafe_allow_html=True)
-
-        risk_map = {'CRITIC':'risk-critical','FOARTE ÎNALT':'risk-high','ÎNALT':'risk-high','MODERAT':'risk-moderate','SCĂZUT':'risk-low'}
-        banner_class = risk_map.get(nivel, 'risk-low')
-        st.markdown(f'<div class="risk-alert {banner_class}">⚠️ <strong>RISC {nivel}</strong> — Scor: {scor} • {payload.get("nume_pacient")}</div>', unsafe_allow_html=True)
-
-        t1, t2, t3, t4 = st.tabs(['🔎 Analiză','🧾 Recomandări','🔬 Laborator','📥 Export'])
-        with t1:
-            st.markdown('**Componente scor (detaliate)**')
-            for d in detalii:
-                st.markdown(f'- {d}')
-            fig = go.Figure(go.Indicator(mode='gauge+number', value=scor, domain={'x':[0,1],'y':[0,1]}, gauge={'axis':{'range':[0,200]}}))
-            fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=280)
-            st.plotly_chart(fig, use_container_width=True)
-        with t2:
-            st.markdown('**Recomandări practice**')
-            for i, r in enumerate(recomandari, 1):
-                st.markdown(f'{i}. {r}')
-            agent = payload.get('bacterie', '')
-            if agent:
-                st.markdown('**Sugestii empirice (exemplu)**')
-                atb_map = {
-                    'Escherichia coli': ['Meropenem 1g IV q8h'],
-                    'Klebsiella pneumoniae': ['Meropenem 2g perfuzie'],
-                    'Pseudomonas aeruginosa': ['Ceftazidim/Avibactam 2.5g IV q8h']
-                }
-                for a in atb_map.get(agent, ['Consultați antibiograma locală']):
-                    st.markdown(f'- {a}')
-        with t3:
-            st.markdown('**Microbiologie & Urină & Analize**')
-            if payload.get('cultura_pozitiva'):
-                st.markdown(f'- Agent: **{payload.get("bacterie")}**')
-                st.markdown(f"- Rezistențe: {', '.join(payload.get('profil_rezistenta', [])) or '—'}")
-            else:
-                st.markdown('- Fără izolat')
-            if payload.get('analiza_urina'):
-                interp, risc = analyze_urinary_sediment(payload.get('sediment', {}))
-                st.markdown(f'- Probabilitate ITU: **{risc}%**')
-                for it in interp:
-                    st.markdown(f'  - {it}')
-            else:
-                st.markdown('- Analiză urinară nedisponibilă')
-
-            # show lab summary
-            analize = payload.get('analize', {})
-            if analize:
-                st.markdown('\n**Rezultate laborator (sumar)**')
-                for k, v in analize.items():
-                    st.markdown(f'- {k}: {v}')
-            else:
-                st.markdown('\n- Rezultate laborator nedisponibile')
-        with t4:
-            raport = {'meta':{'timestamp': last['timestamp'], 'version': VERSION}, 'pacient': payload, 'result': {'scor': scor, 'nivel': nivel, 'detalii': detalii, 'recomandari': recomandari}}
-            st.download_button('📥 Descarcă raport JSON', json.dumps(raport, ensure_ascii=False, indent=2), file_name=f"epimind_{payload.get('nume_pacient')}_{datetime.now().strftime('%Y%m%d')}.json", use_container_width=True)
-            df = pd.DataFrame([{
-                'data': datetime.now().strftime('%Y-%m-%d'),
-                'pacient': payload.get('nume_pacient'),
-                'sectie': payload.get('sectie'),
-                'ore_spitalizare': payload.get('ore_spitalizare'),
-                'scor': scor,
-                'nivel': nivel
-            }])
-            st.download_button('📥 Descarcă CSV scurt', df.to_csv(index=False), file_name=f"epimind_stats_{datetime.now().strftime('%Y%m%d')}.csv", use_container_width=True)
-    else:
-        st.info('Nu există evaluări recente. Completați datele și apăsați butonul de evaluare.')
-
-    st.markdown('---')
-    st.markdown('**Istoric audit (local)**')
-    df_audit = load_audit_df()
-    if not df_audit.empty:
-        st.dataframe(df_audit.sort_values('timestamp', ascending=False).head(200), use_container_width=True)
-        st.download_button('Descarcă Istoric (.csv)', df_audit.to_csv(index=False), file_name=AUDIT_CSV)
-        if st.button('🗑 Șterge istoric (local)'):
-            try:
-                os.remove(AUDIT_CSV)
-                st.success('Fișier audit șters.')
-            except Exception as e:
-                st.error('Eroare la ștergere: ' + str(e))
-    else:
-        st.markdown('Nu există date în auditul local.')
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# ---------------- Main & layout ----------------
-
-def render_current_page():
-    page = st.session_state.get('current_page','home')
-    if page == 'home':
-        page_home()
-    elif page == 'patient':
-        page_patient()
-    elif page == 'devices':
-        page_devices()
-    elif page == 'severity':
-        page_severity()
-    elif page == 'microbio':
-        page_microbio()
-    elif page == 'comorbid':
-        page_comorbid()
-    elif page == 'urine':
-        page_urine()
-    elif page == 'analize':
-        page_analize()
-    elif page == 'results':
-        page_results_and_history()
-    else:
-        st.info('Pagina nu există')
-
-def main():
-    init_defaults()
-    render_header()
-
-    if st.session_state.get('show_nav', True):
-        left, main_col = st.columns([1.2, 4])
-        with left:
-            render_nav()
-        with main_col:
-            render_current_page()
-    else:
-        render_current_page()
-
-    st.markdown('<hr/>', unsafe_allow_html=True)
-    c1, c2, c3 = st.columns([1,1,3])
-    with c1:
-        if st.button('▶️ Evaluează riscul IAAM', key='compute_main'):
-            missing = []
-            if not st.session_state.get('nume_pacient'):
-                missing.append('Nume pacient')
-            if st.session_state.get('ore_spitalizare',0) is None:
-                missing.append('Ore spitalizare')
-            if missing:
-                st.error('Completați: ' + ', '.join(missing))
-            else:
-                payload = collect_payload()
-                scor, nivel, detalii, recomandari = calculate_iaam_risk(payload)
-                result = {
-                    'payload': payload,
-                    'scor': scor,
-                    'nivel': nivel,
-                    'detalii': detalii,
-                    'recomandari': recomandari,
-                    'timestamp': datetime.now().isoformat()
-                }
-                st.session_state['last_result'] = result
-                try:
-                    append_audit(result)
-                except Exception as e:
-                    st.warning('Eroare scriere audit: ' + str(e))
-                st.success(f'Calcul efectuat — Scor: {scor} • Nivel: {nivel}')
-                st.session_state['current_page'] = 'results'
-    with c2:
-        if st.button('⟳ Reset formular', key='reset_main'):
-            keys = [k for k in list(st.session_state.keys()) if k not in ('last_result','show_nav','current_page')]
-            for k in keys:
-                try:
-                    del st.session_state[k]
-                except Exception:
-                    pass
-            st.experimental_rerun()
-    with c3:
-        st.markdown('<div class="small-muted">EpiMind • Demo academic • Datele se salvează local (CSV). Pentru producție: integrare autentificare, stocare securizată și audit externalizat.</div>', unsafe_allow_html=True)
-
-if __name__ == '__main__':
-    main()
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — IAAM Predictor (Single-file, Professional, Mobile-friendly)
+UMF "Grigore T. Popa" Iași — Dr. Boghian Lucian
+Version: 2.2.0 — Complete single-file Streamlit application (Analize adăugate)
+
+Această versiune adaugă o secțiune profesională "Analize" cu markeri biologici importanți
+(WBC, Neutrofile, CRP, VSH/ESR, Procalcitonină, Presepsină, Lactat, Hemocultură) și integrează
+acești markeri în motorul de risc IAAM printr-un modul de scor dedicat.
+
+Rulează:
+    streamlit run EpiMind_IAAM_Predictor_Full.py
+"""
+
+from __future__ import annotations
+
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple, Any, Optional
+
+import epimind_metrics as metrics
+import epimind_session as sessions
+from epimind_worklist import PatientStore, WORKLIST_DB, LIST_LATENCY_BUDGET_MS
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+from epimind_outbreak import OutbreakDetector, append_alerts
+from epimind_knn import KnnIndex, KNN_DIR, encode_payload, evolution
+from epimind_cohort import CohortStore, COHORT_DIR
+from epimind_quantiles import WardPercentiles, month_of
+from epimind_uncertainty import EmpiricalPools, UNCERTAIN_INPUTS, simulate
+from epimind_calibrate import read_weight_set
+from epimind_rules import RuleSet, RULES_FILE, shared_loader
+from epimind_antibiogram import Antibiogram, ANTIBIOGRAM_PATH
+from epimind_reports import patient_report, render_html, render_json, ward_reports, write_ndjson, write_zip
+from epimind_trends import patient_trend, ward_trend
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+try:
+    import fcntl
+except ImportError:  # Windows: audit writes are not serialised across processes
+    fcntl = None
+
+# ---------------- App configuration ----------------
+APP_TITLE = "EpiMind — IAAM Predictor"
+APP_ICON = "🏥"
+VERSION = "2.2.0"
+AUDIT_CSV = "epimind_audit.csv"
+AUDIT_COLUMNS = ['timestamp', 'pacient', 'sectie', 'ore_spitalizare', 'scor', 'nivel', 'cultura_pozitiva', 'agent', 'rezistente', 'snapshot_id', 'versiune_reguli']
+EXPORT_DIR = Path("exports")
+EXPORT_DIR.mkdir(exist_ok=True)
+
+st.set_page_config(page_title=APP_TITLE, page_icon=APP_ICON, layout="wide", initial_sidebar_state="collapsed")
+
+# ---------------- Minimal responsive CSS (improved) ----------------
+st.markdown(
+    """
+    <style>
+    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600;700&display=swap');
+    :root{--bg:#071019;--card:#0f1720;--muted:#9fb0c6;--accent:#1f78d1;--accent-2:#00a859;--danger:#dc2626;}
+    body {background: linear-gradient(180deg,#061018,#08121a) !important; color: #EAF2FF;}
+    .stApp { font-family: 'Inter', sans-serif; }
+    .header { padding:12px; border-radius:10px; background: linear-gradient(90deg, rgba(31,120,209,0.04), rgba(0,168,89,0.02)); margin-bottom:12px; border:1px solid rgba(255,255,255,0.02);}    
+    .title { font-weight:700; font-size:20px; color:#EAF2FF; }
+    .subtitle { color:var(--muted); font-size:13px; margin-top:4px }
+    .card { background: var(--card); border-radius:10px; padding:14px; border:1px solid rgba(255,255,255,0.02); color:#EAF2FF; }
+    .metric { text-align:center; padding:8px; border-radius:8px; background: rgba(255,255,255,0.01); }
+    .metric-value { font-weight:800; font-size:26px; color:var(--accent); }
+    .small-muted { color: var(--muted); font-size:12px; }
+    .risk-alert { padding:12px; border-radius:8px; font-weight:700; margin-bottom:8px; }
+    .risk-critical { background: rgba(220,38,38,0.08); border-left:4px solid var(--danger); color:#fecaca; }
+    .risk-high { background: rgba(245,158,11,0.06); border-left:4px solid #F59E0B; color:#fff4d1; }
+    .risk-moderate { background: rgba(59,130,246,0.05); border-left:4px solid #3B82F6; color:#cfe6ff; }
+    .risk-low { background: rgba(16,185,129,0.05); border-left:4px solid #10B981; color:#d7ffe6; }
+    .muted-box { background: rgba(255,255,255,0.01); border-radius:8px; padding:8px; }
+    @media (max-width: 760px) {
+      .title { font-size:18px; }
+      .metric-value { font-size:20px; }
+      .card { padding:10px; }
+    }
+    </style>
+    """,
+    unsafe_allow_html=True,
+)
+
+# ---------------- Domain knowledge (concise but extensible) ----------------
+REZISTENTA_PROFILE = {
+    "Escherichia coli": ["ESBL", "CRE", "AmpC", "NDM-1", "CTX-M"],
+    "Klebsiella pneumoniae": ["ESBL", "CRE", "KPC", "NDM", "OXA-48"],
+    "Pseudomonas aeruginosa": ["MDR", "XDR", "PDR"],
+    "Acinetobacter baumannii": ["OXA-23", "OXA-24", "MDR"],
+    "Staphylococcus aureus": ["MRSA", "VISA"],
+    "Enterococcus faecalis": ["VRE"],
+    "Candida auris": ["Fluconazol-R", "Echinocandin-R"]
+}
+
+ICD_CODES = {
+    "Bacteriemie/Septicemie": "A41.9",
+    "Pneumonie nosocomială": "J15.9",
+    "ITU nosocomială": "N39.0",
+    "Infecție CVC": "T80.2",
+    "Infecție plagă operatorie": "T81.4",
+    "Clostridioides difficile": "A04.7",
+}
+
+SECTII = ['ATI', 'Chirurgie', 'Medicină Internă', 'Pediatrie', 'Neonatologie']
+DEVICES = ['CVC', 'Ventilatie', 'Sonda urinara', 'Traheostomie', 'Drenaj', 'PEG']
+NIVELURI = ['CRITIC', 'FOARTE ÎNALT', 'ÎNALT', 'MODERAT', 'SCĂZUT']
+
+# Engine rules (device weights, resistance points, lab cut-offs, comorbidity weights, level thresholds)
+# come from a versioned file, recompiled when it changes; see epimind_rules.json.
+RULES = shared_loader(RULES_FILE, __name__)
+# Calibrated weight set written by `epimind_calibrate.py fit` (EPIMIND_WEIGHTS=weights/<versiune>.json)
+WEIGHTS_FILE = os.environ.get('EPIMIND_WEIGHTS', '')
+
+def current_rules() -> RuleSet:
+    return RULES.current()
+
+def load_weight_set(path: str) -> str:
+    """Apply a calibrated weight set on top of the rules file and return the combined rule-set version."""
+    return RULES.set_overlay(read_weight_set(path), source=path).version
+
+if WEIGHTS_FILE and RULES.overlay_source != WEIGHTS_FILE:
+    load_weight_set(WEIGHTS_FILE)
+
+# ---------------- Calculators (detailed docstrings) ----------------
+
+def calculate_sofa_detailed(data: Dict[str, Any]) -> Tuple[int, Dict[str, int]]:
+    """Calculate an extended SOFA score with component breakdown."""
+    components = {"Respirator": 0, "Coagulare": 0, "Hepatic": 0, "Cardiovascular": 0, "SNC": 0, "Renal": 0}
+    pao2_fio2 = data.get("pao2_fio2", 400)
+    if pao2_fio2 < 400:
+        components["Respirator"] = 1
+    if pao2_fio2 < 300:
+        components["Respirator"] = 2
+    if pao2_fio2 < 200:
+        components["Respirator"] = 3
+    if pao2_fio2 < 100:
+        components["Respirator"] = 4
+
+    platelets = data.get("trombocite", 200)
+    if platelets < 150:
+        components["Coagulare"] = 1
+    if platelets < 100:
+        components["Coagulare"] = 2
+    if platelets < 50:
+        components["Coagulare"] = 3
+    if platelets < 20:
+        components["Coagulare"] = 4
+
+    bilirubin = data.get("bilirubina", 1.0)
+    if bilirubin >= 1.2:
+        components["Hepatic"] = 1
+    if bilirubin >= 2.0:
+        components["Hepatic"] = 2
+    if bilirubin >= 6.0:
+        components["Hepatic"] = 3
+    if bilirubin >= 12.0:
+        components["Hepatic"] = 4
+
+    if data.get("hipotensiune"):
+        components["Cardiovascular"] = max(components["Cardiovascular"], 2)
+    if data.get("vasopresoare"):
+        components["Cardiovascular"] = max(components["Cardiovascular"], 3)
+
+    glasgow = data.get("glasgow", 15)
+    if glasgow < 15:
+        components["SNC"] = 1
+    if glasgow < 13:
+        components["SNC"] = 2
+    if glasgow < 10:
+        components["SNC"] = 3
+    if glasgow < 6:
+        components["SNC"] = 4
+
+    creatinine = data.get("creatinina", 1.0)
+    urine_output = data.get("diureza_ml_kg_h", 1.0)
+    if creatinine >= 1.2 or urine_output < 0.5:
+        components["Renal"] = 1
+    if creatinine >= 2.0:
+        components["Renal"] = 2
+    if creatinine >= 3.5 or urine_output < 0.3:
+        components["Renal"] = 3
+    if creatinine >= 5.0 or urine_output < 0.1:
+        components["Renal"] = 4
+
+    total = sum(components.values())
+    return total, components
+
+
+def calculate_qsofa(data: Dict[str, Any]) -> int:
+    """Compute qSOFA: TAS<100, FR>=22, Glasgow<15"""
+    score = 0
+    tas = data.get("tas", 120)
+    fr = data.get("fr", 18)
+    glasgow = data.get("glasgow", 15)
+    if tas < 100:
+        score += 1
+    if fr >= 22:
+        score += 1
+    if glasgow < 15:
+        score += 1
+    return score
+
+
+def calculate_apache_like(data: Dict[str, Any]) -> int:
+    """A pragmatic APACHE-II-like aggregate (not a substitute for validated APACHE II)."""
+    score = 0
+    temp = data.get("temperatura", 37.0)
+    if temp >= 41 or temp < 30:
+        score += 4
+    elif 39 <= temp < 41:
+        score += 3
+    elif 38.5 <= temp < 39:
+        score += 1
+    elif 34 <= temp < 36:
+        score += 1
+    elif 32 <= temp < 34:
+        score += 2
+
+    mapv = data.get("tam", 70)
+    if mapv >= 160:
+        score += 4
+    elif 130 <= mapv < 160:
+        score += 3
+    elif 110 <= mapv < 130:
+        score += 2
+    elif 50 <= mapv < 70:
+        score += 2
+    elif mapv < 50:
+        score += 4
+
+    hr = data.get("fc", 80)
+    if hr >= 180:
+        score += 4
+    elif 140 <= hr < 180:
+        score += 3
+    elif 110 <= hr < 140:
+        score += 2
+    elif 55 <= hr < 70:
+        score += 2
+    elif 40 <= hr < 55:
+        score += 3
+    elif hr < 40:
+        score += 4
+
+    age = data.get("varsta")
+    if isinstance(age, int):
+        if age >= 75:
+            score += 6
+        elif age >= 65:
+            score += 5
+        elif age >= 55:
+            score += 3
+        elif age >= 45:
+            score += 2
+    return score
+
+
+def analyze_urinary_sediment(date: Dict[str, Any]) -> Tuple[List[str], int]:
+    """Detailed urinary sediment interpretation returning lines of interpretation and a risk % (0-100)."""
+    interp = []
+    risk = 0
+    leu = date.get("leu_urina", 0)
+    ery = date.get("eri_urina", 0)
+    bact = date.get("bact_urina", 0)
+    epit = date.get("cel_epit", 0)
+    nit = date.get("nitriti", False)
+    est = date.get("esteraza", False)
+    cilindri = date.get("cilindri", False)
+    tip = date.get("tip_cilindri", "")
+
+    if leu > 5:
+        interp.append(f"Leucociturie: {leu}/câmp")
+        risk += 20
+        if leu > 10:
+            interp.append("Piurie semnificativă")
+            risk += 15
+    if bact > 0:
+        interp.append(f"Bacteriurie: nivel {bact}")
+        risk += bact * 8
+    if nit:
+        interp.append("Nitriți pozitivi — sugestiv Gram-")
+        risk += 25
+    if est:
+        interp.append("Esterază leucocitară pozitivă")
+        risk += 20
+    if ery > 3:
+        interp.append(f"Hematurie: {ery}/câmp")
+        if ery > 50:
+            interp.append("Hematurie macroscopică — investigații")
+    if cilindri:
+        if "leucoc" in tip.lower():
+            interp.append("Cilindri leucocitari — sugestiv pielonefrită")
+            risk += 30
+        elif "granular" in tip.lower():
+            interp.append("Cilindri granulari — afectare tubulară")
+            risk += 10
+        else:
+            interp.append(f"Cilindri: {tip}")
+            risk += 5
+    if epit > 5:
+        interp.append("Contaminare probabilă (celule epiteliale crescute)")
+        risk = max(0, risk - 10)
+
+    risk = max(0, min(100, int(risk)))
+    return interp, risk
+
+
+def calculate_charlson_like(comorbidities: Dict[str, Dict[str, Any]], rules: Optional[RuleSet] = None) -> int:
+    """Simplified Charlson-like aggregate based on the rule set's comorbidity catalogue."""
+    rules = rules or current_rules()
+    score = 0
+    for cat, conds in (comorbidities or {}).items():
+        for cond, sev in conds.items():
+            score += rules.comorbidity_points(cat, cond, sev)
+    return score
+
+# ---------------- Laboratory module (new) ----------------
+
+# Wording of the tiered markers: name, unit, one phrase per rule tier (highest first), phrase below all tiers, name in errors
+LAB_WORDING = {
+    'crp': ('CRP', 'mg/L', ('mare inflamație', 'moderat'), 'scăzut', 'CRP'),
+    'esr': ('VSH', 'mm/h', ('crescut',), 'normal/moderat', 'VSH'),
+    'pct': ('Procalcitonină', 'ng/mL', ('mare probabilitate infecție severă', 'sugestivă'), 'scăzută', 'PCT'),
+    'presepsin': ('Presepsină', 'pg/mL', ('foarte crescută', 'crescută'), 'normală/negativă', 'Presepsină'),
+    'lactate': ('Lactat', 'mmol/L', ('hiperlactatemie', 'ridicat'), 'normal', 'Lactat'),
+}
+
+def score_laboratory_markers(labs: Dict[str, Any], rules: Optional[RuleSet] = None) -> Tuple[int, List[str]]:
+    """
+    Evaluate key laboratory markers and return a numeric lab score plus descriptive lines.
+
+    Markers considered (cut-offs and points from the rule set's `laborator` section):
+      - wbc: leucocite (x10^3/µL)
+      - neut_abs: neutrofile absolute (x10^3/µL)
+      - neut_pct: neutrophils percent
+      - crp: CRP (mg/L)
+      - esr: VSH/ESR (mm/h)
+      - pct: procalcitonin (ng/mL)
+      - presepsin: presepsin (pg/mL)
+      - lactate: lactat (mmol/L)
+      - blood_culture_positive: True/False
+    """
+    score = 0
+    lines: List[str] = []
+
+    if not labs:
+        return 0, ["Fără analize disponibile"]
+    lab = (rules or current_rules()).lab
+
+    # WBC
+    wbc = labs.get('wbc')
+    if wbc is not None and 'wbc' in lab:
+        try:
+            w = float(wbc)
+            high, low = lab['wbc'].match_above(w), lab['wbc'].match_below(w)
+            if high:
+                score += high[2]
+                lines.append(f"Leucocitoză: WBC {w} (>{high[1]}) +{high[2]}")
+            elif low:
+                score += low[2]
+                lines.append(f"Leucopenie: WBC {w} (<{low[1]}) +{low[2]}")
+            else:
+                lines.append(f"WBC: {w} (normal) +0")
+        except Exception:
+            lines.append(f"WBC: valoare nevalidă: {wbc}")
+
+    # Neutrophils absolute or percent
+    neut_abs = labs.get('neut_abs')
+    neut_pct = labs.get('neut_pct')
+    if neut_abs and 'neut_abs' in lab:
+        try:
+            na = float(neut_abs)
+            hit = lab['neut_abs'].match_above(na)
+            if hit:
+                score += hit[2]; lines.append(f"Neutrofilie absolută: {na} (+{hit[2]})")
+        except Exception:
+            pass
+    elif neut_pct and 'neut_pct' in lab:
+        try:
+            npct = float(neut_pct)
+            hit = lab['neut_pct'].match_above(npct)
+            if hit:
+                score += hit[2]; lines.append(f"Neutrofile%: {npct}% (+{hit[2]})")
+        except Exception:
+            pass
+
+    # CRP, VSH/ESR, procalcitonin, presepsin (orientativ), lactate
+    for marker, (name, unit, tiers, below, err_name) in LAB_WORDING.items():
+        value = labs.get(marker)
+        if value is None or marker not in lab:
+            continue
+        try:
+            v = float(value)
+            hit = lab[marker].match_above(v)
+            if hit:
+                score += hit[2]
+                phrase = tiers[hit[0]] if hit[0] < len(tiers) else f"prag {hit[1]}"
+                lines.append(f"{name} {v} {unit} — {phrase} (+{hit[2]})")
+            else:
+                lines.append(f"{name} {v} {unit} — {below} (+0)")
+        except Exception:
+            lines.append(f"{err_name}: valoare nevalidă: {value}")
+
+    # Hemocultura
+    hemoc = labs.get('blood_culture_positive')
+    if hemoc and 'blood_culture_positive' in lab:
+        pts = lab['blood_culture_positive'].positive
+        score += pts
+        lines.append(f"Hemocultură pozitivă — contribuție majoră (+{pts})")
+
+    score = max(0, int(score))
+    return score, lines
+
+# ---------------- Core IAAM deterministic risk engine (updated with labs) ----------------
+
+def temporal_points(hours: float) -> int:
+    """Points of the length-of-stay criterion (below 48h the engine stops: not an IAAM)."""
+    return 0 if hours < 48 else 5 if hours < 72 else 10 if hours < 168 else 15
+
+def device_points(device: str, zile: float, rules: Optional[RuleSet] = None) -> int:
+    """Points of one present device: its rule-set weight plus the duration tier (+5 after 3 days, +10 after 7)."""
+    rules = rules or current_rules()
+    return rules.device_weight(device) + (10 if zile > 7 else 5 if zile > 3 else 0)
+
+def calculate_iaam_risk(payload: Dict[str, Any], rules: Optional[RuleSet] = None) -> Tuple[int, str, List[str], List[str]]:
+    """Deterministic IAAM risk engine extended with laboratory markers (current rule set unless one is given)."""
+    rules = rules or current_rules()
+    lap = metrics.stage_timer()
+    hours = payload.get("ore_spitalizare", 0) or 0
+    details: List[str] = []
+    score = 0
+
+    if hours < 48:
+        return 0, "NU IAAM (temporal)", [f"Internare {hours}h <48h: criteriu temporal negat"], ["Monitorizare clinică"]
+
+    # Temporal
+    temporal = temporal_points(hours)
+    score += temporal; details.append(f"Timp spitalizare: {hours}h (+{temporal})")
+    lap("temporal")
+
+    # Devices
+    for dev, info in (payload.get("dispozitive") or {}).items():
+        if info.get("prezent"):
+            zile = info.get("zile", 0) or 0
+            add = device_points(dev, zile, rules)
+            score += add
+            details.append(f"{dev} ({zile} zile): +{add}")
+    lap("devices")
+
+    # Microbiology
+    if payload.get("cultura_pozitiva"):
+        agent = payload.get("bacterie", "")
+        score += 15
+        details.append(f"Cultură pozitivă: {agent} (+15)")
+        for rez in (payload.get("profil_rezistenta") or []):
+            rez_pts = rules.rez_weight(rez)
+            score += rez_pts
+            details.append(f"Rezistență {rez}: +{rez_pts}")
+    lap("microbiology")
+
+    # Severity scores
+    sofa_val, sofa_comp = calculate_sofa_detailed(payload)
+    if sofa_val > 0:
+        score += sofa_val * 3
+        details.append(f"SOFA: {sofa_val} (+{sofa_val*3})")
+    lap("sofa")
+
+    qsofa_val = calculate_qsofa(payload)
+    if qsofa_val >= 2:
+        score += 15
+        details.append(f"qSOFA: {qsofa_val} (+15)")
+    lap("qsofa")
+
+    apache_val = calculate_apache_like(payload)
+    if apache_val > 0:
+        score += int(apache_val / 2)
+        details.append(f"APACHE-like: {apache_val} (+{int(apache_val/2)})")
+    lap("apache")
+
+    # Urine
+    if payload.get("analiza_urina"):
+        interp, risc = analyze_urinary_sediment(payload.get('sediment', {}))
+        if risc > 50:
+            score += 10
+            details.append(f"Risc ITU: {risc}% (+10)")
+        details.extend([f"Urină: {line}" for line in interp])
+    lap("urine")
+
+    # Comorbidities
+    charlson = calculate_charlson_like(payload.get("comorbiditati", {}), rules)
+    if charlson > 0:
+        score += charlson
+        details.append(f"Comorbidități (sumă puncte): +{charlson}")
+    lap("comorbidity")
+
+    # Laboratory markers
+    lab_score, lab_lines = score_laboratory_markers(payload.get('analize', {}), rules)
+    if lab_score > 0:
+        score += lab_score
+        details.append(f"Markeri biologici: +{lab_score}")
+        details.extend(lab_lines)
+    lap("labs")
+
+    # Final level & recommendations
+    level, recs = rules.level_of(score)
+
+    return int(score), level, details, list(recs)
+
+# ---------------- Helpers: defaults, payload and audit (updated to include analize) ----------------
+
+def form_defaults() -> Dict[str, Any]:
+    """Widget defaults of the scalar form fields that make up a payload (fresh objects on every call)."""
+    return {
+        'nume_pacient': 'Pacient_001', 'cnp': '', 'sectie': 'ATI',
+        'ore_spitalizare': 96, 'pao2_fio2': 400, 'trombocite': 200,
+        'bilirubina': 1.0, 'glasgow': 15, 'creatinina': 1.0,
+        'hipotensiune': False, 'vasopresoare': False,
+        'tas': 120, 'fr': 18, 'cultura_pozitiva': False,
+        'bacterie': '', 'profil_rezistenta': [], 'tip_infectie': list(ICD_CODES.keys())[0],
+        'analiza_urina': False, 'inputuri_lipsa': [],
+    }
+
+# Widget defaults of the urine sediment and laboratory pages (payload key -> default)
+SEDIMENT_DEFAULTS = {'leu_urina': 5, 'eri_urina': 1, 'bact_urina': 0, 'cel_epit': 2, 'nitriti': False,
+                     'esteraza': False, 'cilindri': False, 'tip_cilindri': '', 'cristale': ''}
+LAB_DEFAULTS = {'wbc': 8.0, 'neut_abs': 5.0, 'neut_pct': 70.0, 'crp': 20.0, 'esr': 20.0, 'pct': 0.1,
+                'presepsin': 0.0, 'lactate': 1.0, 'blood_culture_positive': False}
+# Form widgets that are not part of the payload
+FORM_ONLY_KEYS = ('tip_internare', 'data_evaluare', 'cod_intern')
+
+def init_defaults():
+    """Initialize session state defaults to keep UI stateless and reproducible."""
+    defaults = {
+        **form_defaults(),
+        'comorbiditati_selectate': {}, 'sediment': {},
+        'analize': {}, 'show_nav': True, 'current_page': 'home', 'last_result': None
+    }
+    for k, v in defaults.items():
+        if k not in st.session_state:
+            st.session_state[k] = v
+
+def collect_payload() -> Dict[str, Any]:
+    """Gather current session state into a structured payload for scoring and export."""
+    payload = {
+        'nume_pacient': st.session_state.get('nume_pacient'),
+        'cnp': st.session_state.get('cnp'),
+        'sectie': st.session_state.get('sectie'),
+        'ore_spitalizare': st.session_state.get('ore_spitalizare'),
+        'dispozitive': {},
+        'pao2_fio2': st.session_state.get('pao2_fio2'),
+        'trombocite': st.session_state.get('trombocite'),
+        'bilirubina': st.session_state.get('bilirubina'),
+        'glasgow': st.session_state.get('glasgow'),
+        'creatinina': st.session_state.get('creatinina'),
+        'hipotensiune': st.session_state.get('hipotensiune'),
+        'vasopresoare': st.session_state.get('vasopresoare'),
+        'tas': st.session_state.get('tas'),
+        'fr': st.session_state.get('fr'),
+        'cultura_pozitiva': st.session_state.get('cultura_pozitiva'),
+        'bacterie': st.session_state.get('bacterie'),
+        'profil_rezistenta': st.session_state.get('profil_rezistenta'),
+        'tip_infectie': st.session_state.get('tip_infectie'),
+        'comorbiditati': st.session_state.get('comorbiditati_selectate'),
+        'analiza_urina': st.session_state.get('analiza_urina'),
+        'sediment': st.session_state.get('sediment'),
+        'analize': st.session_state.get('analize', {}),
+        'inputuri_lipsa': st.session_state.get('inputuri_lipsa', []),
+    }
+    for d in DEVICES:
+        payload['dispozitive'][d] = {
+            'prezent': st.session_state.get(f"disp_{d}", False),
+            'zile': st.session_state.get(f"zile_{d}", 0)
+        }
+    return payload
+
+def apply_payload(payload: Dict[str, Any]):
+    """Inverse of collect_payload: load a stored payload back into the form widgets' session keys.
+
+    Every form key of the previous patient is dropped first; values the payload lacks (or holds as None)
+    are set to their widget default, so nothing of the previous patient leaks into the next evaluation.
+    """
+    for k in list(st.session_state.keys()):
+        if k.startswith(('com_', 'lab_', 'disp_', 'zile_')) or k in SEDIMENT_DEFAULTS or k in FORM_ONLY_KEYS:
+            del st.session_state[k]
+    for k, default in form_defaults().items():
+        st.session_state[k] = default if payload.get(k) is None else payload[k]
+    devices = payload.get('dispozitive') or {}
+    for d in dict.fromkeys([*DEVICES, *devices]):
+        info = devices.get(d) or {}
+        st.session_state[f'disp_{d}'] = bool(info.get('prezent'))
+        if info.get('prezent'):
+            st.session_state[f'zile_{d}'] = info.get('zile', 0) or 0
+    com = payload.get('comorbiditati') or {}
+    st.session_state['comorbiditati_selectate'] = com
+    for cat, conds in current_rules().comorbiditati.items():
+        for cond, val in conds.items():
+            st.session_state[f'com_{cat}_{cond}'] = (com.get(cat) or {}).get(cond) or ('Nu' if isinstance(val, dict) else False)
+    sediment = payload.get('sediment') or {}
+    st.session_state['sediment'] = sediment
+    for k, default in SEDIMENT_DEFAULTS.items():
+        st.session_state[k] = default if sediment.get(k) is None else sediment[k]
+    analize = payload.get('analize') or {}
+    st.session_state['analize'] = analize
+    for k, default in LAB_DEFAULTS.items():
+        key = 'lab_blood_culture' if k == 'blood_culture_positive' else f'lab_{k}'
+        st.session_state[key] = default if analize.get(k) is None else analize[k]
+
+@st.cache_resource
+def get_patient_store() -> PatientStore:
+    """One worklist store per server process, shared by all sessions."""
+    return PatientStore(WORKLIST_DB)
+
+@st.cache_resource
+def get_snapshot_store() -> SnapshotStore:
+    """Content-addressed store with the full payload of every evaluation."""
+    return SnapshotStore(SNAPSHOT_DIR)
+
+@st.cache_resource
+def get_outbreak_detector() -> OutbreakDetector:
+    """Cluster detector warmed up by replaying the local audit, then fed by every evaluation."""
+    detector = OutbreakDetector()
+    detector.backfill_audit(AUDIT_CSV, get_snapshot_store())
+    return detector
+
+@st.cache_resource
+def get_ward_percentiles() -> WardPercentiles:
+    """Score histograms per (sectie, month), rebuilt from the audit and updated by every evaluation."""
+    wards = WardPercentiles()
+    wards.rebuild_audit(AUDIT_CSV)
+    return wards
+
+@st.cache_resource
+def get_antibiogram() -> Antibiogram:
+    """Lab susceptibility tables, with the positive cultures audited since they were issued and of every new evaluation pooled in."""
+    atb = Antibiogram.load(ANTIBIOGRAM_PATH)
+    atb.backfill_audit(AUDIT_CSV, get_snapshot_store())
+    return atb
+
+@st.cache_resource
+def get_uncertainty_pools() -> EmpiricalPools:
+    """Empirical distributions of lab/SOFA inputs per sectie, from every measured value in the snapshot store
+    (values still at their widget default are left out)."""
+    pools = EmpiricalPools(defaults={**form_defaults(), 'analize': LAB_DEFAULTS})
+    pools.sync(get_snapshot_store())
+    return pools
+
+@st.cache_resource
+def get_knn_index() -> KnnIndex:
+    """Similar-patient index over the shared memory-mapped cohort (persisted vectors while none is built),
+    plus every evaluation recorded since."""
+    store, digest = get_snapshot_store(), current_rules().digest  # vectors encoded under other rules are not reused
+    cohort = CohortStore.open(COHORT_DIR)
+    current = cohort.rules_digest == digest and cohort.retention_generation == store.retention_generation()
+    index = KnnIndex.from_cohort(cohort) if cohort.rows and current else KnnIndex.load(KNN_DIR, digest, store)
+    index.sync(store, sys.modules[__name__])
+    if index.n >= 200_000:
+        index.partition(int(index.n ** 0.5))
+    return index
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def load_snapshot(snapshot_id: str) -> Dict[str, Any]:
+    """Snapshots are immutable (content-addressed), so one process-wide cache serves every session."""
+    return get_snapshot_store().load(snapshot_id)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def trend_series(kind: str, key: Optional[str], since: Optional[str], revision: int) -> Dict[str, Any]:
+    """Downsampled trend per (patient or ward, window), shared by every session.
+
+    `revision` is the last evaluation id of that patient/ward, so a new evaluation refreshes only its own series.
+    """
+    store = get_snapshot_store()
+    if kind == 'pacient':
+        return patient_trend(store, key, since)
+    return ward_trend(store, key, since)
+
+def compact_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Session copy of an evaluation: the payload is referenced by snapshot id instead of duplicated."""
+    if not result.get('snapshot_id'):
+        return result
+    compact = {k: v for k, v in result.items() if k != 'payload'}
+    compact['detalii'] = tuple(result['detalii'])
+    compact['recomandari'] = tuple(result['recomandari'])
+    return compact
+
+def result_payload(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload of a (possibly compacted) evaluation result."""
+    if 'payload' in result:
+        return result['payload']
+    return load_snapshot(result['snapshot_id'])
+
+@contextmanager
+def audit_lock():
+    """Serialise audit writers across sessions and server processes (lock file next to the audit)."""
+    with open(AUDIT_CSV + '.lock', 'a') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+@metrics.timed('io')
+def append_audit(result: Dict[str, Any]):
+    """Append a single result to the local CSV audit file. Minimal columns for privacy."""
+    row = {
+        'timestamp': result['timestamp'],
+        'pacient': result['payload'].get('nume_pacient'),
+        'sectie': result['payload'].get('sectie'),
+        'ore_spitalizare': result['payload'].get('ore_spitalizare'),
+        'scor': result['scor'],
+        'nivel': result['nivel'],
+        'cultura_pozitiva': bool(result['payload'].get('cultura_pozitiva')),
+        'agent': result['payload'].get('bacterie'),
+        'rezistente': ','.join(result['payload'].get('profil_rezistenta', [])),
+        'snapshot_id': result.get('snapshot_id', ''),
+        'versiune_reguli': result.get('versiune_reguli', '')
+    }
+    df = pd.DataFrame([row], columns=AUDIT_COLUMNS)
+    path = Path(AUDIT_CSV)
+    with audit_lock():
+        if not path.exists() or path.stat().st_size == 0:
+            df.to_csv(path, index=False)
+            return
+        with open(path, encoding='utf-8') as fh:
+            header = fh.readline().strip().split(',')
+        if header == AUDIT_COLUMNS:
+            df.to_csv(path, mode='a', header=False, index=False)
+            return
+        # Audit written by an older version: migrate the header once, old rows keep empty new columns.
+        # The migrated copy replaces the audit atomically, so readers never see a partial file.
+        old = pd.read_csv(path)
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix='.audit-', suffix='.csv')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as fh:
+                pd.concat([old.reindex(columns=AUDIT_COLUMNS), df.astype(object)]).to_csv(fh, index=False)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+@metrics.timed('io')
+def load_audit_df() -> pd.DataFrame:
+    if Path(AUDIT_CSV).exists():
+        try:
+            return pd.read_csv(AUDIT_CSV)
+        except Exception:
+            return pd.DataFrame()
+    return pd.DataFrame()
+
+# ---------------- UI: header, nav, pages (includes Analize) ----------------
+
+def render_header():
+    st.markdown('<div class="header">', unsafe_allow_html=True)
+    cols = st.columns([0.6, 4])
+    with cols[0]:
+        if st.button("☰", key='toggle_nav_short'):
+            st.session_state['show_nav'] = not st.session_state.get('show_nav', True)
+        st.markdown('<div style="font-size:12px;color:#9fb0c6;margin-top:6px;">Meniu</div>', unsafe_allow_html=True)
+    with cols[1]:
+        st.markdown(f'<div class="title">{APP_TITLE} <span style="font-weight:400;font-size:12px;color:#9fb0c6">v{VERSION}</span></div>', unsafe_allow_html=True)
+        st.markdown('<div class="subtitle">Platformă demonstrativă — evaluare predictivă IAAM. Instrument academic pentru screening și suport decizional.</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def render_nav():
+    menu = [
+        ("🏠 Pagina principală", "home"),
+        ("🧾 Date pacient", "patient"),
+        ("🩺 Dispozitive invazive", "devices"),
+        ("📊 Scoruri severitate", "severity"),
+        ("🧫 Microbiologie", "microbio"),
+        ("⚕️ Comorbidități", "comorbid"),
+        ("🔬 Analiză urinară", "urine"),
+        ("🧪 Analize laborator", "analize"),
+        ("📁 Rezultate & Istoric", "results"),
+        ("📋 Listă secție", "worklist"),
+    ]
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    for label, key in menu:
+        if st.button(label, key=f"nav_{key}" + str(key)):
+            st.session_state['current_page'] = key
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# Page: Analize
+@metrics.timed('page')
+def page_analize():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h4>Analize laborator — markeri infecție și inflamație</h4>', unsafe_allow_html=True)
+    st.markdown('<div class="small-muted">Introduceți ultimele valori de laborator disponibile. Valorile introduse sunt utilizate pentru a ajusta scorul IAAM (orientativ).</div>', unsafe_allow_html=True)
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.number_input('Leucocite (WBC, x10^3/µL)', min_value=0.0, max_value=200.0, value=float(st.session_state.get('analize', {}).get('wbc', 8.0)), key='lab_wbc')
+        st.number_input('Neutrofile absolute (x10^3/µL) — (opțional)', min_value=0.0, max_value=200.0, value=float(st.session_state.get('analize', {}).get('neut_abs', 5.0) or 0.0), key='lab_neut_abs')
+        st.number_input('Neutrofile % (opțional)', min_value=0.0, max_value=100.0, value=float(st.session_state.get('analize', {}).get('neut_pct', 70.0) or 0.0), key='lab_neut_pct')
+    with c2:
+        st.number_input('CRP (mg/L)', min_value=0.0, max_value=1000.0, value=float(st.session_state.get('analize', {}).get('crp', 20.0)), key='lab_crp')
+        st.number_input('VSH / ESR (mm/h)', min_value=0.0, max_value=200.0, value=float(st.session_state.get('analize', {}).get('esr', 20.0)), key='lab_esr')
+        st.number_input('Procalcitonină (ng/mL)', min_value=0.0, max_value=100.0, value=float(st.session_state.get('analize', {}).get('pct', 0.1)), key='lab_pct')
+    with c3:
+        st.number_input('Presepsină (pg/mL) — dacă este disponibil', min_value=0.0, max_value=20000.0, value=float(st.session_state.get('analize', {}).get('presepsin', 0.0)), key='lab_presepsin')
+        st.number_input('Lactat (mmol/L)', min_value=0.0, max_value=20.0, value=float(st.session_state.get('analize', {}).get('lactate', 1.0)), key='lab_lactate')
+        st.checkbox('Hemocultură pozitivă', key='lab_blood_culture')
+    st.multiselect('Rezultate în așteptare (estimate din distribuția secției)', list(UNCERTAIN_INPUTS),
+                   format_func=lambda k: UNCERTAIN_INPUTS[k][0], key='inputuri_lipsa')
+    # save to session_state['analize']
+    st.session_state['analize'] = {
+        'wbc': st.session_state.get('lab_wbc'),
+        'neut_abs': st.session_state.get('lab_neut_abs'),
+        'neut_pct': st.session_state.get('lab_neut_pct'),
+        'crp': st.session_state.get('lab_crp'),
+        'esr': st.session_state.get('lab_esr'),
+        'pct': st.session_state.get('lab_pct'),
+        'presepsin': st.session_state.get('lab_presepsin'),
+        'lactate': st.session_state.get('lab_lactate'),
+        'blood_culture_positive': st.session_state.get('lab_blood_culture')
+    }
+    st.markdown('<div class="small-muted">Note: pragurile utilizate sunt orientative. Adaptați-le la protocoalele locale.</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# ---------------- Other pages definitions ----------------
+
+@metrics.timed('page')
+def page_home():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h3>EpiMind — Context, scop și metodologie</h3>', unsafe_allow_html=True)
+    st.markdown(
+        """
+        <div class="small-muted">
+        <strong>Context:</strong> Infecțiile asociate asistenței medicale (IAAM) reprezintă un risc major pentru pacient
+        și o sursă semnificativă de morbiditate, mortalitate și costuri spitalicești. Screeningul proactiv facilitează
+        identificarea timpurie a pacienților cu risc crescut (MDR screening, izolare, antibioterapie direcționată).
+        <br/><br/>
+        <strong>Scop:</strong> EpiMind oferă un instrument academic pentru triere și suport decizional bazat pe reguli
+        clinice și scoruri validate (SOFA/qSOFA) combinate cu factori specifici spitalului: dispozitive invazive,
+        durata internării, culturi microbiologice și comorbidități.
+        <br/><br/>
+        <strong>Metodologie:</strong> Motorul de evaluare este determinist — combină reguli temporale, greutăți pentru
+        dispozitive invazive, penalizări pentru profiluri de rezistență și componente de severitate. Scorul rezultat
+        este orientativ și trebuie interpretat în context clinic.
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+    st.markdown('<hr/>', unsafe_allow_html=True)
+    st.markdown('<h4>Module</h4>', unsafe_allow_html=True)
+    cols = st.columns([1,1,1])
+    with cols[0]:
+        st.markdown('<div class="muted-box"><strong>Evaluare pacient</strong><br/>Introduceți date demografice, durata internării și secția. Validare minimală pentru simulări reproducibile.</div>', unsafe_allow_html=True)
+    with cols[1]:
+        st.markdown('<div class="muted-box"><strong>Comorbidități</strong><br/>Catalog structurat al afecțiunilor principale (cardiovascular, respirator, metabolic etc.) cu greutăți predefinite pentru model.</div>', unsafe_allow_html=True)
+    with cols[2]:
+        st.markdown('<div class="muted-box"><strong>Microbiologie & Urină</strong><br/>Permite introducerea rezultatelor culturilor, profilurilor de rezistență și interpretarea sedimentului urinar pentru suspiciune ITU.</div>', unsafe_allow_html=True)
+    st.markdown('<hr/>', unsafe_allow_html=True)
+    st.markdown('<h4>Componente detaliate evaluate</h4>', unsafe_allow_html=True)
+    st.markdown(
+        """
+        <ul class="small-muted">
+          <li><strong>Timp de internare</strong> — criteriu temporal IAAM (>=48h)</li>
+          <li><strong>Dispozitive invazive</strong> — CVC, ventilație mecanică, sondă urinară, traheostomie etc. (durata influențează riscul)</li>
+          <li><strong>Scoruri de severitate</strong> — SOFA (detaliat), qSOFA, APACHE-like (simplificat)</li>
+          <li><strong>Microbiologie</strong> — cultură pozitivă, profil de rezistență (ESBL/CRE/KPC/MRSA etc.)</li>
+          <li><strong>Comorbidități</strong> — sumar ponderat în stil Charlson-like pentru evaluare a vulnerabilității</li>
+          <li><strong>Analiză urinară</strong> — interpretare sediment, nitriți, esteraă, poziționare rezultatelor</li>
+          <li><strong>Analize laborator</strong> — WBC, CRP, PCT, Presepsină, Lactat etc. integrate în scorul IAAM</li>
+        </ul>
+        """,
+        unsafe_allow_html=True,
+    )
+    st.markdown('<hr/>', unsafe_allow_html=True)
+    st.markdown('<div class="small-muted">Documentație: acest instrument servește ca suport academic. În mediul clinic producție se recomandă validare locală, audit regulat, criptare a datelor și control de acces.</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@metrics.timed('page')
+def page_patient():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h4>Date pacient</h4>', unsafe_allow_html=True)
+    c1, c2, c3 = st.columns([3,2,2])
+    with c1:
+        st.text_input('Nume / Cod pacient *', key='nume_pacient', placeholder='Pacient_001', help='Identificator pentru raport. Nu încărca date personale sensibile în demo.')
+        st.text_input('CNP (opțional)', key='cnp', help='Dacă este necesar pentru evidență locală — atenție la confidențialitate')
+        st.selectbox('Secția', SECTII, key='sectie')
+    with c2:
+        st.number_input('Ore internare *', min_value=0, max_value=10000, value=st.session_state.get('ore_spitalizare',96), key='ore_spitalizare', help='Criteriu temporal: IAAM >=48h')
+        st.selectbox('Tip internare', ['Programat','Urgent'], key='tip_internare')
+    with c3:
+        st.date_input('Data evaluării', key='data_evaluare')
+        st.text_input('Cod intern (opțional)', key='cod_intern')
+    st.markdown('<div class="small-muted">Câmpurile cu * sunt esențiale.</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@metrics.timed('page')
+def page_devices():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h4>Dispozitive invazive (selectați prezența și durata)</h4>', unsafe_allow_html=True)
+    cols = st.columns(3)
+    for i, d in enumerate(DEVICES):
+        with cols[i % 3]:
+            present = st.checkbox(d, key=f'disp_{d}')
+            if present:
+                st.number_input('Zile (durată)', 0, 365, 3, key=f'zile_{d}')
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@metrics.timed('page')
+def page_severity():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h4>Parametri clinici și scoruri</h4>', unsafe_allow_html=True)
+    c1, c2 = st.columns(2)
+    with c1:
+        st.number_input('PaO2/FiO2', 50, 500, value=st.session_state.get('pao2_fio2',400), key='pao2_fio2')
+        st.number_input('Trombocite (x10^3/µL)', 0, 1000, value=st.session_state.get('trombocite',200), key='trombocite')
+        st.number_input('Bilirubină (mg/dL)', 0.0, 30.0, value=st.session_state.get('bilirubina',1.0), key='bilirubina')
+    with c2:
+        st.number_input('Glasgow', 3, 15, value=st.session_state.get('glasgow',15), key='glasgow')
+        st.number_input('Creatinină (mg/dL)', 0.1, 20.0, value=st.session_state.get('creatinina',1.0), key='creatinina')
+        st.checkbox('Hipotensiune', key='hipotensiune')
+        st.checkbox('Vasopresoare', key='vasopresoare')
+    st.number_input('TAS (mmHg)', 40, 220, value=st.session_state.get('tas',120), key='tas')
+    st.number_input('FR (/min)', 8, 60, value=st.session_state.get('fr',18), key='fr')
+    st.markdown('<div class="small-muted">SOFA și qSOFA sunt calculate automat pe baza acestor valori.</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@metrics.timed('page')
+def page_microbio():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h4>Microbiologie</h4>', unsafe_allow_html=True)
+    cultura = st.checkbox('Cultură pozitivă', key='cultura_pozitiva')
+    if cultura:
+        st.selectbox('Agent patogen', [''] + list(REZISTENTA_PROFILE.keys()), key='bacterie')
+        sel = st.session_state.get('bacterie', '')
+        if sel:
+            st.multiselect('Profil rezistență', REZISTENTA_PROFILE.get(sel, []), key='profil_rezistenta')
+    st.selectbox('Tip infecție (ICD-10)', list(ICD_CODES.keys()), key='tip_infectie')
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@metrics.timed('page')
+def page_comorbid():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h4>Comorbidități (selectați severitatea dacă este cazul)</h4>', unsafe_allow_html=True)
+    com_select = {}
+    catalogue = current_rules().comorbiditati
+    cats = list(catalogue.keys())
+    cols = st.columns(3)
+    for i, cat in enumerate(cats):
+        with cols[i % 3]:
+            with st.expander(cat, expanded=False):
+                for cond, val in catalogue[cat].items():
+                    key = f'com_{cat}_{cond}'
+                    if isinstance(val, dict):
+                        choice = st.selectbox(cond, ['Nu'] + list(val.keys()), key=key)
+                        if choice and choice != 'Nu':
+                            com_select.setdefault(cat, {})[cond] = choice
+                    else:
+                        v = st.checkbox(cond, key=key)
+                        if v:
+                            com_select.setdefault(cat, {})[cond] = True
+    st.session_state['comorbiditati_selectate'] = com_select
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@metrics.timed('page')
+def page_urine():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h4>Analiză urinară — sediment</h4>', unsafe_allow_html=True)
+    st.checkbox('Analiză urinară disponibilă', key='analiza_urina')
+    if st.session_state.get('analiza_urina', False):
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            st.number_input('Leucocite / câmp', 0, 200, value=st.session_state.get('leu_urina',5), key='leu_urina')
+            st.number_input('Eritrocite / câmp', 0, 200, value=st.session_state.get('eri_urina',1), key='eri_urina')
+            st.slider('Bacterii (0-4+)', 0, 4, value=st.session_state.get('bact_urina',0), key='bact_urina')
+        with c2:
+            st.number_input('Celule epiteliale', 0, 50, value=st.session_state.get('cel_epit',2), key='cel_epit')
+            st.checkbox('Nitriți +', key='nitriti')
+            st.checkbox('Esterază +', key='esteraza')
+        with c3:
+            st.checkbox('Cilindri', key='cilindri')
+            if st.session_state.get('cilindri', False):
+                st.text_input('Tip cilindri', key='tip_cilindri')
+            st.text_input('Cristale (descriere)', key='cristale')
+        st.session_state['sediment'] = {
+            'leu_urina': st.session_state.get('leu_urina', 0),
+            'eri_urina': st.session_state.get('eri_urina', 0),
+            'bact_urina': st.session_state.get('bact_urina', 0),
+            'cel_epit': st.session_state.get('cel_epit', 0),
+            'nitriti': st.session_state.get('nitriti', False),
+            'esteraza': st.session_state.get('esteraza', False),
+            'cilindri': st.session_state.get('cilindri', False),
+            'tip_cilindri': st.session_state.get('tip_cilindri', ''),
+            'cristale': st.session_state.get('cristale', '')
+        }
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def render_uncertainty(payload: Dict[str, Any]):
+    """Score band and level probabilities while some results are pending, and which result to chase first."""
+    with st.expander('🎲 Incertitudine — rezultate în așteptare', expanded=True):
+        pools = get_uncertainty_pools()
+        pools.sync(get_snapshot_store())
+        sim = simulate(payload, pools, sys.modules[__name__])
+        st.markdown(f"**Scor probabil:** {sim['scor_p50']} (interval 90%: {sim['scor_p05']}–{sim['scor_p95']}) din {sim['extrageri']} extrageri")
+        probs = pd.DataFrame({'Nivel': list(sim['probabilitati']), 'Probabilitate': list(sim['probabilitati'].values())})
+        st.dataframe(probs.style.format({'Probabilitate': '{:.0%}'}), use_container_width=True, hide_index=True)
+        if sim['prioritate']:
+            st.markdown('**Rezultate de obținut cu prioritate** (reducerea incertitudinii asupra nivelului de risc)')
+            st.dataframe(pd.DataFrame(sim['prioritate']).drop(columns=['input']), use_container_width=True, hide_index=True)
+
+def render_similar_patients(payload: Dict[str, Any], k: int = 5):
+    """Most similar past evaluations of other patients and how those patients evolved afterwards."""
+    with st.expander('👥 Pacienți similari din istoric — evoluție', expanded=False):
+        try:
+            index = get_knn_index()
+            index.sync(get_snapshot_store(), sys.modules[__name__])
+            rules = current_rules()
+            neighbours = index.search(encode_payload(payload, sys.modules[__name__], rules), k=k,
+                                      exclude_pacient=payload.get('nume_pacient'), rules_digest=rules.digest)
+        except Exception as e:
+            st.warning('Index pacienți similari indisponibil: ' + str(e))
+            return
+        if not neighbours:
+            st.markdown('Nu există încă evaluări comparabile în istoric.')
+            return
+        rows = [{**nb, **evolution(get_snapshot_store(), nb['pacient'], nb['timestamp'])} for nb in neighbours]
+        st.dataframe(pd.DataFrame(rows).drop(columns=['eval_id']), use_container_width=True, hide_index=True)
+        st.markdown('<div class="small-muted">Distanța este măsurată în puncte de scor pe componentele motorului IAAM.</div>', unsafe_allow_html=True)
+
+def render_empiric_options(payload: Dict[str, Any], top: int = 5):
+    """Antibiotics ranked by local coverage for the isolate; empiric (ward mix) while the resistance profile is empty."""
+    agent = payload.get('bacterie', '')
+    rez = payload.get('profil_rezistenta') or None
+    atb = get_antibiogram()
+    options = atb.suggest(agent, payload.get('sectie'), rez, top=top)
+    if rez:
+        missing = atb.missing_mechanisms(agent, payload.get('sectie'), rez)
+        known = [r for r in rez if r not in missing]
+        if known:
+            st.markdown(f"**Opțiuni după antibiograma locală** ({agent}, {', '.join(known)})")
+        if missing:
+            scope = 'acoperirile de mai jos nu țin cont de acest mecanism' if known else 'nu se poate estima acoperirea'
+            st.warning(f"Fără date pentru mecanism în antibiograma locală: {', '.join(missing)} ({agent}) — {scope}. "
+                       "Ghidați terapia după antibiograma izolatului.")
+    else:
+        st.markdown(f"**Sugestii empirice după antibiograma locală** ({agent}, secția {payload.get('sectie') or '—'})")
+    if not options:
+        st.markdown('- Consultați antibiograma locală')
+        return
+    for o in options:
+        warn = ' ⚠️ puține izolate' if o['putine_izolate'] else ''
+        regim = f" — {o['regim']}" if o['regim'] else ''
+        st.markdown(f"- **{o['antibiotic']}**: acoperire {o['acoperire']:.0f}% (n={o['testate']}, date {o['nivel']}){warn}{regim}")
+    note = 'Procent de izolate sensibile din datele cumulative ale laboratorului'
+    if not rez and options[0].get('izolate_noi'):
+        note += f", actualizat cu culturile raportate ulterior (n={options[0]['izolate_noi']})"
+    st.markdown(f'<div class="small-muted">{note}. Decizia terapeutică aparține medicului curant.</div>', unsafe_allow_html=True)
+
+@metrics.timed('page')
+def page_results_and_history():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h4>Rezultate & Istoric</h4>', unsafe_allow_html=True)
+    last = st.session_state.get('last_result')
+    if last:
+        payload = result_payload(last); scor = last['scor']; nivel = last['nivel']; detalii = last['detalii']; recomandari = last['recomandari']
+        cols = st.columns(4)
+        with cols[0]:
+            st.markdown(f'<div class="metric"><div class="metric-value">{scor}</div><div class="small-muted">Scor IAAM</div></div>', unsafe_allow_html=True)
+        with cols[1]:
+            st.markdown(f'<div class="metric"><div style="font-weight:700;font-size:16px;">{nivel}</div><div class="small-muted">Nivel risc</div></div>', unsafe_allow_html=True)
+        with cols[2]:
+            sofa_val, _ = calculate_sofa_detailed(payload); st.markdown(f'<div class="metric"><div class="metric-value">{sofa_val}</div><div class="small-muted">SOFA</div></div>', unsafe_allow_html=True)
+        with cols[3]:
+            qsofa_val = calculate_qsofa(payload); st.markdown(f'<div class="metric"><div class="metric-value">{qsofa_val}</div><div class="small-muted">qSOFA</div></div>', unsafe_allow_html=True)
+
+        risk_map = {'CRITIC':'risk-critical','FOARTE ÎNALT':'risk-high','ÎNALT':'risk-high','MODERAT':'risk-moderate','SCĂZUT':'risk-low'}
+        banner_class = risk_map.get(nivel, 'risk-low')
+        st.markdown(f'<div class="risk-alert {banner_class}">⚠️ <strong>RISC {nivel}</strong> — Scor: {scor} • {payload.get("nume_pacient")}</div>', unsafe_allow_html=True)
+        pct, n_sectie = get_ward_percentiles().percentile(payload.get('sectie'), last['timestamp'], scor)
+        if pct is not None:
+            st.markdown(f'<div class="small-muted">Percentila {pct:.0f} pentru secția {payload.get("sectie")} în {month_of(last["timestamp"])} (n={n_sectie} evaluări)</div>', unsafe_allow_html=True)
+
+        t1, t2, t3, t4 = st.tabs(['🔎 Analiză','🧾 Recomandări','🔬 Laborator','📥 Export'])
+        with t1:
+            st.markdown('**Componente scor (detaliate)**')
+            for d in detalii:
+                st.markdown(f'- {d}')
+            if payload.get('inputuri_lipsa'):
+                render_uncertainty(payload)
+            if nivel in ('ÎNALT', 'FOARTE ÎNALT', 'CRITIC'):
+                render_similar_patients(payload)
+            fig = go.Figure(go.Indicator(mode='gauge+number', value=scor, domain={'x':[0,1],'y':[0,1]}, gauge={'axis':{'range':[0,200]}}))
+            fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=280)
+            st.plotly_chart(fig, use_container_width=True)
+            if payload.get('nume_pacient'):
+                st.markdown('**Evoluție scor pacient**')
+                render_score_trend('pacient', payload.get('nume_pacient'))
+        with t2:
+            st.markdown('**Recomandări practice**')
+            for i, r in enumerate(recomandari, 1):
+                st.markdown(f'{i}. {r}')
+            if payload.get('bacterie'):
+                render_empiric_options(payload)
+        with t3:
+            st.markdown('**Microbiologie & Urină & Analize**')
+            if payload.get('cultura_pozitiva'):
+                st.markdown(f'- Agent: **{payload.get("bacterie")}**')
+                st.markdown(f"- Rezistențe: {', '.join(payload.get('profil_rezistenta', [])) or '—'}")
+            else:
+                st.markdown('- Fără izolat')
+            if payload.get('analiza_urina'):
+                interp, risc = analyze_urinary_sediment(payload.get('sediment', {}))
+                st.markdown(f'- Probabilitate ITU: **{risc}%**')
+                for it in interp:
+                    st.markdown(f'  - {it}')
+            else:
+                st.markdown('- Analiză urinară nedisponibilă')
+
+            # show lab summary
+            analize = payload.get('analize', {})
+            if analize:
+                st.markdown('\n**Rezultate laborator (sumar)**')
+                for k, v in analize.items():
+                    st.markdown(f'- {k}: {v}')
+            else:
+                st.markdown('\n- Rezultate laborator nedisponibile')
+        with t4:
+            # Download contents are built only when the button is clicked, not on every rerun.
+            raport = lambda: patient_report(payload, {**last, 'recomandari': list(recomandari)}, version=VERSION)
+            stamp = datetime.now().strftime('%Y%m%d')
+            st.download_button('📥 Descarcă raport JSON', lambda: render_json(raport()), file_name=f"epimind_{payload.get('nume_pacient')}_{stamp}.json", mime='application/json', use_container_width=True)
+            st.download_button('📥 Descarcă raport HTML', lambda: render_html(raport()), file_name=f"epimind_{payload.get('nume_pacient')}_{stamp}.html", mime='text/html', use_container_width=True)
+            short_csv = lambda: pd.DataFrame([{
+                'data': datetime.now().strftime('%Y-%m-%d'),
+                'pacient': payload.get('nume_pacient'),
+                'sectie': payload.get('sectie'),
+                'ore_spitalizare': payload.get('ore_spitalizare'),
+                'scor': scor,
+                'nivel': nivel
+            }]).to_csv(index=False)
+            st.download_button('📥 Descarcă CSV scurt', short_csv, file_name=f"epimind_stats_{stamp}.csv", mime='text/csv', use_container_width=True)
+    else:
+        st.info('Nu există evaluări recente. Completați datele și apăsați butonul de evaluare.')
+
+    st.markdown('---')
+    st.markdown('**Istoric audit (local)**')
+    df_audit = load_audit_df()
+    if not df_audit.empty:
+        st.dataframe(df_audit.sort_values('timestamp', ascending=False).head(200), use_container_width=True)
+        st.download_button('Descarcă Istoric (.csv)', lambda: Path(AUDIT_CSV).read_bytes(), file_name=AUDIT_CSV, mime='text/csv')
+        if 'snapshot_id' in df_audit.columns:
+            recent = df_audit.dropna(subset=['snapshot_id']).sort_values('timestamp', ascending=False).head(200)
+            if not recent.empty:
+                labels = {f"{r.timestamp} • {r.pacient} • {r.scor} ({r.nivel})": r.snapshot_id for r in recent.itertuples()}
+                h1, h2 = st.columns([3, 1])
+                with h1:
+                    pick = st.selectbox('Evaluare din istoric', list(labels.keys()), key='hist_pick')
+                with h2:
+                    if st.button('Redeschide evaluarea', key='hist_open'):
+                        try:
+                            payload = get_snapshot_store().load(labels[pick])
+                            apply_payload(payload)
+                            rules = current_rules()
+                            scor_h, nivel_h, detalii_h, rec_h = calculate_iaam_risk(payload, rules)
+                            st.session_state['last_result'] = compact_result({
+                                'payload': payload, 'scor': scor_h, 'nivel': nivel_h, 'detalii': detalii_h,
+                                'recomandari': rec_h, 'timestamp': pick.split(' • ')[0], 'snapshot_id': labels[pick],
+                                'versiune_reguli': rules.label
+                            })
+                            st.success('Evaluare redeschisă.')
+                        except KeyError:
+                            st.error('Snapshot indisponibil (eliminat prin retenție).')
+        if st.button('🗑 Șterge istoric (local)'):
+            try:
+                os.remove(AUDIT_CSV)
+                st.success('Fișier audit șters.')
+            except Exception as e:
+                st.error('Eroare la ștergere: ' + str(e))
+    else:
+        st.markdown('Nu există date în auditul local.')
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@metrics.timed('page')
+def page_worklist():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<h4>Listă secție — pacienți curenți ordonați după scor</h4>', unsafe_allow_html=True)
+    c1, c2, c3, c4 = st.columns([2, 3, 2, 2])
+    with c1:
+        sectie = st.selectbox('Secția', ['Toate'] + SECTII, key='wl_sectie')
+    with c2:
+        niveluri = st.multiselect('Nivel risc', NIVELURI, key='wl_niveluri')
+    with c3:
+        search = st.text_input('Caută pacient', key='wl_search')
+    with c4:
+        order_by = st.selectbox('Sortare', ['scor', 'actualizat', 'pacient', 'ore_spitalizare'], key='wl_order')
+    clusters = get_outbreak_detector().active()
+    if clusters:
+        st.markdown('**🚨 Clustere active (același agent + mecanism de rezistență)**')
+        st.dataframe(pd.DataFrame(clusters), use_container_width=True, hide_index=True)
+    page_size = 25
+    page_no = int(st.session_state.get('wl_page', 1))
+    t0 = time.perf_counter()
+    rows, total = get_patient_store().query(
+        sectie=None if sectie == 'Toate' else sectie, niveluri=niveluri, search=search.strip(),
+        order_by=order_by, descending=order_by != 'pacient', limit=page_size, offset=(page_no - 1) * page_size,
+    )
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    pages = max(1, -(-total // page_size))
+    if rows:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    else:
+        st.markdown('Nu există pacienți în listă pentru filtrele selectate.')
+    p1, p2 = st.columns([1, 3])
+    with p1:
+        st.number_input('Pagina', min_value=1, max_value=pages, value=min(page_no, pages), key='wl_page')
+    with p2:
+        budget = '' if elapsed_ms <= LIST_LATENCY_BUDGET_MS else ' — peste ținta de latență'
+        st.markdown(f'<div class="small-muted">{total} pacienți • {pages} pagini • interogare {elapsed_ms:.1f} ms{budget}</div>', unsafe_allow_html=True)
+    if rows:
+        o1, o2, o3 = st.columns([3, 1, 1])
+        with o1:
+            pick = st.selectbox('Pacient', [r['pacient'] for r in rows], key='wl_pick')
+        with o2:
+            if st.button('Deschide pacient', key='wl_open'):
+                payload = get_patient_store().get(pick)
+                if payload:
+                    apply_payload(payload)
+                    st.session_state['current_page'] = 'patient'
+        with o3:
+            if st.button('Externează', key='wl_discharge', help='Scoate pacientul din lista secției; istoricul evaluărilor rămâne'):
+                get_patient_store().remove(pick)
+                st.rerun()
+    with st.expander('📈 Trend secție (scor mediu și maxim pe zi)', expanded=False):
+        render_score_trend('sectie', None if sectie == 'Toate' else sectie)
+    render_ward_reports(None if sectie == 'Toate' else sectie)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+TREND_WINDOWS = {'7 zile': 7, '30 zile': 30, '90 zile': 90, '1 an': 365, 'Tot istoricul': None}
+
+def render_score_trend(kind: str, key: Optional[str]):
+    """Score trend of a patient or a ward (daily mean/max) over the selected window, as WebGL traces."""
+    label = st.selectbox('Fereastră trend', list(TREND_WINDOWS), index=1, key=f'trend_{kind}')
+    days = TREND_WINDOWS[label]
+    # Whole days, so the window (and its cache entry) stays the same for every rerun of the day
+    since = (datetime.now() - timedelta(days=days)).date().isoformat() if days else None
+    store = get_snapshot_store()
+    revision = store.last_evaluation_id(pacient=key) if kind == 'pacient' else store.last_evaluation_id(sectie=key)
+    series = trend_series(kind, key, since, revision)
+    if not series['x']:
+        st.markdown('<div class="small-muted">Nu există evaluări în fereastra selectată.</div>', unsafe_allow_html=True)
+        return
+    fig = go.Figure()
+    if kind == 'pacient':
+        fig.add_trace(go.Scattergl(x=series['x'], y=series['y'], mode='lines+markers', name='Scor'))
+    else:
+        fig.add_trace(go.Scattergl(x=series['x'], y=series['medie'], mode='lines', name='Scor mediu/zi',
+                                   customdata=series['evaluari'], hovertemplate='%{x}: %{y} (%{customdata} evaluări)<extra></extra>'))
+        fig.add_trace(go.Scattergl(x=series['x'], y=series['max'], mode='lines', name='Scor maxim/zi', line={'dash': 'dot'}))
+    for prag, nivel, _ in current_rules().levels[:-1]:
+        fig.add_hline(y=prag, line={'width': 1, 'dash': 'dash', 'color': 'rgba(120,120,120,0.5)'},
+                      annotation_text=nivel, annotation_position='top left')
+    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=300,
+                      margin={'l': 10, 'r': 10, 't': 10, 'b': 10}, legend={'orientation': 'h'})
+    st.plotly_chart(fig, use_container_width=True)
+    unit = 'evaluări' if kind == 'pacient' else 'zile'
+    st.markdown(f'<div class="small-muted">{series["n"]} {unit} în fereastră • {len(series["x"])} puncte afișate</div>', unsafe_allow_html=True)
+
+def render_ward_reports(sectie: Optional[str]):
+    """Per-patient reports of a ward for the infection-control meeting, generated on click."""
+    with st.expander('📦 Rapoarte secție (toți pacienții)', expanded=False):
+        r1, r2 = st.columns(2)
+        with r1:
+            days = st.selectbox('Perioada', [7, 14, 30, 90], format_func=lambda d: f'ultimele {d} zile', key='rep_days')
+        with r2:
+            fmt = st.selectbox('Format', ['zip', 'ndjson'], format_func=lambda f: {'zip': 'ZIP (JSON + HTML)', 'ndjson': 'NDJSON'}[f], key='rep_fmt')
+        since = (datetime.now() - timedelta(days=int(days))).isoformat()
+        store, engine = get_snapshot_store(), sys.modules[__name__]
+
+        def build() -> bytes:
+            # Streamlit serves downloads from memory; only the finished archive is held, not the reports
+            with tempfile.SpooledTemporaryFile(max_size=16 * 2 ** 20) as out:
+                reports = ward_reports(store, engine, sectie, since)
+                if fmt == 'zip':
+                    write_zip(out, reports, sectie or '', f'ultimele {days} zile')
+                else:
+                    write_ndjson(out, reports)
+                out.seek(0)
+                return out.read()
+
+        name = f"epimind_{sectie or 'toate'}_{datetime.now().strftime('%Y%m%d')}.{fmt}"
+        st.download_button('📥 Generează și descarcă', build, file_name=name,
+                           mime='application/zip' if fmt == 'zip' else 'application/x-ndjson', key='rep_download')
+        st.markdown(f"<div class=\"small-muted\">Ultima evaluare a fiecărui pacient din secția {sectie or 'toate'} în perioadă, cu istoricul evaluărilor.</div>", unsafe_allow_html=True)
+
+def render_memory_diagnostics():
+    """Approximate memory per live session and per key of the current session (EPIMIND_DIAG=1)."""
+    with st.expander('🧠 Diagnostic memorie sesiuni', expanded=False):
+        rows = sessions.REGISTRY.report()
+        if rows:
+            st.markdown(f'**{len(rows)} sesiuni active • ~{sum(r["octeti"] for r in rows) / 1024:.1f} KiB total** (TTL inactivitate: {sessions.SESSION_TTL:.0f}s)')
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        st.markdown('**Sesiunea curentă — chei după dimensiune**')
+        per_key = sessions.key_footprint(st.session_state)
+        st.dataframe(pd.DataFrame(per_key, columns=['cheie', 'octeti']).head(40), use_container_width=True, hide_index=True)
+
+# ---------------- Main & layout ----------------
+
+def render_current_page():
+    page = st.session_state.get('current_page','home')
+    if page == 'home':
+        page_home()
+    elif page == 'patient':
+        page_patient()
+    elif page == 'devices':
+        page_devices()
+    elif page == 'severity':
+        page_severity()
+    elif page == 'microbio':
+        page_microbio()
+    elif page == 'comorbid':
+        page_comorbid()
+    elif page == 'urine':
+        page_urine()
+    elif page == 'analize':
+        page_analize()
+    elif page == 'results':
+        page_results_and_history()
+    elif page == 'worklist':
+        page_worklist()
+    else:
+        st.info('Pagina nu există')
+
+def main():
+    init_defaults()
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        sessions.REGISTRY.touch(ctx.session_id, ctx.session_state)
+    render_header()
+
+    if st.session_state.get('show_nav', True):
+        left, main_col = st.columns([1.2, 4])
+        with left:
+            render_nav()
+        with main_col:
+            render_current_page()
+    else:
+        render_current_page()
+
+    st.markdown('<hr/>', unsafe_allow_html=True)
+    c1, c2, c3 = st.columns([1,1,3])
+    with c1:
+        if st.button('▶️ Evaluează riscul IAAM', key='compute_main'):
+            missing = []
+            if not st.session_state.get('nume_pacient'):
+                missing.append('Nume pacient')
+            if st.session_state.get('ore_spitalizare',0) is None:
+                missing.append('Ore spitalizare')
+            if missing:
+                st.error('Completați: ' + ', '.join(missing))
+            else:
+                payload = collect_payload()
+                rules = current_rules()
+                scor, nivel, detalii, recomandari = calculate_iaam_risk(payload, rules)
+                result = {
+                    'payload': payload,
+                    'scor': scor,
+                    'nivel': nivel,
+                    'detalii': detalii,
+                    'recomandari': recomandari,
+                    'timestamp': datetime.now().isoformat(),
+                    'versiune_reguli': rules.label
+                }
+                try:
+                    result['snapshot_id'] = get_snapshot_store().record(result)
+                except Exception as e:
+                    st.warning('Eroare salvare snapshot: ' + str(e))
+                st.session_state['last_result'] = compact_result(result)
+                wards = get_ward_percentiles()  # built before the audit append so this evaluation is counted once
+                try:
+                    append_audit(result)
+                except Exception as e:
+                    st.warning('Eroare scriere audit: ' + str(e))
+                wards.observe(payload.get('sectie'), result['timestamp'], scor)
+                try:
+                    get_patient_store().upsert(payload, scor, nivel, result['timestamp'])
+                except Exception as e:
+                    st.warning('Eroare actualizare listă secție: ' + str(e))
+                try:
+                    alerts = get_outbreak_detector().observe_payload(payload, result['timestamp'])
+                    append_alerts(alerts)
+                    for a in alerts:
+                        st.error(f"🚨 Posibil focar: {a['bacterie']} {a['rezistenta']} — {a['pacienti']} pacienți în {a['sectie']} în ultimele {a['fereastra_ore']:.0f}h")
+                except Exception as e:
+                    st.warning('Eroare detector focare: ' + str(e))
+                try:
+                    get_antibiogram().observe_payload(payload)
+                except Exception as e:
+                    st.warning('Eroare actualizare antibiogramă: ' + str(e))
+                st.success(f'Calcul efectuat — Scor: {scor} • Nivel: {nivel}')
+                st.session_state['current_page'] = 'results'
+    with c2:
+        if st.button('⟳ Reset formular', key='reset_main'):
+            keys = [k for k in list(st.session_state.keys()) if k not in ('last_result','show_nav','current_page')]
+            for k in keys:
+                try:
+                    del st.session_state[k]
+                except Exception:
+                    pass
+            st.experimental_rerun()
+    with c3:
+        st.markdown('<div class="small-muted">EpiMind • Demo academic • Datele se salvează local (CSV). Pentru producție: integrare autentificare, stocare securizată și audit externalizat. • Reguli: ' + current_rules().version + '</div>', unsafe_allow_html=True)
+        if RULES.error:
+            st.warning('Fișier reguli invalid, rămâne activă versiunea anterioară: ' + RULES.error)
+    if sessions.DIAGNOSTICS:
+        render_memory_diagnostics()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Local antibiogram index for empiric therapy suggestions
+
+Loads the cumulative susceptibility tables published by the microbiology lab (one or more CSVs:
+bacterie, sectie, rezistenta, antibiotic, testate, sensibile[, regim]; an empty sectie is the
+hospital-wide table, an empty rezistenta covers all isolates, "ESBL+KPC" is a combined stratum)
+and precomputes, per (bacterie, sectie, resistance mask), the antibiotics ranked by coverage.
+A suggestion is one dict lookup. Ward tables with fewer than MIN_ISOLATES isolates for an
+antibiotic fall back to the hospital-wide figure (CLSI M39); a mask without its own stratum
+takes, per antibiotic, the lowest coverage among its mechanisms. A mechanism the tables have no
+stratum for is reported as missing rather than silently ranked as if the isolate had none.
+
+When the resistance profile is not known yet, the empiric ranking pools the lab's all-isolate
+counts with the positive cultures reported after the tables were issued (first isolate per patient
+and organism, from the payloads' `bacterie` and `profil_rezistenta`): each new isolate adds its mask's expected
+susceptibility to every antibiotic, so a run of KPC isolates in a ward lowers carbapenem coverage
+there straight away. Every culture updates its ward and the hospital-wide entry in O(antibiotics).
+
+Query the tables, optionally warmed up with the audit history:
+    python epimind_antibiogram.py suggest --bacterie "Klebsiella pneumoniae" --sectie ATI --rezistenta KPC
+    python epimind_antibiogram.py summary --audit epimind_audit.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from epimind_outbreak import read_cultures
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+
+ANTIBIOGRAM_PATH = Path(os.environ.get('EPIMIND_ANTIBIOGRAM', str(Path(__file__).with_name('epimind_antibiogram.csv'))))
+MIN_ISOLATES = 30          # CLSI M39: below this a ward figure is replaced by the hospital-wide one
+MAX_PRECOMPUTED = 8        # organisms with more mechanisms get their mask rankings on first use
+REQUIRED_COLUMNS = ('bacterie', 'antibiotic', 'testate')
+
+Mask = FrozenSet[str]
+
+
+def mask_of(rezistente: Iterable[str]) -> Mask:
+    return frozenset(str(r).strip() for r in rezistente if r and str(r).strip())
+
+
+def read_tables(path: Path) -> pd.DataFrame:
+    """Susceptibility counts of one CSV or of every CSV in a directory, summed per stratum."""
+    path = Path(path)
+    files = sorted(path.glob('*.csv')) if path.is_dir() else [path]
+    frames = []
+    for f in files:
+        df = pd.read_csv(f, dtype={'bacterie': str, 'sectie': str, 'rezistenta': str, 'antibiotic': str, 'regim': str})
+        missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+        if 'sensibile' not in df.columns and 'procent_s' not in df.columns:
+            missing.append('sensibile/procent_s')
+        if missing:
+            raise ValueError(f"{f}: antibiogramă invalidă, lipsesc coloanele {', '.join(missing)}")
+        if 'sensibile' not in df.columns:
+            df['sensibile'] = (df['procent_s'].astype(float) * df['testate'].astype(float) / 100.0).round()
+        for col in ('sectie', 'rezistenta', 'regim'):
+            df[col] = df[col].fillna('').str.strip() if col in df.columns else ''
+        df['testate'] = df['testate'].astype(int)
+        df['sensibile'] = df['sensibile'].astype(int)
+        bad = df[(df['sensibile'] < 0) | (df['sensibile'] > df['testate'])]
+        if len(bad):
+            raise ValueError(f"{f}: sensibile > testate pentru {bad.iloc[0]['bacterie']} / {bad.iloc[0]['antibiotic']}")
+        df['rezistenta'] = df['rezistenta'].map(lambda r: '+'.join(sorted(mask_of(r.split('+')))))
+        frames.append(df[['bacterie', 'sectie', 'rezistenta', 'antibiotic', 'testate', 'sensibile', 'regim']])
+    if not frames:
+        return pd.DataFrame(columns=['bacterie', 'sectie', 'rezistenta', 'antibiotic', 'testate', 'sensibile', 'regim'])
+    df = pd.concat(frames, ignore_index=True)
+    regim = df.groupby('antibiotic')['regim'].agg(lambda s: next((r for r in s if r), ''))
+    df = df.groupby(['bacterie', 'sectie', 'rezistenta', 'antibiotic'], as_index=False)[['testate', 'sensibile']].sum()
+    df['regim'] = df['antibiotic'].map(regim).fillna('')
+    return df
+
+
+class _Stratum:
+    """Coverage (%), isolates tested and source level per antibiotic, NaN where not tested."""
+
+    __slots__ = ('cov', 'n', 'ward')
+
+    def __init__(self, size: int):
+        self.cov = np.full(size, np.nan)
+        self.n = np.zeros(size, dtype=np.int64)
+        self.ward = np.zeros(size, dtype=bool)
+
+
+class _Profile:
+    """Rankings of one organism in one ward (or hospital-wide when sectie is '')."""
+
+    def __init__(self, antibiotics: Sequence[str], mechanisms: Sequence[str], base: _Stratum, strata: Dict[Mask, _Stratum]):
+        self.antibiotics = list(antibiotics)
+        self.bits = {m: 1 << i for i, m in enumerate(mechanisms)}
+        self.base = base
+        self.strata = strata
+        self.covered: Set[str] = set().union(*strata) if strata else set()  # mechanisms with at least one stratum
+        self.ranked: Dict[int, Tuple[Dict[str, Any], ...]] = {}
+        self.vectors: Dict[int, _Stratum] = {}
+
+    def mask_bits(self, mask: Mask) -> int:
+        return sum(self.bits.get(m, 0) for m in mask)
+
+    def stratum(self, bits: int) -> _Stratum:
+        """Coverage for a resistance mask: its own stratum, else the lowest of its mechanisms' strata (the combined
+        strata containing a mechanism when it has none of its own), else, per antibiotic, all isolates."""
+        out = self.vectors.get(bits)
+        if out is not None:
+            return out
+        mask = frozenset(m for m, b in self.bits.items() if bits & b)
+        out = _Stratum(len(self.antibiotics))
+        exact = self.strata.get(mask)
+        parts = [exact] if exact is not None else []
+        for m in mask if exact is None else ():
+            single = self.strata.get(frozenset([m]))
+            parts.extend([single] if single is not None else [s for k, s in self.strata.items() if m in k])
+        for part in parts:
+            take = ~np.isnan(part.cov) & ~(part.cov >= out.cov)  # lower coverage, or first value for the antibiotic
+            out.cov[take], out.n[take], out.ward[take] = part.cov[take], part.n[take], part.ward[take]
+        fill = np.isnan(out.cov)
+        out.cov[fill], out.n[fill], out.ward[fill] = self.base.cov[fill], self.base.n[fill], self.base.ward[fill]
+        self.vectors[bits] = out
+        return out
+
+
+def _options(antibiotics: Sequence[str], regim: Dict[str, str], cov: np.ndarray, n: np.ndarray, ward: np.ndarray,
+             extra: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], ...]:
+    order = sorted((i for i in range(len(antibiotics)) if not np.isnan(cov[i])), key=lambda i: (-cov[i], -n[i], antibiotics[i]))
+    return tuple({
+        'antibiotic': antibiotics[i], 'acoperire': round(float(cov[i]), 1), 'testate': int(n[i]),
+        'nivel': 'secție' if ward[i] else 'spital', 'putine_izolate': bool(n[i] < MIN_ISOLATES),
+        'regim': regim.get(antibiotics[i], ''), **(extra or {}),
+    } for i in order)
+
+
+class Antibiogram:
+    """Precomputed rankings per (bacterie, sectie, resistance mask) plus the live empiric pool."""
+
+    def __init__(self, tables: Optional[pd.DataFrame] = None, min_isolates: int = MIN_ISOLATES, as_of: Optional[str] = None):
+        self.min_isolates = int(min_isolates)
+        self.as_of = as_of  # ISO time the tables were issued: later cultures are not in their counts yet
+        self._profiles: Dict[Tuple[str, str], _Profile] = {}
+        self._regim: Dict[str, str] = {}
+        self._pooled: Dict[Tuple[str, str], Tuple[Dict[str, Any], ...]] = {}
+        self._observed: Dict[Tuple[str, str], Tuple[int, np.ndarray]] = {}
+        self._seen: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        if tables is not None and len(tables):
+            self._build(tables)
+
+    @classmethod
+    def load(cls, path: Path = ANTIBIOGRAM_PATH, as_of: Optional[str] = None) -> "Antibiogram":
+        """Index the lab tables at `path` (issued at `as_of`, by default their modification time); a missing file gives an empty index."""
+        path = Path(path)
+        if not path.exists():
+            return cls(None)
+        if as_of is None:
+            files = sorted(path.glob('*.csv')) if path.is_dir() else [path]
+            as_of = datetime.fromtimestamp(max(f.stat().st_mtime for f in files)).isoformat() if files else None
+        return cls(read_tables(path), as_of=as_of)
+
+    # ---- build ----
+
+    def _build(self, df: pd.DataFrame) -> None:
+        self._regim = {ab: r for ab, r in zip(df['antibiotic'], df['regim']) if r}
+        for org, rows in df.groupby('bacterie', sort=True):
+            antibiotics = sorted(rows['antibiotic'].unique())
+            col = {ab: i for i, ab in enumerate(antibiotics)}
+            mechanisms = sorted({m for r in rows['rezistenta'].unique() for m in r.split('+') if m})
+            raw: Dict[Tuple[str, str], _Stratum] = {}
+            for (sectie, rez), g in rows.groupby(['sectie', 'rezistenta'], sort=False):
+                s = raw[(sectie, rez)] = _Stratum(len(antibiotics))
+                idx = g['antibiotic'].map(col).to_numpy()
+                tested = g['testate'].to_numpy()
+                s.n[idx] = tested
+                s.cov[idx] = np.where(tested > 0, 100.0 * g['sensibile'].to_numpy() / np.maximum(tested, 1), np.nan)
+                s.ward[idx] = bool(sectie)
+            for sectie in sorted({s for s, _ in raw}):
+                def resolve(rez: str) -> Optional[_Stratum]:
+                    own, hosp = raw.get((sectie, rez)), raw.get(('', rez))
+                    if own is None or not sectie:
+                        return own if own is not None else hosp
+                    if hosp is None:
+                        return own
+                    out = _Stratum(len(antibiotics))
+                    use = (own.n >= self.min_isolates) | np.isnan(hosp.cov)
+                    for field in ('cov', 'n', 'ward'):
+                        getattr(out, field)[:] = np.where(use, getattr(own, field), getattr(hosp, field))
+                    return out
+                base = resolve('') or _Stratum(len(antibiotics))
+                strata = {}
+                for rez in sorted({r for _, r in raw if r}):
+                    stratum = resolve(rez)
+                    if stratum is not None:
+                        strata[mask_of(rez.split('+'))] = stratum
+                profile = self._profiles[(org, sectie)] = _Profile(antibiotics, mechanisms, base, strata)
+                if len(mechanisms) <= MAX_PRECOMPUTED:
+                    for k in range(len(mechanisms) + 1):
+                        for combo in combinations(mechanisms, k):
+                            self._rank(profile, profile.mask_bits(frozenset(combo)))
+
+    def _rank(self, profile: _Profile, bits: int) -> Tuple[Dict[str, Any], ...]:
+        ranked = profile.ranked.get(bits)
+        if ranked is None:
+            s = profile.stratum(bits)
+            ranked = profile.ranked[bits] = _options(profile.antibiotics, self._regim, s.cov, s.n, s.ward)
+        return ranked
+
+    def _profile(self, bacterie: str, sectie: str) -> Optional[_Profile]:
+        return self._profiles.get((bacterie, sectie)) or self._profiles.get((bacterie, ''))
+
+    # ---- queries ----
+
+    @property
+    def organisms(self) -> List[str]:
+        return sorted({org for org, _ in self._profiles})
+
+    def __len__(self) -> int:
+        return sum(len(p.ranked) for p in self._profiles.values())
+
+    def suggest(self, bacterie: Any, sectie: Any = '', rezistente: Optional[Iterable[str]] = None,
+                top: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Antibiotics ranked by coverage for an isolate; `rezistente=None` means the profile is not known yet.
+
+        Mechanisms without any stratum are left out of the mask (see `missing_mechanisms`); when none of
+        the requested mechanisms has one there is no ranking to offer.
+        """
+        bacterie, sectie = str(bacterie or ''), str(sectie or '')
+        profile = self._profile(bacterie, sectie)
+        if profile is None:
+            return []
+        if rezistente is None:
+            ranked = self._pooled.get((bacterie, sectie))
+            if ranked is None and (bacterie, sectie) not in self._profiles:
+                ranked = self._pooled.get((bacterie, ''))  # ward without its own table or cultures yet
+            if ranked is None:
+                ranked = self._rank(profile, 0)
+        else:
+            mask = mask_of(rezistente)
+            if mask and not mask & profile.covered:
+                return []
+            bits = profile.mask_bits(mask & profile.covered)
+            ranked = profile.ranked.get(bits)
+            if ranked is None:
+                with self._lock:
+                    ranked = self._rank(profile, bits)
+        return list(ranked[:top] if top else ranked)
+
+    def missing_mechanisms(self, bacterie: Any, sectie: Any = '', rezistente: Iterable[str] = ()) -> List[str]:
+        """Requested resistance mechanisms the lab tables have no stratum for, so coverage cannot reflect them."""
+        profile = self._profile(str(bacterie or ''), str(sectie or ''))
+        mask = mask_of(rezistente)
+        return sorted(mask - profile.covered if profile is not None else mask)
+
+    def observed(self, bacterie: Any, sectie: Any = '') -> int:
+        """Cultures counted into the empiric pool of a ward since the tables were loaded."""
+        return self._observed.get((str(bacterie or ''), str(sectie or '')), (0, None))[0]
+
+    # ---- incremental updates ----
+
+    def observe(self, sectie: Any, pacient: Any, bacterie: Any, rezistente: Iterable[str] = ()) -> bool:
+        """Count one positive culture (first isolate per patient and organism). Returns whether it was counted."""
+        bacterie, sectie = str(bacterie or ''), str(sectie or '')
+        if not bacterie or self._profile(bacterie, '') is None:
+            return False
+        mask = mask_of(rezistente)
+        with self._lock:
+            first = (str(pacient or ''), bacterie)
+            if first in self._seen:
+                return False
+            self._seen.add(first)
+            for ward in {sectie, ''}:
+                profile = self._profile(bacterie, ward)
+                expected = profile.stratum(profile.mask_bits(mask)).cov / 100.0
+                n_obs, sums = self._observed.get((bacterie, ward), (0, np.zeros(len(profile.antibiotics))))
+                n_obs, sums = n_obs + 1, sums + np.nan_to_num(expected)
+                self._observed[(bacterie, ward)] = (n_obs, sums)
+                base = profile.base
+                tested = np.where(np.isnan(base.cov), 0, base.n)
+                pooled = 100.0 * (np.nan_to_num(base.cov) / 100.0 * tested + sums) / (tested + n_obs)
+                pooled[np.isnan(base.cov)] = np.nan
+                self._pooled[(bacterie, ward)] = _options(profile.antibiotics, self._regim, pooled, tested + n_obs,
+                                                          base.ward, {'izolate_noi': n_obs})
+        return True
+
+    def observe_payload(self, payload: Dict[str, Any]) -> bool:
+        """Feed one evaluation payload (only positive cultures are counted)."""
+        if not payload.get('cultura_pozitiva'):
+            return False
+        return self.observe(payload.get('sectie'), payload.get('nume_pacient'), payload.get('bacterie'),
+                            payload.get('profil_rezistenta') or [])
+
+    def backfill_audit(self, audit_csv: str, store: Optional[SnapshotStore] = None) -> int:
+        """Feed the positive cultures the audit recorded after the tables were issued, in time order.
+
+        Earlier cultures are already in the lab's cumulative counts. Returns the number counted.
+        """
+        df = read_cultures(audit_csv, store, since=self.as_of).sort_values('timestamp', kind='stable')
+        counted = 0
+        for pacient, sectie, agent, rez in zip(df['pacient'].fillna(''), df['sectie'].fillna(''), df['agent'], df['rezistente'].fillna('')):
+            counted += self.observe(sectie, pacient, agent, rez.split(',') if rez else ())
+        return counted
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind local antibiogram")
+    parser.add_argument("--tables", default=str(ANTIBIOGRAM_PATH), help="CSV file or directory of CSVs")
+    parser.add_argument("--audit", default="", help="feed the positive cultures of this audit CSV first")
+    parser.add_argument("--snapshots", default=str(SNAPSHOT_DIR), help="snapshot store resolving audit rows without cultura_pozitiva")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("suggest", help="ranked antibiotics for an organism, ward and resistance profile")
+    s.add_argument("--bacterie", required=True)
+    s.add_argument("--sectie", default="")
+    s.add_argument("--rezistenta", action="append", default=None, help="repeat for several mechanisms; omit if unknown")
+    s.add_argument("--top", type=int, default=8)
+    sub.add_parser("summary", help="organisms, strata and lookup time")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    atb = Antibiogram.load(Path(args.tables))
+    store = SnapshotStore(Path(args.snapshots)) if Path(args.snapshots).exists() else None
+    counted = atb.backfill_audit(args.audit, store) if args.audit else 0
+    elapsed = time.perf_counter() - t0
+    if args.cmd == "suggest":
+        opts = atb.suggest(args.bacterie, args.sectie, args.rezistenta, top=args.top)
+        missing = atb.missing_mechanisms(args.bacterie, args.sectie, args.rezistenta or ())
+        if missing:
+            print(f"Fără date pentru mecanism: {', '.join(missing)}" + (" (ignorat în clasament)" if opts else ""))
+        if not opts and not missing:
+            print(f"Fără date pentru {args.bacterie}")
+        for o in opts:
+            flag = "  (puține izolate)" if o['putine_izolate'] else ""
+            print(f"{o['acoperire']:5.1f}%  {o['antibiotic']:<28} n={o['testate']:<5} {o['nivel']}{flag}  {o['regim']}")
+    else:
+        for org in atb.organisms:
+            wards = sorted(s for o, s in atb._profiles if o == org)
+            strata = set().union(*(atb._profiles[(org, w)].strata for w in wards))  # an organism may have ward rows only
+            print(f"{org}: secții {', '.join(w or 'spital' for w in wards)}; {len(strata)} straturi de rezistență")
+        keys = [(org, s, m) for (org, s), p in atb._profiles.items() for m in p.ranked]
+        t1 = time.perf_counter()
+        for org, s, _ in keys * 20:
+            atb.suggest(org, s, ())
+        per = (time.perf_counter() - t1) / max(1, len(keys) * 20)
+        print(f"{len(atb)} clasamente precalculate, {counted} culturi din audit, încărcare {elapsed:.2f}s, interogare {per * 1e6:.1f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
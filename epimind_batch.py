@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Batch scorer
+
+Scores a stream of payloads with `calculate_iaam_risk`, sequentially or across worker
+processes. Input order is preserved and only a bounded number of chunks is in flight, so
+arbitrarily long streams are scored in constant memory.
+
+Score an NDJSON file of payloads:
+    python epimind_batch.py payloads.ndjson --workers 4 > rezultate.ndjson
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+_ENGINE = None
+
+
+def load_engine():
+    """Import the app module for its scoring functions, silencing Streamlit's bare-mode warnings."""
+    global _ENGINE
+    if _ENGINE is None:
+        import logging
+        logging.disable(logging.WARNING)
+        try:
+            import dashboard_iaam
+        finally:
+            logging.disable(logging.NOTSET)
+        _ENGINE = dashboard_iaam
+    return _ENGINE
+
+
+def _score_chunk(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    engine = load_engine()
+    rules = engine.current_rules()  # one rule version for the whole chunk
+    out = []
+    for payload in chunk:
+        scor, nivel, detalii, recomandari = engine.calculate_iaam_risk(payload, rules)
+        out.append({'payload': payload, 'scor': scor, 'nivel': nivel, 'detalii': detalii, 'recomandari': recomandari,
+                    'versiune_reguli': rules.label})
+    return out
+
+
+def _chunks(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def score_payloads(payloads: Iterable[Dict[str, Any]], workers: int = 0, chunksize: int = 512) -> Iterator[Dict[str, Any]]:
+    """Yield one result dict (payload, scor, nivel, detalii, recomandari) per payload, in input order."""
+    if workers <= 1:
+        for chunk in _chunks(payloads, chunksize):
+            yield from _score_chunk(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_engine) as pool:
+        pending: deque = deque()
+        for chunk in _chunks(payloads, chunksize):
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def read_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    opener = open
+    if path.endswith(".gz"):
+        import gzip
+        opener = gzip.open
+    with (sys.stdin.buffer if path == "-" else opener(path, "rb")) as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind batch scorer (NDJSON payloads in, NDJSON results out)")
+    parser.add_argument("input", help="NDJSON file with one payload per line ('-' for stdin)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=512)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    n = 0
+    out = sys.stdout
+    for res in score_payloads(read_ndjson(args.input), args.workers, args.chunksize):
+        out.write(json.dumps({'pacient': res['payload'].get('nume_pacient'), 'scor': res['scor'], 'nivel': res['nivel']}, ensure_ascii=False) + "\n")
+        n += 1
+    elapsed = time.perf_counter() - t0
+    print(f"{n} payload-uri în {elapsed:.2f}s ({n / max(elapsed, 1e-9):.0f}/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
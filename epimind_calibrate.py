@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Weight calibration and cut-off optimisation against confirmed IAAM outcomes
+
+The engine's score is linear in the tunable weights: for every labelled evaluation it is a fixed
+part (everything that is not tuned) plus device presence x device weight plus resistance
+mechanism x resistance points. `build_cohort` scores the cohort once with the engine and keeps
+that contribution matrix; candidate weight sets are then scored with one matrix product each.
+Identical (fixed, contributions, outcome) rows are collapsed with counts and scores are
+integers, so every candidate reduces to two score histograms (IAAM / non-IAAM) from which AUC,
+sensitivity/specificity at every cut-off and calibration follow exactly.
+
+The best candidate by AUC gets level cut-offs at target specificities and is written as a
+versioned weight set (weights/<versiune>.json) that the app loads via EPIMIND_WEIGHTS.
+
+Labelled cohort: NDJSON, one evaluation per line, either {"payload": {...}, "iaam": 0|1} or a
+flat payload carrying the "iaam" key.
+
+Run:
+    python epimind_calibrate.py matrix cohort.ndjson --out cohort.npz
+    python epimind_calibrate.py fit cohort.npz --candidates 2000 --workers 4
+    python epimind_calibrate.py bench --rows 1000000 --candidates 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+WEIGHTS_DIR = Path("weights")
+LEVELS = ['MODERAT', 'ÎNALT', 'FOARTE ÎNALT', 'CRITIC']  # ascending, as the cut-offs
+SPECIFICITY_TARGETS = {'MODERAT': 0.50, 'ÎNALT': 0.75, 'FOARTE ÎNALT': 0.90, 'CRITIC': 0.97}
+MULTIPLIERS = (0.0, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0)
+CONFIG_BATCH = 128
+
+
+# ---------------- Contribution matrix ----------------
+
+class Cohort:
+    """Labelled contribution matrix: score = fixed + x @ weights (weights in `columns` order)."""
+
+    def __init__(self, fixed: np.ndarray, x: np.ndarray, y: np.ndarray, columns: Sequence[str],
+                 count: Optional[np.ndarray] = None):
+        self.fixed = np.asarray(fixed, dtype=np.int32)
+        self.x = np.asarray(x, dtype=np.int16)
+        self.y = np.asarray(y, dtype=bool)
+        self.columns = list(columns)
+        self.count = np.ones(len(self.y), dtype=np.int64) if count is None else np.asarray(count, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return int(self.count.sum())
+
+    def compress(self) -> "Cohort":
+        """Collapse identical (fixed, x, outcome) rows into one row with a count."""
+        rows = np.column_stack([self.fixed, self.x, self.y]).astype(np.int32)
+        uniq, inverse = np.unique(rows, axis=0, return_inverse=True)
+        count = np.bincount(inverse.ravel(), weights=self.count, minlength=len(uniq)).astype(np.int64)
+        return Cohort(uniq[:, 0], uniq[:, 1:-1], uniq[:, -1], self.columns, count)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, fixed=self.fixed, x=self.x, y=self.y, count=self.count, columns=np.array(self.columns))
+
+    @classmethod
+    def load(cls, path: str) -> "Cohort":
+        with np.load(path) as z:
+            return cls(z['fixed'], z['x'], z['y'], [str(c) for c in z['columns']], z['count'])
+
+
+def tunable_columns(engine) -> List[str]:
+    rules = engine.current_rules()
+    return [f'disp:{d}' for d in rules.device_weights] + [f'rez:{r}' for r in rules.rez_points]
+
+
+def current_weights(engine, columns: Sequence[str]) -> np.ndarray:
+    rules = engine.current_rules()
+    out = []
+    for col in columns:
+        kind, name = col.split(':', 1)
+        out.append(rules.device_weights[name] if kind == 'disp' else rules.rez_points[name])
+    return np.array(out, dtype=np.int32)
+
+
+def contribution_row(payload: Dict[str, Any], scor: int, index: Dict[str, int], weights: np.ndarray) -> Tuple[int, List[int]]:
+    """Split an engine score into its fixed part and the counts multiplying each tunable weight."""
+    x = [0] * len(index)
+    if (payload.get('ore_spitalizare', 0) or 0) < 48:
+        return 0, x  # excluded by the temporal criterion: no weight can change the score
+    for dev, info in (payload.get('dispozitive') or {}).items():
+        if info.get('prezent') and f'disp:{dev}' in index:
+            x[index[f'disp:{dev}']] += 1
+    if payload.get('cultura_pozitiva'):
+        for rez in (payload.get('profil_rezistenta') or []):
+            if f'rez:{rez}' in index:
+                x[index[f'rez:{rez}']] += 1
+    fixed = int(scor) - int(np.dot(x, weights))
+    return fixed, x
+
+
+def read_labelled(path: str, label: str = 'iaam') -> Iterator[Tuple[Dict[str, Any], int]]:
+    from epimind_batch import read_ndjson
+    for rec in read_ndjson(path):
+        payload = rec.get('payload', rec)
+        yield payload, int(bool(rec.get(label, payload.get(label))))
+
+
+def build_cohort(labelled: Iterable[Tuple[Dict[str, Any], int]], engine, workers: int = 0) -> Cohort:
+    """Score every labelled payload with the engine (batch scorer, in order) and keep its contributions."""
+    from epimind_batch import score_payloads
+    columns = tunable_columns(engine)
+    index = {c: i for i, c in enumerate(columns)}
+    weights = current_weights(engine, columns)
+    labels: deque = deque()
+
+    def payloads() -> Iterator[Dict[str, Any]]:
+        for payload, y in labelled:
+            labels.append(y)
+            yield payload
+
+    fixed: List[int] = []
+    xs: List[List[int]] = []
+    ys: List[int] = []
+    for res in score_payloads(payloads(), workers):
+        f, x = contribution_row(res['payload'], res['scor'], index, weights)
+        fixed.append(f); xs.append(x); ys.append(labels.popleft())
+    return Cohort(np.array(fixed), np.array(xs).reshape(len(fixed), len(columns)), np.array(ys), columns)
+
+
+# ---------------- Histogram metrics ----------------
+
+_COHORT: Optional[Cohort] = None
+
+
+def _init_worker(cohort: Cohort) -> None:
+    global _COHORT
+    _COHORT = cohort
+
+
+def _histograms(weights: np.ndarray, smax: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(positive, negative) score histograms, one row per candidate, over the shared cohort."""
+    c = _COHORT
+    scores = c.fixed[:, None] + (c.x.astype(np.float32) @ weights.T.astype(np.float32)).astype(np.int32)
+    np.clip(scores, 0, smax - 1, out=scores)
+    k = len(weights)
+    offsets = np.arange(k, dtype=np.int64) * smax
+    idx = (scores + offsets).ravel()
+    w_pos = np.repeat(np.where(c.y, c.count, 0), k)
+    w_neg = np.repeat(np.where(c.y, 0, c.count), k)
+    pos = np.bincount(idx, weights=w_pos, minlength=k * smax).reshape(k, smax)
+    neg = np.bincount(idx, weights=w_neg, minlength=k * smax).reshape(k, smax)
+    return pos, neg
+
+
+def auc(pos: np.ndarray, neg: np.ndarray) -> np.ndarray:
+    """Exact ROC AUC (ties count 1/2) from score histograms, per row."""
+    neg_below = np.cumsum(neg, axis=-1) - neg
+    n_pos, n_neg = pos.sum(axis=-1), neg.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sum(pos * (neg_below + 0.5 * neg), axis=-1) / (n_pos * n_neg)
+
+
+def _auc_batch(weights: np.ndarray, smax: int) -> np.ndarray:
+    return auc(*_histograms(weights, smax))
+
+
+def cutoff_table(pos: np.ndarray, neg: np.ndarray) -> Dict[str, np.ndarray]:
+    """Sensitivity, specificity and PPV of `score >= t` for every integer cut-off t."""
+    tp = pos[::-1].cumsum()[::-1]
+    fp = neg[::-1].cumsum()[::-1]
+    n_pos, n_neg = pos.sum(), neg.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {'sens': tp / n_pos, 'spec': 1 - fp / n_neg, 'ppv': np.where(tp + fp > 0, tp / (tp + fp), np.nan)}
+
+
+def choose_cutoffs(pos: np.ndarray, neg: np.ndarray, targets: Dict[str, float] = SPECIFICITY_TARGETS) -> Dict[str, int]:
+    """Lowest cut-off reaching each level's target specificity, kept strictly increasing."""
+    spec = cutoff_table(pos, neg)['spec']
+    out: Dict[str, int] = {}
+    prev = 0
+    for level in LEVELS:
+        hits = np.nonzero(spec >= targets[level])[0]
+        t = int(hits[0]) if len(hits) else len(spec) - 1
+        prev = out[level] = max(t, prev + 1)
+    return out
+
+
+def calibration(pos: np.ndarray, neg: np.ndarray, iters: int = 25) -> Dict[str, Any]:
+    """Logistic (Platt) fit of P(IAAM | score) on the histograms, its Brier score and observed rates by decile."""
+    s = np.arange(len(pos), dtype=float)
+    n = pos + neg
+    keep = n > 0
+    s, p_obs, n = s[keep], pos[keep], n[keep]
+    z = (s - s.mean()) / (s.std() or 1.0)
+    a = b = 0.0
+    for _ in range(iters):  # Newton-Raphson on the weighted binomial log-likelihood
+        p = 1 / (1 + np.exp(-(a + b * z)))
+        g = np.array([np.sum(p_obs - n * p), np.sum((p_obs - n * p) * z)])
+        w = n * p * (1 - p)
+        h = np.array([[w.sum(), (w * z).sum()], [(w * z).sum(), (w * z * z).sum()]])
+        try:
+            step = np.linalg.solve(h, g)
+        except np.linalg.LinAlgError:
+            break
+        a, b = a + step[0], b + step[1]
+        if np.abs(step).max() < 1e-9:
+            break
+    p = 1 / (1 + np.exp(-(a + b * z)))
+    brier = float(np.sum(p_obs * (1 - p) ** 2 + (n - p_obs) * p ** 2) / n.sum())
+    cum = np.cumsum(n) / n.sum()
+    decile = np.minimum((cum * 10 - 1e-9).astype(int), 9)
+    rows = []
+    for d in range(10):
+        m = decile == d
+        if m.any():
+            rows.append({'decila': d + 1, 'scor_min': int(s[m][0]), 'scor_max': int(s[m][-1]),
+                         'n': int(n[m].sum()), 'observat': float(p_obs[m].sum() / n[m].sum()),
+                         'prezis': float((p[m] * n[m]).sum() / n[m].sum())})
+    sd = float((np.arange(len(pos))[keep]).std() or 1.0)
+    mean = float((np.arange(len(pos))[keep]).mean())
+    return {'platt_intercept': float(a - b * mean / sd), 'platt_panta': float(b / sd), 'brier': brier, 'decile': rows}
+
+
+# ---------------- Search ----------------
+
+def candidate_grid(base: np.ndarray, n: int, multipliers: Sequence[float] = MULTIPLIERS, seed: int = 0) -> np.ndarray:
+    """`n` integer weight vectors: the current weights first, then random points of the multiplier grid."""
+    rng = np.random.default_rng(seed)
+    mult = np.asarray(multipliers)[rng.integers(0, len(multipliers), size=(max(n - 1, 0), len(base)))]
+    grid = np.vstack([base[None, :], np.rint(mult * base).astype(np.int32)])
+    first = np.unique(grid, axis=0, return_index=True)[1]
+    return grid[np.sort(first)]
+
+
+def search(cohort: Cohort, candidates: np.ndarray, workers: int = 0, batch: int = CONFIG_BATCH) -> np.ndarray:
+    """AUC of every candidate weight vector, batched and spread across worker processes."""
+    cohort = cohort.compress()
+    smax = int(cohort.fixed.max(initial=0) + cohort.x.max(axis=0, initial=0).astype(np.int64) @ candidates.max(axis=0)) + 1
+    chunks = [candidates[i:i + batch] for i in range(0, len(candidates), batch)]
+    if workers <= 1:
+        _init_worker(cohort)
+        return np.concatenate([_auc_batch(ch, smax) for ch in chunks]) if chunks else np.empty(0)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cohort,)) as pool:
+        return np.concatenate(list(pool.map(_auc_batch, chunks, [smax] * len(chunks))))
+
+
+def evaluate(cohort: Cohort, weights: np.ndarray) -> Dict[str, Any]:
+    """Full report for one weight vector: AUC, cut-offs at target specificity and calibration."""
+    compact = cohort.compress()
+    _init_worker(compact)
+    smax = int(compact.fixed.max(initial=0) + compact.x.max(axis=0, initial=0).astype(np.int64) @ weights) + 1
+    pos, neg = _histograms(weights[None, :], smax)
+    pos, neg = pos[0], neg[0]
+    cutoffs = choose_cutoffs(pos, neg)
+    table = cutoff_table(pos, neg)
+    return {
+        'auc': float(auc(pos, neg)),
+        'praguri': cutoffs,
+        'performanta_praguri': {lvl: {'prag': t, 'sensibilitate': float(table['sens'][t]), 'specificitate': float(table['spec'][t]),
+                                      'vpp': float(table['ppv'][t])} for lvl, t in cutoffs.items()},
+        'calibrare': calibration(pos, neg),
+    }
+
+
+# ---------------- Versioned weight sets ----------------
+
+def weight_set(columns: Sequence[str], weights: np.ndarray, report: Dict[str, Any], cohort: Cohort) -> Dict[str, Any]:
+    devices = {c.split(':', 1)[1]: int(w) for c, w in zip(columns, weights) if c.startswith('disp:')}
+    rez = {c.split(':', 1)[1]: int(w) for c, w in zip(columns, weights) if c.startswith('rez:')}
+    body = {'device_weights': devices, 'rezistenta_puncte': rez, 'praguri': report['praguri']}
+    digest = hashlib.sha256(json.dumps(body, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:8]
+    return {
+        'versiune': f"{datetime.now():%Y%m%d-%H%M%S}-{digest}",
+        'creat': datetime.now().isoformat(timespec='seconds'),
+        **body,
+        'metrici': {k: v for k, v in report.items() if k != 'praguri'},
+        'cohorta': {'n': len(cohort), 'prevalenta': float(cohort.count[cohort.y].sum() / max(len(cohort), 1))},
+    }
+
+
+def write_weight_set(ws: Dict[str, Any], directory: Path = WEIGHTS_DIR) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{ws['versiune']}.json"
+    path.write_text(json.dumps(ws, ensure_ascii=False, indent=2), encoding='utf-8')
+    return path
+
+
+def read_weight_set(path: str) -> Dict[str, Any]:
+    """Load and validate a weight set written by `write_weight_set`."""
+    ws = json.loads(Path(path).read_text(encoding='utf-8'))
+    missing = [k for k in ('versiune', 'device_weights', 'rezistenta_puncte', 'praguri') if k not in ws]
+    if missing:
+        raise ValueError(f"set de ponderi invalid ({path}): lipsesc {', '.join(missing)}")
+    praguri = [ws['praguri'][lvl] for lvl in LEVELS if lvl in ws['praguri']]
+    if praguri != sorted(praguri) or len(set(praguri)) != len(praguri):
+        raise ValueError(f"set de ponderi invalid ({path}): pragurile trebuie să fie strict crescătoare")
+    return ws
+
+
+# ---------------- CLI ----------------
+
+def _synthetic_cohort(rows: int, columns: Sequence[str], seed: int = 0) -> Tuple[Cohort, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    p = len(columns)
+    prevalence = np.where(np.char.startswith(np.array(columns), 'disp:'), 0.25, 0.04)
+    x = (rng.random((rows, p)) < prevalence).astype(np.int16)
+    fixed = np.where(rng.random(rows) < 0.1, 0, rng.integers(5, 90, rows)).astype(np.int32)
+    true_w = rng.uniform(5, 40, p)
+    logit = -4.0 + 0.03 * (fixed + x @ true_w)
+    y = rng.random(rows) < 1 / (1 + np.exp(-logit))
+    return Cohort(fixed, x, y, columns), true_w
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"AUC {report['auc']:.4f}  Brier {report['calibrare']['brier']:.4f}")
+    for lvl, r in report['performanta_praguri'].items():
+        print(f"  {lvl:<13} >= {r['prag']:<4} sens {r['sensibilitate']:.2f}  spec {r['specificitate']:.2f}  VPP {r['vpp']:.2f}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind weight calibration against confirmed IAAM outcomes")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("matrix", help="score a labelled NDJSON cohort and save its contribution matrix")
+    m.add_argument("cohort")
+    m.add_argument("--label", default="iaam")
+    m.add_argument("--out", default="cohort.npz")
+    m.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    f = sub.add_parser("fit", help="search weights on a contribution matrix and write a versioned weight set")
+    f.add_argument("matrix")
+    f.add_argument("--candidates", type=int, default=2000)
+    f.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    f.add_argument("--out-dir", default=str(WEIGHTS_DIR))
+    f.add_argument("--seed", type=int, default=0)
+    b = sub.add_parser("bench", help="time the search on a synthetic cohort")
+    b.add_argument("--rows", type=int, default=1_000_000)
+    b.add_argument("--candidates", type=int, default=2000)
+    b.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    from epimind_batch import load_engine
+    engine = load_engine()
+    t0 = time.perf_counter()
+    if args.cmd == "matrix":
+        cohort = build_cohort(read_labelled(args.cohort, args.label), engine, args.workers)
+        cohort.save(args.out)
+        print(f"{len(cohort)} evaluări -> {args.out} în {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        return 0
+
+    if args.cmd == "fit":
+        cohort = Cohort.load(args.matrix)
+        if cohort.columns != tunable_columns(engine):
+            print("Matricea a fost construită cu alt set de coloane; refaceți `matrix`.", file=sys.stderr)
+            return 2
+    else:
+        cohort, _ = _synthetic_cohort(args.rows, tunable_columns(engine))
+    base = current_weights(engine, cohort.columns)
+    candidates = candidate_grid(base, args.candidates, seed=getattr(args, 'seed', 0))
+    scores = search(cohort, candidates, args.workers)
+    t1 = time.perf_counter()
+    best = candidates[int(np.nanargmax(scores))]
+    print("Ponderi curente:")
+    _print_report(evaluate(cohort, base))
+    report = evaluate(cohort, best)
+    print("Cel mai bun candidat:")
+    _print_report(report)
+    print(f"{len(cohort)} rânduri, {len(candidates)} configurații în {t1 - t0:.1f}s", file=sys.stderr)
+    if args.cmd == "fit":
+        path = write_weight_set(weight_set(cohort.columns, best, report, cohort), Path(args.out_dir))
+        print(f"Set de ponderi scris: {path}  (EPIMIND_WEIGHTS={path})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
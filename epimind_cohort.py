@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Memory-mapped columnar cohort of historical evaluations
+
+One row per evaluation of the snapshot store, kept as fixed-width NumPy columns (`.npy` files)
+that every reader opens with `mmap_mode='r'`: nothing is parsed or copied on open, so a 10M-row
+cohort opens in milliseconds and all processes on the host (dashboard, k-NN, incidence, replay
+workers) share one page-cache copy instead of each decoding the snapshots. Categorical columns
+(patient, ward, level, rule version, agent, infection type) are dictionary-encoded into small
+integer codes; the dictionaries are append-only, so codes never change once written.
+
+Layout under `snapshots/cohort/`:
+    manifest.json   generation, row count, last evaluation id, rule-set digest of the features,
+                    snapshot-store retention generation, live segments
+    dicts.json      dictionary of every encoded column (code = position)
+    seg-NNNNNN/     one `.npy` per column for a contiguous range of evaluation ids
+
+Appends write a new segment and then publish a new manifest atomically (readers see either the
+old or the new generation, never a partial one); past MAX_SEGMENTS segments are merged into one
+by compaction. There is a single writer (the `sync` command), serialised by a lock file where the
+platform has fcntl; readers take no lock and pick up new generations with `refresh()`. Segments
+left unpublished by an interrupted writer are removed by the next one. The k-NN features are
+score contributions under one rule set: `sync` rebuilds them when the rules change, and readers
+ignore them while `rules_digest` differs from their own rules. Likewise `sync` drops evaluations
+the snapshot store's retention removed (`retention_generation`) before appending.
+
+Keep the cohort in step with the snapshot store (e.g. from cron) and inspect it:
+    python epimind_cohort.py sync
+    python epimind_cohort.py compact
+    python epimind_cohort.py stats
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Sequence as SequenceABC
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from epimind_knn import DEVICES, FEATURES, encode_payload
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single writer by convention
+    fcntl = None
+
+COHORT_DIR = SNAPSHOT_DIR / "cohort"
+FORMAT = 1
+MAX_SEGMENTS = 8
+SYNC_BATCH = 50_000  # evaluations decoded per appended segment
+
+# column -> (dtype, per-row width or None for scalars, dictionary-encoded)
+COLUMNS: Dict[str, tuple] = {
+    'eval_id': ('<i8', None, False),
+    'timestamp': ('S32', None, False),
+    'pacient': ('<i4', None, True),
+    'sectie': ('<i2', None, True),
+    'nivel': ('<i2', None, True),
+    'reguli': ('<i2', None, True),
+    'scor': ('<i4', None, False),
+    'bacterie': ('<i2', None, True),
+    'tip_infectie': ('<i2', None, True),
+    'cultura_pozitiva': ('|b1', None, False),
+    'disp_prezent': ('|b1', len(DEVICES), False),
+    'disp_zile': ('<i4', len(DEVICES), False),
+    'features': ('<f4', len(FEATURES), False),
+    'norms': ('<f4', None, False),
+}
+
+
+def _write_json(path: Path, obj: Any) -> None:
+    """Write-then-rename, so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(obj, fh, ensure_ascii=False)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class ColumnView(SequenceABC):
+    """List-like, read-only view of a mapped string column, decoded one row at a time.
+
+    Rows appended in memory later (e.g. by a live k-NN index) go to a private tail.
+    """
+
+    def __init__(self, data: np.ndarray, values: Optional[Sequence[str]] = None):
+        self._data = data
+        self._values = values
+        self._tail: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._data) + len(self._tail)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        n = len(self._data)
+        if i >= n:
+            return self._tail[i - n]
+        v = self._data[i]
+        return self._values[v] if self._values is not None else v.decode('utf-8')
+
+    def extend(self, items: Iterable[str]) -> None:
+        self._tail.extend(items)
+
+
+class CohortStore:
+    """Reader (and single writer) of the segmented, memory-mapped cohort."""
+
+    def __init__(self, root: Path = COHORT_DIR):
+        self.root = Path(root)
+        self.generation = -1
+        self.rows = 0
+        self.last_eval_id = 0
+        self.rules_digest = ''
+        self.retention_generation = 0
+        self.segments: List[Dict[str, Any]] = []
+        self.dicts: Dict[str, List[str]] = {}
+        self._maps: List[Dict[str, np.ndarray]] = []
+        self._columns: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def open(cls, root: Path = COHORT_DIR) -> "CohortStore":
+        cohort = cls(root)
+        cohort.refresh()
+        return cohort
+
+    def refresh(self) -> bool:
+        """Re-map the segments if a newer generation was published. Returns True when it changed."""
+        manifest_path = self.root / "manifest.json"
+        if not manifest_path.exists():
+            return False
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"format cohortă necunoscut: {manifest.get('format')}")
+        if manifest["generation"] == self.generation:
+            return False
+        # Dictionaries are append-only, so reading them after the manifest always covers its segments.
+        self.dicts = json.loads((self.root / "dicts.json").read_text(encoding="utf-8"))
+        self._maps = [
+            {name: np.load(self.root / seg["name"] / f"{name}.npy", mmap_mode="r") for name in COLUMNS}
+            for seg in manifest["segments"]
+        ]
+        self.segments = manifest["segments"]
+        self.rows = manifest["rows"]
+        self.last_eval_id = manifest["last_eval_id"]
+        self.rules_digest = manifest.get("rules_digest", "")
+        self.retention_generation = manifest.get("retention_generation", 0)
+        self.generation = manifest["generation"]
+        self._columns = {}
+        return True
+
+    # ---- reading ----
+
+    def column(self, name: str) -> np.ndarray:
+        """Whole column: the mapped file itself for a compacted cohort, a concatenated copy otherwise."""
+        if name not in self._columns:
+            dtype, width, _ = COLUMNS[name]
+            shape = (0,) if width is None else (0, width)
+            parts = [m[name] for m in self._maps]
+            if not parts:
+                self._columns[name] = np.empty(shape, dtype=dtype)
+            elif len(parts) == 1:
+                self._columns[name] = parts[0]
+            else:
+                self._columns[name] = np.concatenate(parts)
+        return self._columns[name]
+
+    def iter_segments(self) -> Iterator[Dict[str, np.ndarray]]:
+        """Mapped columns of each segment in eval-id order (zero-copy regardless of compaction)."""
+        return iter(self._maps)
+
+    def values(self, name: str) -> List[str]:
+        """Dictionary of an encoded column: code i stands for values(name)[i]."""
+        return self.dicts.get(name, [])
+
+    def view(self, name: str) -> ColumnView:
+        """Row-wise decoded view of a string column (dictionary-encoded or fixed-width bytes)."""
+        return ColumnView(self.column(name), self.values(name) if COLUMNS[name][2] else None)
+
+    # ---- writing (single writer) ----
+
+    @contextmanager
+    def _writer(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "a") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                self._sweep()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _encode(self, name: str, values: Sequence[Any]) -> np.ndarray:
+        dictionary = self.dicts.setdefault(name, [])
+        lookup = {v: i for i, v in enumerate(dictionary)}
+        codes = np.empty(len(values), dtype=COLUMNS[name][0])
+        limit = np.iinfo(codes.dtype).max
+        for i, v in enumerate(values):
+            v = '' if v is None else str(v)
+            code = lookup.get(v)
+            if code is None:
+                code = lookup[v] = len(dictionary)
+                if code > limit:
+                    raise ValueError(f"dicționarul coloanei {name} depășește {limit} valori")
+                dictionary.append(v)
+            codes[i] = code
+        return codes
+
+    def _sweep(self) -> None:
+        """Remove segments no manifest lists (a writer interrupted between writing and publishing)."""
+        live = {s["name"] for s in self.segments}
+        for path in list(self.root.glob("seg-*")) + list(self.root.glob(".tmp-seg-*")):
+            if path.name not in live:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _next_segment(self) -> str:
+        """A name above every segment listed or still on disk (one left in use may not have been swept)."""
+        names = {s["name"] for s in self.segments} | {p.name for p in self.root.glob("seg-*")}
+        n = max((int(name.split("-")[1]) for name in names), default=0) + 1
+        return f"seg-{n:06d}"
+
+    def _publish(self, segments: List[Dict[str, Any]], rules_digest: Optional[str] = None,
+                 retention_generation: Optional[int] = None) -> None:
+        _write_json(self.root / "dicts.json", self.dicts)
+        _write_json(self.root / "manifest.json", {
+            "format": FORMAT, "generation": self.generation + 1, "segments": segments,
+            "rows": sum(s["rows"] for s in segments),
+            "last_eval_id": max((s["last_eval_id"] for s in segments), default=0),
+            "rules_digest": self.rules_digest if rules_digest is None else rules_digest,
+            "retention_generation": self.retention_generation if retention_generation is None else retention_generation,
+            "written_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+        self.refresh()
+
+    def _write_segment(self, columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        name = self._next_segment()
+        tmp = self.root / f".tmp-{name}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        for col, (dtype, width, _) in COLUMNS.items():
+            np.save(tmp / f"{col}.npy", np.ascontiguousarray(columns[col], dtype=dtype))
+        os.replace(tmp, self.root / name)
+        ids = columns['eval_id']
+        return {"name": name, "rows": int(len(ids)), "first_eval_id": int(ids[0]), "last_eval_id": int(ids[-1])}
+
+    def _encode_batch(self, batch: Dict[str, Sequence[Any]]) -> Dict[str, np.ndarray]:
+        return {col: self._encode(col, batch[col]) if coded else np.asarray(batch[col])
+                for col, (_, _, coded) in COLUMNS.items()}
+
+    def append(self, batch: Dict[str, Sequence[Any]], rules_digest: Optional[str] = None,
+               retention_generation: Optional[int] = None) -> int:
+        """Append rows (plain values per column; categoricals as strings) as a new segment.
+
+        `rules_digest` is the rule set the features were computed with; it must match the cohort's.
+        """
+        n = len(batch['eval_id'])
+        if n == 0:
+            return 0
+        with self._writer():
+            if rules_digest is not None and self.rows and rules_digest != self.rules_digest:
+                raise ValueError("caracteristicile au fost calculate cu alt set de reguli decât cohorta; reconstruiți-o")
+            columns = self._encode_batch(batch)
+            if int(columns['eval_id'][0]) <= self.last_eval_id:
+                raise ValueError("evaluările trebuie adăugate în ordinea id-urilor, după ultima din cohortă")
+            self._publish(self.segments + [self._write_segment(columns)], rules_digest, retention_generation)
+        return n
+
+    def rebuild(self, store: SnapshotStore, engine: Any, batch: int = SYNC_BATCH) -> int:
+        """Rewrite the cohort from every evaluation of the snapshot store under the engine's current rules.
+
+        The new segments replace the old ones in a single published generation; dictionaries are kept
+        (append-only), so readers of the previous generation stay valid until they refresh.
+        """
+        rules = engine.current_rules()
+        generation = store.retention_generation()
+        with self._writer():
+            old = [s["name"] for s in self.segments]
+            segments: List[Dict[str, Any]] = []
+            rows: List[Dict[str, Any]] = []
+            for row, payload in store.iter_payloads(0):
+                rows.append(evaluation_row(row, payload, engine, rules))
+                if len(rows) >= batch:
+                    segments.append(self._write_segment(self._encode_batch(_columnar(rows)))); rows = []
+            if rows:
+                segments.append(self._write_segment(self._encode_batch(_columnar(rows))))
+            self._replace_segments(segments, old, rules_digest=rules.digest, retention_generation=generation)
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+        return self.rows
+
+    def _merge(self, keep: Optional[List[np.ndarray]] = None) -> List[Dict[str, Any]]:
+        """Write every segment (only the rows of each `keep` mask) into one new segment, streaming column
+        by column, and return its manifest entry (none when no row is kept)."""
+        rows = self.rows if keep is None else int(sum(k.sum() for k in keep))
+        if rows == 0:
+            return []
+        ids = self.column('eval_id') if keep is None else np.concatenate([m['eval_id'][k] for m, k in zip(self._maps, keep)])
+        name = self._next_segment()
+        tmp = self.root / f".tmp-{name}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        for col, (dtype, width, _) in COLUMNS.items():
+            shape = (rows,) if width is None else (rows, width)
+            out = np.lib.format.open_memmap(tmp / f"{col}.npy", mode="w+", dtype=dtype, shape=shape)
+            pos = 0
+            for i, m in enumerate(self._maps):
+                part = m[col] if keep is None else m[col][keep[i]]
+                out[pos:pos + len(part)] = part
+                pos += len(part)
+            out.flush()
+            del out
+        os.replace(tmp, self.root / name)
+        return [{"name": name, "rows": rows, "first_eval_id": int(ids[0]), "last_eval_id": int(ids[-1])}]
+
+    def _replace_segments(self, segments: List[Dict[str, Any]], old: List[str], **publish: Any) -> None:
+        self._publish(segments, **publish)
+        # Readers still mapping the old segments keep their pages until they refresh (POSIX);
+        # where the files are still in use (Windows) they are left for the next writer to sweep.
+        for stale in old:
+            shutil.rmtree(self.root / stale, ignore_errors=True)
+
+    def compact(self) -> int:
+        """Merge every segment into one, streaming column by column. Returns the number of segments merged."""
+        with self._writer():
+            if len(self.segments) <= 1:
+                return 0
+            merged = len(self.segments)
+            self._replace_segments(self._merge(), [s["name"] for s in self.segments])
+        return merged
+
+    def prune(self, live_ids: Sequence[int], retention_generation: int) -> int:
+        """Drop the evaluations not in `live_ids` (removed by the snapshot store's retention), compacting
+        what is left. Returns the number of rows dropped."""
+        live = np.asarray(live_ids, dtype=np.int64)
+        with self._writer():
+            keep = [np.isin(m['eval_id'], live) for m in self._maps]
+            dropped = self.rows - int(sum(k.sum() for k in keep))
+            if dropped:
+                self._replace_segments(self._merge(keep), [s["name"] for s in self.segments],
+                                       retention_generation=retention_generation)
+            else:
+                self._publish(self.segments, retention_generation=retention_generation)
+        return dropped
+
+    def sync(self, store: SnapshotStore, engine: Any, batch: int = SYNC_BATCH) -> int:
+        """Append every evaluation of the snapshot store newer than the cohort, then compact if needed.
+
+        A cohort whose features were computed under other rules is rebuilt instead (returns its row count).
+        """
+        rules = engine.current_rules()
+        if self.rows and self.rules_digest != rules.digest:
+            return self.rebuild(store, engine, batch)
+        generation = store.retention_generation()
+        if self.rows and self.retention_generation != generation:
+            self.prune(store.eval_ids(), generation)
+        added = 0
+        rows: List[Dict[str, Any]] = []
+        for row, payload in store.iter_payloads(self.last_eval_id):
+            rows.append(evaluation_row(row, payload, engine, rules))
+            if len(rows) >= batch:
+                added += self.append(_columnar(rows), rules.digest, generation); rows = []
+        added += self.append(_columnar(rows), rules.digest, generation)
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+        return added
+
+    def stats(self) -> Dict[str, Any]:
+        size = sum(p.stat().st_size for s in self.segments for p in (self.root / s["name"]).glob("*.npy"))
+        return {'randuri': self.rows, 'ultima_evaluare': self.last_eval_id, 'segmente': len(self.segments),
+                'generatie': self.generation, 'reguli': self.rules_digest, 'retentie': self.retention_generation, 'octeti': size,
+                'dictionare': {k: len(v) for k, v in self.dicts.items()}}
+
+
+def evaluation_row(row: Dict[str, Any], payload: Dict[str, Any], engine: Any, rules: Any = None) -> Dict[str, Any]:
+    """Cohort row of one evaluation (index row + payload); k-NN features use `rules` (the engine's current ones by default)."""
+    disp = payload.get('dispozitive') or {}
+    vec = encode_payload(payload, engine, rules)
+    return {
+        'eval_id': row['id'], 'timestamp': str(row['timestamp']).encode('utf-8'),
+        'pacient': row['pacient'], 'sectie': row['sectie'], 'nivel': row['nivel'], 'reguli': row.get('reguli'),
+        'scor': row['scor'] or 0, 'bacterie': payload.get('bacterie'), 'tip_infectie': payload.get('tip_infectie'),
+        'cultura_pozitiva': bool(payload.get('cultura_pozitiva')),
+        'disp_prezent': [bool((disp.get(d) or {}).get('prezent')) for d in DEVICES],
+        'disp_zile': [int((disp.get(d) or {}).get('zile', 0) or 0) for d in DEVICES],
+        'features': vec, 'norms': float(vec @ vec),
+    }
+
+
+def _columnar(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    return {col: [r[col] for r in rows] for col in COLUMNS}
+
+
+def _bench(root: Path, n: int) -> None:
+    """Write a synthetic n-row cohort and time opening it and scanning one column."""
+    rng = np.random.default_rng(0)
+    cohort = CohortStore(root)
+    chunk = 1_000_000
+    t0 = time.perf_counter()
+    for lo in range(0, n, chunk):
+        m = min(chunk, n - lo)
+        feats = rng.integers(0, 30, size=(m, len(FEATURES))).astype(np.float32)
+        with cohort._writer():
+            columns = {
+                'eval_id': np.arange(lo + 1, lo + m + 1), 'timestamp': np.full(m, b'2026-01-01T00:00:00', dtype='S32'),
+                'pacient': rng.integers(0, 50_000, m).astype(np.int32), 'sectie': rng.integers(0, 8, m).astype(np.int16),
+                'nivel': rng.integers(0, 5, m).astype(np.int16), 'reguli': np.zeros(m, dtype=np.int16),
+                'scor': rng.integers(0, 200, m).astype(np.int32), 'bacterie': np.zeros(m, dtype=np.int16),
+                'tip_infectie': np.zeros(m, dtype=np.int16), 'cultura_pozitiva': rng.random(m) < 0.2,
+                'disp_prezent': rng.random((m, len(DEVICES))) < 0.3, 'disp_zile': rng.integers(0, 30, (m, len(DEVICES))),
+                'features': feats, 'norms': np.einsum('ij,ij->i', feats, feats),
+            }
+            for col, values in (('pacient', 50_000), ('sectie', 8), ('nivel', 5), ('reguli', 1), ('bacterie', 1), ('tip_infectie', 1)):
+                cohort.dicts[col] = [f'{col}_{i}' for i in range(values)]
+            cohort._publish(cohort.segments + [cohort._write_segment(columns)])
+    print(f"scriere {n} rânduri: {time.perf_counter() - t0:.1f}s ({len(cohort.segments)} segmente)")
+    t0 = time.perf_counter()
+    cohort.compact()
+    print(f"compactare: {time.perf_counter() - t0:.1f}s")
+    t0 = time.perf_counter()
+    reader = CohortStore.open(root)
+    scor = reader.column('scor')
+    t_open = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    mean = float(scor.mean())
+    print(f"deschidere: {t_open * 1000:.1f} ms • scanare scor: {(time.perf_counter() - t0) * 1000:.0f} ms (medie {mean:.1f})")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind memory-mapped cohort store")
+    parser.add_argument("--root", default=str(SNAPSHOT_DIR), help="snapshot store directory (cohort under <root>/cohort)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("sync", help="append evaluations newer than the cohort, compacting when needed")
+    sub.add_parser("compact", help="merge every segment into one")
+    sub.add_parser("stats", help="rows, segments and dictionary sizes")
+    b = sub.add_parser("bench", help="write a synthetic cohort and time opening it")
+    b.add_argument("--rows", type=int, default=10_000_000)
+    b.add_argument("--dir", required=True, help="scratch directory for the synthetic cohort")
+    args = parser.parse_args(argv)
+
+    root = Path(args.root)
+    if args.cmd == "bench":
+        _bench(Path(args.dir), args.rows)
+        return 0
+    cohort = CohortStore.open(root / "cohort")
+    if args.cmd == "sync":
+        from epimind_batch import load_engine
+        t0 = time.perf_counter()
+        added = cohort.sync(SnapshotStore(root), load_engine())
+        print(f"{added} evaluări adăugate, {cohort.rows} în cohortă, {len(cohort.segments)} segmente ({time.perf_counter() - t0:.1f}s)")
+    elif args.cmd == "compact":
+        print(f"{cohort.compact()} segmente compactate")
+    else:
+        print(json.dumps(cohort.stats(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
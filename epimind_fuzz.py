@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Differential fuzzing of the optimised scoring paths against `calculate_iaam_risk`
+
+Generates random payloads biased towards the engine's edges: every cut-off of the SOFA, qSOFA,
+APACHE-like, temporal and device-day rules (value just below, at and just above), the lab tiers
+of the current rule set, None / empty / non-numeric lab strings, missing keys, unknown devices,
+resistance mechanisms and comorbidities. Each batch is scored by the reference engine and by every
+optimised path, and score, level and contributions (`detalii`) are compared, including which
+exception is raised when the reference rejects a payload. Every mismatch is shrunk (dropping keys,
+emptying containers, simplifying values while the mismatch persists) to a minimal payload that
+still reproduces it.
+
+Paths checked (`--variante`):
+  paralel      epimind_batch.score_payloads across worker processes (chunked, one rule set per chunk)
+  snapshot     re-scoring from a stored snapshot (canonical JSON round trip: reports, replay, re-open)
+  incremental  a score derived from a neighbour's score plus the delta of one input (epimind_uncertainty)
+  calibrare    fixed part + contributions x weights under a perturbed weight set (epimind_calibrate)
+  praguri      vectorised level lookup RuleSet.level_index (uncertainty draws)
+  knn          sum of the score-contribution vector (k-NN index, cohort, replay contributors)
+  an engine file given with --motor (same functions as dashboard_iaam), e.g. a compiled rewrite
+
+Gate a change (exit code 1 on any mismatch):
+    python epimind_fuzz.py --n 1000000 --workers 4 --out nepotriviri.ndjson
+    python epimind_fuzz.py --n 200000 --variante snapshot,knn --motor motor_nou.py
+"""
+
+from __future__ import annotations
+
+import abc
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from epimind_batch import _score_chunk, load_engine, score_payloads
+from epimind_calibrate import contribution_row, current_weights, tunable_columns
+from epimind_knn import DEVICES, encode_payload
+from epimind_rules import compile_rules, merge_rules
+from epimind_snapshots import canonicalize
+from epimind_uncertainty import UNCERTAIN_INPUTS, _get, _points, _with
+
+BATCH = 20_000
+SHRINK_BUDGET = 400  # candidate payloads tried per mismatch
+KEEP = 5             # shrunk mismatches reported per path
+
+Outcome = Dict[str, Any]
+Pair = Optional[Tuple[Outcome, Outcome]]  # (expected, obtained); None when the path does not apply
+
+# Cut-offs of the engine's clinical rules: one value just below, at and just above each
+BOUNDARIES: Dict[str, Tuple[float, ...]] = {
+    'ore_spitalizare': (0, 47, 48, 71, 72, 167, 168, 2000),
+    'pao2_fio2': (99, 100, 199, 200, 299, 300, 399, 400, 500),
+    'trombocite': (19, 20, 49, 50, 99, 100, 149, 150, 200),
+    'bilirubina': (1.0, 1.19, 1.2, 1.99, 2.0, 5.99, 6.0, 11.99, 12.0),
+    'glasgow': (3, 5, 6, 9, 10, 12, 13, 14, 15),
+    'creatinina': (1.0, 1.19, 1.2, 1.99, 2.0, 3.49, 3.5, 4.99, 5.0),
+    'diureza_ml_kg_h': (0.09, 0.1, 0.29, 0.3, 0.49, 0.5, 1.0),
+    'tas': (99, 100, 120),
+    'fr': (18, 21, 22),
+    'temperatura': (29.9, 30, 31.9, 32, 33.9, 34, 35.9, 36, 37.0, 38.4, 38.5, 38.9, 39, 40.9, 41),
+    'tam': (49, 50, 69, 70, 109, 110, 129, 130, 159, 160),
+    'fc': (39, 40, 54, 55, 69, 70, 80, 109, 110, 139, 140, 179, 180),
+    'varsta': (30, 44, 45, 54, 55, 64, 65, 74, 75, 90),
+}
+DEVICE_DAYS = (0, 3, 4, 7, 8, 30)
+SEDIMENT = {'leu_urina': (0, 5, 6, 10, 11), 'eri_urina': (0, 3, 4, 50, 51), 'bact_urina': (0, 1, 2, 4), 'cel_epit': (0, 5, 6)}
+INVALID = (None, '', 'abc', ' 12 ', '1e3', 'nan', 'inf', '-1', '12,5', True, [], {})
+UNKNOWN_DEVICE, UNKNOWN_REZ = 'Cateter arterial', 'OXA-48'
+
+
+# ---------------- Payload generator ----------------
+
+class PayloadGenerator:
+    """Random payloads biased towards rule boundaries and malformed inputs (reproducible per seed)."""
+
+    def __init__(self, rules, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.rules = rules
+        self.lab_values: Dict[str, List[Any]] = {}
+        for marker, rule in rules.lab.items():
+            cuts = [float(t) for t, _ in rule.above] + [float(t) for t, _ in rule.below]
+            values: List[Any] = [0, 1] if rule.positive else []
+            for t in cuts:
+                eps = max(abs(t) * 1e-3, 1e-6)
+                values += [t - eps, t, t + eps, str(t), str(int(t)) if t == int(t) else str(t)]
+            self.lab_values[marker] = values or [0.0]
+        self.devices = list(DEVICES) + [UNKNOWN_DEVICE]
+        self.rez = list(rules.rez_points) + [UNKNOWN_REZ, '']
+        self.comorbidities = [(cat, cond, m) for cat, conds in rules.comorbiditati.items() for cond, m in conds.items()]
+
+    def _number(self, bounds: Sequence[float]) -> Any:
+        r = self.rng.random()
+        if r < 0.55:
+            return self.rng.choice(bounds)
+        lo, hi = min(bounds), max(bounds)
+        if all(float(b).is_integer() for b in bounds):
+            return self.rng.randint(int(lo * 0.5), int(hi * 1.5) + 1)
+        return round(self.rng.uniform(lo * 0.5, hi * 1.5), self.rng.choice((1, 2, 6)))
+
+    def _value(self, bounds: Sequence[float], p_invalid: float = 0.03) -> Any:
+        return self.rng.choice(INVALID) if self.rng.random() < p_invalid else self._number(bounds)
+
+    def _maybe(self, payload: Dict[str, Any], key: str, make: Callable[[], Any], p_missing: float = 0.05) -> None:
+        if self.rng.random() >= p_missing:
+            payload[key] = make()
+
+    def payload(self) -> Dict[str, Any]:
+        rng = self.rng
+        p: Dict[str, Any] = {'nume_pacient': f'Pacient_{rng.randint(0, 9999):04d}',
+                             'sectie': rng.choice(['ATI', 'Chirurgie', 'Medicină Internă', 'Pediatrie', 'Neonatologie'])}
+        for key, bounds in BOUNDARIES.items():
+            # hours stay valid more often: below 48h the engine stops before the other rules
+            self._maybe(p, key, lambda b=bounds, k=key: self._value(b, 0.01 if k == 'ore_spitalizare' else 0.03))
+        for key in ('hipotensiune', 'vasopresoare', 'cultura_pozitiva', 'analiza_urina'):
+            self._maybe(p, key, lambda: rng.random() < 0.3)
+        self._maybe(p, 'dispozitive', self._devices, 0.03)
+        self._maybe(p, 'bacterie', lambda: rng.choice(['', 'Klebsiella pneumoniae', 'Escherichia coli', 'Staphylococcus aureus']))
+        self._maybe(p, 'profil_rezistenta', lambda: [rng.choice(self.rez) for _ in range(rng.choice((0, 0, 1, 2, 3)))])
+        self._maybe(p, 'sediment', self._sediment, 0.1)
+        self._maybe(p, 'comorbiditati', self._comorbidities, 0.1)
+        self._maybe(p, 'analize', self._labs, 0.1)
+        self._maybe(p, 'inputuri_lipsa', lambda: rng.sample(list(UNCERTAIN_INPUTS), rng.choice((0, 0, 1, 2))), 0.2)
+        return p
+
+    def _devices(self) -> Dict[str, Any]:
+        rng = self.rng
+        out: Dict[str, Any] = {}
+        for d in self.devices:
+            if d == UNKNOWN_DEVICE and rng.random() > 0.1:
+                continue
+            info: Dict[str, Any] = {}
+            self._maybe(info, 'prezent', lambda: rng.random() < 0.4, 0.05)
+            self._maybe(info, 'zile', lambda: self._value(DEVICE_DAYS, 0.02), 0.05)
+            out[d] = info
+        return out
+
+    def _sediment(self) -> Dict[str, Any]:
+        rng = self.rng
+        out = {k: self._number(b) for k, b in SEDIMENT.items() if rng.random() < 0.8}
+        for k in ('nitriti', 'esteraza', 'cilindri'):
+            if rng.random() < 0.8:
+                out[k] = rng.random() < 0.3
+        if rng.random() < 0.5:
+            out['tip_cilindri'] = rng.choice(['', 'Leucocitari', 'granulari', 'hialini'])
+        return out
+
+    def _comorbidities(self) -> Dict[str, Dict[str, Any]]:
+        rng = self.rng
+        out: Dict[str, Dict[str, Any]] = {}
+        for _ in range(rng.choice((0, 1, 2, 3))):
+            cat, cond, m = rng.choice(self.comorbidities)
+            sev = rng.choice(list(m)) if isinstance(m, dict) and rng.random() < 0.85 else rng.choice([True, 'Necunoscută', None, 1])
+            out.setdefault(cat, {})[cond] = sev
+        if rng.random() < 0.05:
+            out.setdefault('Altele', {})['Boală rară'] = True
+        return out
+
+    def _labs(self) -> Dict[str, Any]:
+        rng = self.rng
+        out: Dict[str, Any] = {}
+        for marker, values in self.lab_values.items():
+            if rng.random() < 0.6:
+                out[marker] = rng.choice(INVALID) if rng.random() < 0.08 else rng.choice(values)
+        return out
+
+
+# ---------------- Reference and compared paths ----------------
+
+def score_outcome(engine, payload: Dict[str, Any], rules=None) -> Outcome:
+    """Score, level and contributions of one payload, or the exception type the engine raises.
+
+    Without `rules` the engine is called with the payload alone, so engines predating the rule set
+    (`calculate_iaam_risk(payload)`) can be compared too.
+    """
+    try:
+        scor, nivel, detalii, _ = engine.calculate_iaam_risk(payload, rules) if rules is not None else engine.calculate_iaam_risk(payload)
+    except Exception as e:
+        return {'eroare': type(e).__name__}
+    return {'scor': int(scor), 'nivel': nivel, 'detalii': list(detalii)}
+
+
+def differences(expected: Outcome, obtained: Outcome) -> List[str]:
+    """Fields that disagree; only fields the compared path produces are checked.
+
+    Contributions are compared as a multiset: their order follows the payload's key order, which
+    snapshots canonicalise (sorted keys), while the score they add up to does not depend on it.
+    """
+    if 'eroare' in expected or 'eroare' in obtained:
+        return [] if expected.get('eroare') == obtained.get('eroare') else ['eroare']
+    out = [k for k in ('scor', 'nivel') if k in obtained and obtained[k] != expected.get(k)]
+    if 'detalii' in obtained and sorted(obtained['detalii']) != sorted(expected.get('detalii') or ()):
+        out.append('detalii')
+    return out
+
+
+class ScoringPath(abc.ABC):
+    """A scoring path compared with the reference; `check` returns one (expected, obtained) pair per payload."""
+
+    name = ''
+
+    def __init__(self, engine, rules):
+        self.engine = engine
+        self.rules = rules
+
+    def begin_batch(self, rng: random.Random) -> None:
+        pass
+
+    @abc.abstractmethod
+    def check(self, payloads: Sequence[Dict[str, Any]], refs: Sequence[Outcome]) -> List[Pair]:
+        """One (expected, obtained) pair per payload, or None where the path does not apply."""
+
+    def close(self) -> None:
+        pass
+
+
+class ParallelPath(ScoringPath):
+    name = 'paralel'
+
+    def __init__(self, engine, rules, workers: int, chunksize: int = 512):
+        super().__init__(engine, rules)
+        self.workers = max(2, workers)
+        self.chunksize = chunksize
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _worker(self, payloads: List[Dict[str, Any]]) -> List[Outcome]:
+        # Small inputs (rejected payloads, shrinking) go to one long-lived pool instead of a new one each time.
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=1, initializer=load_engine)
+        try:
+            return [{'scor': int(r['scor']), 'nivel': r['nivel'], 'detalii': list(r['detalii'])}
+                    for r in self._pool.submit(_score_chunk, payloads).result()]
+        except Exception as e:
+            return [{'eroare': type(e).__name__}] * len(payloads)
+
+    def check(self, payloads, refs):
+        out: List[Pair] = [None] * len(payloads)
+        ok = [i for i, r in enumerate(refs) if 'eroare' not in r]
+        if len(ok) >= self.chunksize:
+            results = score_payloads((payloads[i] for i in ok), self.workers, self.chunksize)
+            for i, r in zip(ok, results):
+                out[i] = (refs[i], {'scor': int(r['scor']), 'nivel': r['nivel'], 'detalii': list(r['detalii'])})
+        elif ok:
+            for i, got in zip(ok, self._worker([payloads[i] for i in ok])):
+                out[i] = (refs[i], got)
+        for i, r in enumerate(refs):
+            if 'eroare' in r:  # each rejected payload on its own: one error fails the whole chunk
+                out[i] = (r, self._worker([payloads[i]])[0])
+        return out
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class SnapshotPath(ScoringPath):
+    name = 'snapshot'
+
+    def check(self, payloads, refs):
+        return [(ref, score_outcome(self.engine, json.loads(canonicalize(p)), self.rules)) for p, ref in zip(payloads, refs)]
+
+
+class IncrementalPath(ScoringPath):
+    """Score of a payload obtained from the score of a neighbour differing in one uncertain input."""
+
+    name = 'incremental'
+
+    def __init__(self, engine, rules, seed: int = 0):
+        super().__init__(engine, rules)
+        self.rng = random.Random(seed)
+        self.inputs = list(UNCERTAIN_INPUTS)
+        self.grid: Dict[str, List[Any]] = {}
+        for name, (_, path, component) in UNCERTAIN_INPUTS.items():
+            if name in ('blood_culture_positive', 'cultura_pozitiva'):
+                self.grid[name] = [True, False]
+            elif component == 'sofa':
+                self.grid[name] = [float(v) for v in BOUNDARIES[path[-1]]]
+            else:
+                lab = rules.lab.get(path[-1])
+                self.grid[name] = sorted({float(t) + d for t, _ in (lab.above + lab.below) for d in (-0.01, 0, 0.01)}) if lab else [0.0]
+
+    def check(self, payloads, refs):
+        out: List[Pair] = []
+        levels = set(self.rules.level_names)
+        for p, ref in zip(payloads, refs):
+            name = self.rng.choice(self.inputs)
+            _, path, component = UNCERTAIN_INPUTS[name]
+            try:
+                neighbour = _with(p, path, self.rng.choice(self.grid[name]))
+                base = score_outcome(self.engine, neighbour, self.rules)
+                if 'eroare' in base or base['nivel'] not in levels:
+                    out.append(None)  # simulate() is only used for scored, non-excluded evaluations
+                    continue
+                points = _points(self.engine, self.rules, component, neighbour, path)
+                scor = base['scor'] + points(_get(p, path)) - points(_get(neighbour, path))
+            except Exception:
+                out.append(None)
+                continue
+            out.append((ref, {'scor': int(scor), 'nivel': self.rules.level_of(scor)[0]}))
+        return out
+
+
+class CalibrationPath(ScoringPath):
+    """Scores under a perturbed weight set from the fixed part and the weight counts of the current scores."""
+
+    name = 'calibrare'
+
+    def __init__(self, engine, rules):
+        super().__init__(engine, rules)
+        self.columns = tunable_columns(engine)
+        self.index = {c: i for i, c in enumerate(self.columns)}
+        self.weights = current_weights(engine, self.columns)
+        self.alt_rules, self.alt_weights = rules, self.weights
+
+    def begin_batch(self, rng: random.Random) -> None:
+        alt = np.maximum(0, self.weights + np.array([rng.randint(-10, 10) for _ in self.columns]))
+        overlay: Dict[str, Any] = {'versiune': 'fuzz', 'device_weights': {}, 'rezistenta_puncte': {}}
+        for col, w in zip(self.columns, alt):
+            kind, name = col.split(':', 1)
+            overlay['device_weights' if kind == 'disp' else 'rezistenta_puncte'][name] = int(w)
+        self.alt_rules, self.alt_weights = compile_rules(merge_rules(self.rules.raw, overlay), 'fuzz'), alt
+
+    def check(self, payloads, refs):
+        out: List[Pair] = []
+        for p, ref in zip(payloads, refs):
+            if 'eroare' in ref:
+                out.append(None)
+                continue
+            try:
+                fixed, x = contribution_row(p, ref['scor'], self.index, self.weights)
+            except Exception as e:
+                out.append((ref, {'eroare': type(e).__name__}))
+                continue
+            # Calibration only uses scores: the level of a temporally excluded payload is not compared.
+            out.append((score_outcome(self.engine, p, self.alt_rules), {'scor': int(fixed + int(np.dot(x, self.alt_weights)))}))
+        return out
+
+
+class LevelTablePath(ScoringPath):
+    name = 'praguri'
+
+    def check(self, payloads, refs):
+        out: List[Pair] = [None] * len(payloads)
+        scored = [i for i, r in enumerate(refs) if 'eroare' not in r and r['nivel'] in self.rules.level_names]
+        if scored:
+            idx = self.rules.level_index(np.array([refs[i]['scor'] for i in scored], dtype=float))
+            for i, j in zip(scored, idx):
+                out[i] = (refs[i], {'nivel': self.rules.level_names[int(j)]})
+        return out
+
+
+class KnnPath(ScoringPath):
+    """The contribution vector sums to the score for payloads it can represent (scored, known devices only)."""
+
+    name = 'knn'
+
+    def check(self, payloads, refs):
+        out: List[Pair] = []
+        for p, ref in zip(payloads, refs):
+            disp = p.get('dispozitive')
+            if 'eroare' in ref or ref['nivel'] not in self.rules.level_names or \
+                    (isinstance(disp, dict) and any(d not in DEVICES for d in disp)):
+                out.append(None)
+                continue
+            try:
+                scor = int(encode_payload(p, self.engine).sum())
+            except Exception as e:
+                out.append((ref, {'eroare': type(e).__name__}))
+                continue
+            out.append((ref, {'scor': scor, 'nivel': self.rules.level_of(scor)[0]}))
+        return out
+
+
+class EnginePath(ScoringPath):
+    """Another engine module exposing calculate_iaam_risk (e.g. a compiled or vectorised rewrite)."""
+
+    def __init__(self, engine, rules, spec: str):
+        super().__init__(engine, rules)
+        from epimind_replay import load_engine_spec
+        self.name = f'motor:{Path(spec).name}'
+        self.other = load_engine_spec(spec, f'_epimind_fuzz_{Path(spec).stem}')
+
+    def check(self, payloads, refs):
+        return [(ref, score_outcome(self.other, p)) for p, ref in zip(payloads, refs)]  # the engine's own rules
+
+
+PATHS = ('paralel', 'snapshot', 'incremental', 'calibrare', 'praguri', 'knn')
+
+
+def make_paths(engine, rules, names: Sequence[str], engines: Sequence[str] = (), workers: int = 2, seed: int = 0) -> List[ScoringPath]:
+    factories = {
+        'paralel': lambda: ParallelPath(engine, rules, workers),
+        'snapshot': lambda: SnapshotPath(engine, rules),
+        'incremental': lambda: IncrementalPath(engine, rules, seed),
+        'calibrare': lambda: CalibrationPath(engine, rules),
+        'praguri': lambda: LevelTablePath(engine, rules),
+        'knn': lambda: KnnPath(engine, rules),
+    }
+    unknown = [n for n in names if n not in factories]
+    if unknown:
+        raise ValueError(f"variante necunoscute: {', '.join(unknown)} (disponibile: {', '.join(PATHS)})")
+    return [factories[n]() for n in names] + [EnginePath(engine, rules, spec) for spec in engines]
+
+
+# ---------------- Shrinking ----------------
+
+def _simpler(value: Any) -> Iterator[Any]:
+    """Simpler replacements for a leaf value, simplest first."""
+    if isinstance(value, bool):
+        if value:
+            yield False
+    elif isinstance(value, (int, float)):
+        for v in (0, int(value) if value == value and abs(value) != float('inf') else None, value / 2 if abs(value) > 1 else None):
+            if v is not None and v != value:
+                yield v
+    elif isinstance(value, str) and value:
+        yield ''
+
+
+def _candidates(node: Any) -> Iterator[Any]:
+    """Payloads one step simpler than `node`: a key or element dropped, a container emptied, a leaf simplified."""
+    if isinstance(node, dict):
+        for k in list(node):
+            yield {kk: vv for kk, vv in node.items() if kk != k}
+        for k, v in node.items():
+            if isinstance(v, (dict, list)) and v:
+                yield {**node, k: type(v)()}
+            for sub in _candidates(v):
+                yield {**node, k: sub}
+    elif isinstance(node, list):
+        for i in range(len(node)):
+            yield node[:i] + node[i + 1:]
+        for i, v in enumerate(node):
+            for sub in _candidates(v):
+                yield node[:i] + [sub] + node[i + 1:]
+    else:
+        yield from _simpler(node)
+
+
+def shrink(payload: Dict[str, Any], still_fails: Callable[[Dict[str, Any]], bool], budget: int = SHRINK_BUDGET) -> Tuple[Dict[str, Any], int]:
+    """Greedy minimisation: take the first simpler candidate that still fails, until none does. Returns (payload, tries)."""
+    current, tries = payload, 0
+    progress = True
+    while progress and tries < budget:
+        progress = False
+        for cand in _candidates(current):
+            tries += 1
+            if still_fails(cand):
+                current, progress = cand, True
+                break
+            if tries >= budget:
+                break
+    return current, tries
+
+
+def _fails(engine, rules, path: ScoringPath) -> Callable[[Dict[str, Any]], bool]:
+    def still_fails(payload: Dict[str, Any]) -> bool:
+        pair = path.check([payload], [score_outcome(engine, payload, rules)])[0]
+        return pair is not None and bool(differences(*pair))
+    return still_fails
+
+
+# ---------------- Driver ----------------
+
+def fuzz(engine, paths: Sequence[ScoringPath], n: int, batch: int = BATCH, seed: int = 0, max_seconds: Optional[float] = None,
+         keep: int = KEEP, progress: Optional[Callable[[int, Dict[str, Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+    """Run `n` generated payloads through the reference and every path; mismatches are shrunk (up to `keep` per path)."""
+    rules = engine.current_rules()
+    gen = PayloadGenerator(rules, seed)
+    rng = random.Random(seed + 1)
+    stats = {p.name: {'verificate': 0, 'neaplicabile': 0, 'nepotriviri': 0, 'secunde': 0.0} for p in paths}
+    stats['referinta'] = {'verificate': 0, 'respinse': 0, 'secunde': 0.0}
+    found: List[Dict[str, Any]] = []
+    t_start = time.perf_counter()
+    done = 0
+    while done < n and (max_seconds is None or time.perf_counter() - t_start < max_seconds):
+        payloads = [gen.payload() for _ in range(min(batch, n - done))]
+        t0 = time.perf_counter()
+        refs = [score_outcome(engine, p, rules) for p in payloads]
+        ref_stats = stats['referinta']
+        ref_stats['secunde'] += time.perf_counter() - t0
+        ref_stats['verificate'] += len(payloads)
+        ref_stats['respinse'] += sum('eroare' in r for r in refs)
+        for path in paths:
+            s = stats[path.name]
+            path.begin_batch(rng)
+            t0 = time.perf_counter()
+            pairs = path.check(payloads, refs)
+            s['secunde'] += time.perf_counter() - t0
+            for p, pair in zip(payloads, pairs):
+                if pair is None:
+                    s['neaplicabile'] += 1
+                    continue
+                s['verificate'] += 1
+                diff = differences(*pair)
+                if not diff:
+                    continue
+                s['nepotriviri'] += 1
+                if s['nepotriviri'] <= keep:
+                    minimal, tries = shrink(p, _fails(engine, rules, path))
+                    expected, obtained = path.check([minimal], [score_outcome(engine, minimal, rules)])[0]
+                    found.append({'varianta': path.name, 'campuri': differences(expected, obtained),
+                                  'payload_minim': minimal, 'asteptat': expected, 'obtinut': obtained,
+                                  'payload_original': p, 'incercari_reducere': tries})
+        done += len(payloads)
+        if progress:
+            progress(done, stats)
+    return {'payloaduri': done, 'secunde': round(time.perf_counter() - t_start, 1), 'seed': seed,
+            'versiune_reguli': rules.label, 'statistici': stats, 'nepotriviri': found}
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    ref = report['statistici']['referinta']
+    lines = [f"{report['payloaduri']} payload-uri în {report['secunde']}s (seed {report['seed']}, reguli {report['versiune_reguli']}); "
+             f"referință: {ref['respinse']} respinse, {ref['verificate'] / max(ref['secunde'], 1e-9):.0f}/s"]
+    for name, s in report['statistici'].items():
+        if name == 'referinta':
+            continue
+        rate = s['verificate'] / max(s['secunde'], 1e-9)
+        status = 'OK' if not s['nepotriviri'] else f"{s['nepotriviri']} NEPOTRIVIRI"
+        lines.append(f"  {name:<24} {status:<16} verificate={s['verificate']} neaplicabile={s['neaplicabile']} ({rate:.0f}/s)")
+    for m in report['nepotriviri']:
+        lines.append(f"\n[{m['varianta']}] diferă: {', '.join(m['campuri'])} (redus în {m['incercari_reducere']} încercări)")
+        lines.append(f"  payload minim: {json.dumps(m['payload_minim'], ensure_ascii=False, default=str)}")
+        lines.append(f"  așteptat: {json.dumps(m['asteptat'], ensure_ascii=False)}")
+        lines.append(f"  obținut:  {json.dumps(m['obtinut'], ensure_ascii=False)}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind differential fuzzing of optimised scoring paths")
+    parser.add_argument("--n", type=int, default=100_000, help="payloads to generate")
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variante", default=",".join(PATHS), help=f"comma-separated subset of: {', '.join(PATHS)}")
+    parser.add_argument("--motor", action="append", default=[], help="engine .py to compare as well (repeatable)")
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1), help="processes for the 'paralel' path")
+    parser.add_argument("--max-seconds", type=float, default=None, help="stop after this long even if --n is not reached")
+    parser.add_argument("--keep", type=int, default=KEEP, help="mismatches shrunk and reported per path")
+    parser.add_argument("--out", default="", help="write shrunk mismatches as NDJSON")
+    args = parser.parse_args(argv)
+
+    engine = load_engine()
+    names = [v.strip() for v in args.variante.split(",") if v.strip()]
+    paths = make_paths(engine, engine.current_rules(), names, args.motor, args.workers, args.seed)
+    t0 = time.perf_counter()
+
+    def progress(done: int, stats: Dict[str, Dict[str, Any]]) -> None:
+        bad = sum(s.get('nepotriviri', 0) for s in stats.values())
+        print(f"\r{done}/{args.n} payload-uri, {done / max(time.perf_counter() - t0, 1e-9):.0f}/s, {bad} nepotriviri",
+              end="", file=sys.stderr)
+
+    try:
+        report = fuzz(engine, paths, args.n, args.batch, args.seed, args.max_seconds, args.keep, progress)
+    finally:
+        for path in paths:
+            path.close()
+    print(file=sys.stderr)
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            for m in report['nepotriviri']:
+                fh.write(json.dumps(m, ensure_ascii=False, default=str) + "\n")
+    return 1 if any(s.get('nepotriviri') for s in report['statistici'].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Streaming bulk importer for FHIR NDJSON Observations and flat LIS CSV exports
+
+Maps LOINC-coded observations onto the payload fields used by `calculate_iaam_risk`
+(`analize` markers and the severity parameters), joins them per patient and time window and
+hands the assembled payloads straight to the batch scorer.
+
+Inputs are read line by line. Open (patient, window) groups are flushed as soon as the stream
+has moved past their window plus an allowed lateness, and their number is capped, so memory
+stays bounded for multi-gigabyte files that are roughly time-ordered.
+
+Flat CSV columns: patient_id, effective (ISO datetime), code (LOINC or local code), value, unit.
+Values are converted to the units the engine expects; observations in a unit not listed in
+UNIT_FACTORS are skipped and counted in the summary rather than scored as if already converted.
+Optional census CSV: patient_id, sectie, admission (ISO datetime) — gives sectie and
+ore_spitalizare; without it the temporal criterion cannot be met and patients score 0.
+
+Run:
+    python epimind_import.py observations.ndjson.gz --census census.csv --window-hours 24 --out rezultate.ndjson
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from epimind_batch import score_payloads
+
+# code -> (target, field); target 'analize' fills payload['analize'], 'payload' a top-level field.
+LOINC_MAP: Dict[str, Tuple[str, str]] = {
+    '6690-2': ('analize', 'wbc'),            # Leukocytes [#/volume] in Blood by Automated count
+    '26464-8': ('analize', 'wbc'),           # Leukocytes [#/volume] in Blood
+    '751-8': ('analize', 'neut_abs'),        # Neutrophils [#/volume] in Blood by Automated count
+    '770-8': ('analize', 'neut_pct'),        # Neutrophils/100 leukocytes in Blood by Automated count
+    '1988-5': ('analize', 'crp'),            # C reactive protein [Mass/volume] in Serum or Plasma
+    '4537-7': ('analize', 'esr'),            # ESR by Westergren method
+    '30341-2': ('analize', 'esr'),           # Erythrocyte sedimentation rate
+    '33959-8': ('analize', 'pct'),           # Procalcitonin [Mass/volume] in Serum or Plasma
+    'presepsin': ('analize', 'presepsin'),   # local LIS code; add the lab's LOINC with --map
+    '2524-7': ('analize', 'lactate'),        # Lactate [Moles/volume] in Serum or Plasma
+    '32693-4': ('analize', 'lactate'),       # Lactate [Moles/volume] in Blood
+    '600-7': ('analize', 'blood_culture_positive'),  # Bacteria identified in Blood by Culture
+    '8480-6': ('payload', 'tas'),            # Systolic blood pressure
+    '8478-0': ('payload', 'tam'),            # Mean blood pressure
+    '9279-1': ('payload', 'fr'),             # Respiratory rate
+    '8867-4': ('payload', 'fc'),             # Heart rate
+    '8310-5': ('payload', 'temperatura'),    # Body temperature
+    '9269-2': ('payload', 'glasgow'),        # Glasgow coma score total
+    '777-3': ('payload', 'trombocite'),      # Platelets [#/volume] in Blood by Automated count
+    '1975-2': ('payload', 'bilirubina'),     # Bilirubin.total [Mass/volume] in Serum or Plasma
+    '2160-0': ('payload', 'creatinina'),     # Creatinine [Mass/volume] in Serum or Plasma
+    '50984-4': ('payload', 'pao2_fio2'),     # Horowitz index in Arterial blood
+}
+# (field, normalised unit) -> factor to the unit the engine expects. Units are matched on the UCUM code when
+# the export has one (µ/μ written as u, lower case); an observation whose unit is not listed is rejected.
+UNIT_FACTORS: Dict[Tuple[str, str], float] = {
+    **{(f, u): 1.0 for f in ('wbc', 'neut_abs', 'trombocite') for u in ('10*3/ul', '10^3/ul', 'x10^3/ul', '10*9/l', 'g/l')},
+    **{(f, '/ul'): 1e-3 for f in ('wbc', 'neut_abs', 'trombocite')},
+    ('neut_pct', '%'): 1.0,
+    ('crp', 'mg/l'): 1.0,
+    ('crp', 'mg/dl'): 10.0,
+    ('esr', 'mm/h'): 1.0,
+    ('esr', 'mm/hr'): 1.0,
+    ('pct', 'ng/ml'): 1.0,
+    ('pct', 'ug/l'): 1.0,
+    ('presepsin', 'pg/ml'): 1.0,
+    ('presepsin', 'ng/l'): 1.0,
+    ('lactate', 'mmol/l'): 1.0,
+    ('lactate', 'mg/dl'): 1 / 9.01,
+    **{(f, u): 1.0 for f in ('tas', 'tam') for u in ('mm[hg]', 'mmhg')},
+    **{(f, u): 1.0 for f in ('fr', 'fc') for u in ('/min', '{breaths}/min', '{beats}/min', 'bpm')},
+    ('temperatura', 'cel'): 1.0,
+    ('temperatura', '°c'): 1.0,
+    ('glasgow', ''): 1.0,
+    ('glasgow', '{score}'): 1.0,
+    ('bilirubina', 'mg/dl'): 1.0,
+    ('bilirubina', 'umol/l'): 1 / 17.1,
+    ('creatinina', 'mg/dl'): 1.0,
+    ('creatinina', 'umol/l'): 1 / 88.4,
+    ('pao2_fio2', ''): 1.0,
+    ('pao2_fio2', 'mm[hg]'): 1.0,
+    ('pao2_fio2', 'mmhg'): 1.0,
+}
+# Culture results read as negative: a whole result, or a result opening with one of these phrases
+# ("no growth after 48h"); a substring would also match "Gram-negative bacilli", which is a positive culture.
+_NEGATIVE_RESULTS = frozenset({'neg', 'negativ', 'negative', 'no growth', 'fără creștere', 'fara crestere', 'steril',
+                               'sterile', 'not detected', 'nedetectat'})
+_NEGATIVE_START = re.compile(r'^(negativ[ea]?|no growth|f[aă]r[aă] cre[sș]tere|steril[ea]?|not detected|nedetectat)\b')
+# SNOMED CT result codes: negative, no growth, not detected / positive, detected
+_SNOMED_RESULTS = {'260385009': False, '264868006': False, '260415000': False, '10828004': True, '260373001': True}
+
+
+def _parse_time(value: str) -> float:
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _culture_positive(value: Any, interpretation: str = '') -> bool:
+    """Coded interpretation first, then a SNOMED CT result code, then the result text as a whole."""
+    if interpretation:
+        return interpretation.upper() in ('POS', 'A', 'H', 'DET')
+    if isinstance(value, bool):
+        return value
+    text = ' '.join(str(value or '').lower().split()).rstrip('.')
+    if text in _SNOMED_RESULTS:
+        return _SNOMED_RESULTS[text]
+    return bool(text) and text not in _NEGATIVE_RESULTS and not _NEGATIVE_START.match(text)
+
+
+# ---------------- Readers: one normalised observation per record ----------------
+
+Observation = Tuple[str, float, str, Any, str, str]  # patient, epoch, code, value, unit, interpretation
+
+
+def _open_text(path: str) -> io.TextIOBase:
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_fhir_ndjson(path: str) -> Iterator[Observation]:
+    with _open_text(path) as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            res = json.loads(line)
+            if res.get('resourceType') != 'Observation':
+                continue
+            when = res.get('effectiveDateTime') or (res.get('effectivePeriod') or {}).get('start') or res.get('issued')
+            patient = ((res.get('subject') or {}).get('reference') or '').rsplit('/', 1)[-1]
+            if not when or not patient:
+                continue
+            interp = ''
+            for it in res.get('interpretation') or []:
+                for c in it.get('coding') or []:
+                    interp = c.get('code') or interp
+            if 'valueQuantity' in res:
+                vq = res['valueQuantity']
+                value, unit = vq.get('value'), vq.get('code') or vq.get('unit') or ''
+            elif 'valueCodeableConcept' in res:
+                vc = res['valueCodeableConcept']
+                codings = vc.get('coding') or [{}]
+                coded = next((c['code'] for c in codings if c.get('code') in _SNOMED_RESULTS), None)
+                value, unit = coded or vc.get('text') or codings[0].get('display'), ''
+            else:
+                value, unit = res.get('valueString', res.get('valueBoolean')), ''
+            for coding in (res.get('code') or {}).get('coding') or []:
+                code = coding.get('code')
+                if code in LOINC_MAP:
+                    yield patient, _parse_time(when), code, value, unit, interp
+                    break
+
+
+def read_lab_csv(path: str) -> Iterator[Observation]:
+    with _open_text(path) as fh:
+        for row in csv.DictReader(fh):
+            code = (row.get('code') or '').strip()
+            if code not in LOINC_MAP or not row.get('patient_id') or not row.get('effective'):
+                continue
+            yield row['patient_id'], _parse_time(row['effective']), code, row.get('value'), row.get('unit') or '', row.get('interpretation') or ''
+
+
+def read_census(path: str) -> Dict[str, Tuple[str, float]]:
+    census: Dict[str, Tuple[str, float]] = {}
+    with _open_text(path) as fh:
+        for row in csv.DictReader(fh):
+            census[row['patient_id']] = (row.get('sectie') or '', _parse_time(row['admission']))
+    return census
+
+
+# ---------------- Windowed join ----------------
+
+def normalise_unit(unit: str) -> str:
+    return unit.replace('\u00b5', 'u').replace('\u03bc', 'u').replace(' ', '').lower()
+
+
+def _convert(field: str, value: Any, unit: str, interp: str) -> Any:
+    """Value in the unit the engine expects, None when it is not numeric; ValueError for a unit not in UNIT_FACTORS."""
+    if field == 'blood_culture_positive':
+        return _culture_positive(value, interp)
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    factor = UNIT_FACTORS.get((field, normalise_unit(unit)))
+    if factor is None:
+        raise ValueError(f"unitate necunoscută pentru {field}: {unit!r}")
+    return v * factor
+
+
+def assemble_payloads(
+    observations: Iterable[Observation],
+    census: Optional[Dict[str, Tuple[str, float]]] = None,
+    window_hours: float = 24.0,
+    lateness_hours: float = 24.0,
+    max_open: int = 200_000,
+    on_record: Optional[Callable[[], None]] = None,
+    rejected: Optional[Dict[Tuple[str, str], int]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Group observations per (patient, window) and yield one payload per group.
+
+    Within a window the latest observation of each field wins; a positive blood culture is sticky. Hours
+    since admission and `data_evaluare` are taken at the window's latest observation.
+    Observations in a unit missing from UNIT_FACTORS are skipped and counted per (field, unit) in `rejected`.
+    """
+    census = census or {}
+    width = window_hours * 3600.0
+    lateness = lateness_hours * 3600.0
+    groups: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    watermark = float('-inf')
+    next_flush = 0
+
+    def build(key: Tuple[str, int], fields: Dict[str, Any]) -> Dict[str, Any]:
+        patient, _ = key
+        # the evaluation is as of the latest observation in the window, not the window's end
+        latest = max(ts for ts, _ in fields.values())
+        sectie, admission = census.get(patient, ('', None))
+        payload: Dict[str, Any] = {
+            'nume_pacient': patient,
+            'sectie': sectie,
+            'ore_spitalizare': int(max(0.0, latest - admission) // 3600) if admission is not None else 0,
+            'data_evaluare': datetime.fromtimestamp(latest, timezone.utc).isoformat(),
+            'analize': {},
+        }
+        for (target, field), (_, value) in fields.items():
+            if target == 'analize':
+                payload['analize'][field] = value
+            else:
+                payload[field] = value
+        return payload
+
+    def flush(older_than: float) -> Iterator[Dict[str, Any]]:
+        done = [k for k in groups if (k[1] + 1) * width < older_than]
+        for k in sorted(done, key=lambda k: k[1]):
+            yield build(k, groups.pop(k))
+
+    for patient, ts, code, value, unit, interp in observations:
+        if on_record is not None:
+            on_record()
+        target, field = LOINC_MAP[code]
+        try:
+            conv = _convert(field, value, unit, interp)
+        except ValueError:
+            if rejected is not None:
+                rejected[(field, unit)] = rejected.get((field, unit), 0) + 1
+            continue
+        if conv is None:
+            continue
+        key = (patient, int(ts // width))
+        fields = groups.setdefault(key, {})
+        prev = fields.get((target, field))
+        if field == 'blood_culture_positive':
+            fields[(target, field)] = (max(ts, prev[0]) if prev else ts, conv or bool(prev and prev[1]))
+        elif prev is None or ts >= prev[0]:
+            fields[(target, field)] = (ts, conv)
+        if ts > watermark:
+            watermark = ts
+        next_flush += 1
+        if next_flush >= 10_000 or len(groups) > max_open:
+            next_flush = 0
+            yield from flush(watermark - lateness)
+            if len(groups) > max_open:  # badly ordered input: evict the oldest windows
+                for k in sorted(groups, key=lambda k: k[1])[: len(groups) - max_open]:
+                    yield build(k, groups.pop(k))
+    yield from flush(float('inf'))
+
+
+class Throughput:
+    """Records/s reporter writing to stderr at most every `every` seconds."""
+
+    def __init__(self, every: float = 5.0):
+        self.n = 0
+        self.t0 = self.last = time.perf_counter()
+        self.every = every
+
+    def tick(self) -> None:
+        self.n += 1
+        if self.n & 0xFFF == 0:
+            now = time.perf_counter()
+            if now - self.last >= self.every:
+                self.last = now
+                print(f"  {self.n} înregistrări • {self.n / (now - self.t0):.0f} înreg./s", file=sys.stderr)
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.t0
+        return f"{self.n} înregistrări în {elapsed:.1f}s ({self.n / max(elapsed, 1e-9):.0f} înreg./s)"
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind bulk importer (FHIR NDJSON / LIS CSV -> scored payloads)")
+    parser.add_argument("input", help="observations file (.ndjson/.json/.csv, optionally .gz; '-' for stdin NDJSON)")
+    parser.add_argument("--format", choices=["auto", "fhir", "csv"], default="auto")
+    parser.add_argument("--census", default="", help="CSV patient_id,sectie,admission")
+    parser.add_argument("--map", default="", help="JSON {code: [target, field]} merged into the LOINC map")
+    parser.add_argument("--window-hours", type=float, default=24.0)
+    parser.add_argument("--lateness-hours", type=float, default=24.0)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--out", default="-", help="NDJSON results (payload, scor, nivel)")
+    args = parser.parse_args(argv)
+
+    if args.map:
+        with open(args.map, encoding='utf-8') as fh:
+            LOINC_MAP.update({k: tuple(v) for k, v in json.load(fh).items()})
+    fmt = args.format
+    if fmt == "auto":
+        fmt = "csv" if args.input.removesuffix(".gz").endswith(".csv") else "fhir"
+    observations = read_lab_csv(args.input) if fmt == "csv" else read_fhir_ndjson(args.input)
+    census = read_census(args.census) if args.census else {}
+
+    rate = Throughput()
+    rejected: Dict[Tuple[str, str], int] = {}
+    payloads = assemble_payloads(observations, census, args.window_hours, args.lateness_hours, on_record=rate.tick,
+                                 rejected=rejected)
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    n = 0
+    try:
+        for res in score_payloads(payloads, workers=args.workers):
+            out.write(json.dumps({'payload': res['payload'], 'scor': res['scor'], 'nivel': res['nivel']}, ensure_ascii=False) + "\n")
+            n += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{rate.summary()} → {n} payload-uri evaluate", file=sys.stderr)
+    if rejected:
+        print(f"{sum(rejected.values())} observații respinse (unitate necunoscută; adăugați-o în UNIT_FACTORS):", file=sys.stderr)
+        for (field, unit), count in sorted(rejected.items(), key=lambda kv: -kv[1]):
+            print(f"  {field} [{unit or 'fără unitate'}]: {count}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Device-associated incidence density (CLABSI / VAP / CAUTI-style rates)
+
+Computes infections per 1000 device-days per ward (sectie), period and device, with Poisson
+95% confidence intervals, from the evaluation payloads kept in the snapshot store.
+
+Method (vectorised over all evaluations):
+  - a device episode is identified by (pacient, dispozitiv, insertion day), where the insertion
+    day is the evaluation date minus the recorded `zile`; it runs until the last evaluation that
+    still reports the device; its days are split across the calendar periods it overlaps;
+  - a device-associated infection is the first evaluation of an episode with a positive culture,
+    a matching `tip_infectie` and the device in place for at least 2 days.
+
+Run:
+    python epimind_incidence.py --freq M --out incidenta.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from epimind_cohort import CohortStore
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+
+# Same device list as dashboard_iaam.DEVICES (not imported: that module starts the Streamlit page).
+DEVICES = ['CVC', 'Ventilatie', 'Sonda urinara', 'Traheostomie', 'Drenaj', 'PEG']
+# Device -> (indicator, infection types from ICD_CODES counted as associated with it)
+DEVICE_INFECTIONS = {
+    'CVC': ('CLABSI', ('Infecție CVC', 'Bacteriemie/Septicemie')),
+    'Ventilatie': ('VAP', ('Pneumonie nosocomială',)),
+    'Traheostomie': ('VAP-traheostomie', ('Pneumonie nosocomială',)),
+    'Sonda urinara': ('CAUTI', ('ITU nosocomială',)),
+}
+MIN_DEVICE_DAYS = 2
+FLAT_CACHE = "evaluations_flat.pkl"
+
+
+# ---------------- Flat evaluation frame ----------------
+
+def flatten_payload(row: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+    flat = {
+        'eval_id': row['id'], 'timestamp': row['timestamp'], 'pacient': row['pacient'], 'sectie': row['sectie'],
+        'tip_infectie': payload.get('tip_infectie') or '', 'cultura_pozitiva': bool(payload.get('cultura_pozitiva')),
+    }
+    disp = payload.get('dispozitive') or {}
+    for d in DEVICES:
+        info = disp.get(d) or {}
+        flat[f'{d}_prezent'] = bool(info.get('prezent'))
+        flat[f'{d}_zile'] = int(info.get('zile', 0) or 0)
+    return flat
+
+
+def frame_from_cohort(cohort: CohortStore) -> pd.DataFrame:
+    """The evaluation frame read from the memory-mapped cohort: categoricals stay dictionary codes, no payload decoding."""
+    def coded(name: str) -> pd.Categorical:
+        return pd.Categorical.from_codes(cohort.column(name), categories=cohort.values(name))
+
+    prezent, zile = cohort.column('disp_prezent'), cohort.column('disp_zile')
+    data: Dict[str, Any] = {
+        'eval_id': cohort.column('eval_id'), 'timestamp': cohort.column('timestamp').astype('datetime64[us]'),
+        'pacient': coded('pacient'), 'sectie': coded('sectie'), 'tip_infectie': coded('tip_infectie'),
+        'cultura_pozitiva': cohort.column('cultura_pozitiva'),
+    }
+    for j, d in enumerate(DEVICES):
+        data[f'{d}_prezent'] = prezent[:, j]
+        data[f'{d}_zile'] = zile[:, j]
+    return pd.DataFrame(data)
+
+
+def load_evaluation_frame(store: SnapshotStore, cache: bool = True, cohort: Optional[CohortStore] = None) -> pd.DataFrame:
+    """One row per evaluation with device columns; decoded incrementally into a local cache.
+
+    With a non-empty cohort in step with the store's retention, its columns replace the cache and only newer
+    evaluations are decoded.
+    """
+    if cohort is not None and cohort.rows and cohort.retention_generation == store.retention_generation():
+        new = pd.DataFrame([flatten_payload(row, payload) for row, payload in store.iter_payloads(cohort.last_eval_id)])
+        frame = frame_from_cohort(cohort)
+        if new.empty:
+            return frame
+        new['timestamp'] = pd.to_datetime(new['timestamp'], format='ISO8601')
+        return pd.concat([frame, new], ignore_index=True)
+    cache_path = store.root / FLAT_CACHE
+    frame = pd.read_pickle(cache_path) if cache and cache_path.exists() else pd.DataFrame()
+    generation = store.retention_generation()
+    pruned = not frame.empty and frame.attrs.get('retention_generation', 0) != generation
+    if pruned:  # evaluations removed by the store's retention since the cache was written
+        frame = frame[frame['eval_id'].isin(store.eval_ids())].reset_index(drop=True)
+    after = int(frame['eval_id'].max()) if not frame.empty else 0
+    new = [flatten_payload(row, payload) for row, payload in store.iter_payloads(after)]
+    if new:
+        frame = pd.concat([frame, pd.DataFrame(new)], ignore_index=True)
+    if cache and (new or pruned):
+        frame.attrs['retention_generation'] = generation
+        frame.to_pickle(cache_path)
+    return frame
+
+
+# ---------------- Vectorised rates ----------------
+
+def poisson_ci(events: np.ndarray, exposure: np.ndarray, per: float = 1000.0, z: float = 1.959964):
+    """Byar's approximation of the exact Poisson interval for events / exposure * per."""
+    x = events.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lo = np.where(x > 0, x * (1 - 1 / (9 * np.maximum(x, 1)) - z / (3 * np.sqrt(np.maximum(x, 1)))) ** 3, 0.0)
+        x1 = x + 1
+        hi = x1 * (1 - 1 / (9 * x1) + z / (3 * np.sqrt(x1))) ** 3
+        scale = np.where(exposure > 0, per / exposure, np.nan)
+    return lo * scale, hi * scale
+
+
+def _episodes(frame: pd.DataFrame, device: str, infection_codes: Sequence[int]) -> pd.DataFrame:
+    cols = ['_pacient', '_sectie', '_tip', '_day', 'cultura_pozitiva', f'{device}_zile']
+    present = frame.loc[frame[f'{device}_prezent'].to_numpy(), cols]
+    if present.empty:
+        return pd.DataFrame()
+    day = present['_day'].to_numpy()
+    zile = present[f'{device}_zile'].to_numpy().astype('int64')
+    ep = pd.DataFrame({
+        'pacient': present['_pacient'].to_numpy(),
+        'sectie': present['_sectie'].to_numpy(),
+        'start': day - zile,
+        'day': day,
+        'zile': zile,
+        'infectie': present['cultura_pozitiva'].to_numpy()
+        & np.isin(present['_tip'].to_numpy(), infection_codes)
+        & (zile >= MIN_DEVICE_DAYS),
+    })
+    inf_day = np.where(ep['infectie'].to_numpy(), day, np.iinfo('int64').max)
+    ep['inf_day'] = inf_day
+    g = ep.groupby(['pacient', 'start'], sort=False)
+    return pd.DataFrame({
+        'sectie': g['sectie'].last(),
+        'start': g['start'].first(),
+        'end': g['day'].max(),
+        'inf_day': g['inf_day'].min(),
+    }).reset_index(drop=True)
+
+
+def incidence_density(frame: pd.DataFrame, freq: str = 'M', devices: Sequence[str] = tuple(DEVICE_INFECTIONS)) -> pd.DataFrame:
+    """Device-associated infections per 1000 device-days per (sectie, perioada, dispozitiv)."""
+    cols = ['sectie', 'perioada', 'dispozitiv', 'indicator', 'evenimente', 'zile_dispozitiv', 'densitate_1000', 'ci95_inf', 'ci95_sup']
+    if frame.empty:
+        return pd.DataFrame(columns=cols)
+    # Group on integer codes: string keys dominate the cost of the group-bys otherwise.
+    frame = frame.assign(
+        _pacient=pd.factorize(frame['pacient'])[0],
+        _sectie=(sectie_codes := pd.factorize(frame['sectie']))[0],
+        _tip=(tip_codes := pd.factorize(frame['tip_infectie']))[0],
+    )
+    sectii = np.asarray(sectie_codes[1], dtype=object)
+    tip_index = {t: i for i, t in enumerate(tip_codes[1])}
+    epoch = pd.Timestamp('1970-01-01')
+    frame['_day'] = ((pd.to_datetime(frame['timestamp'], format='ISO8601') - epoch) // pd.Timedelta(days=1)).astype('int64')
+    period_alias = {'M': 'M', 'W': 'W', 'Q': 'Q', 'Y': 'Y'}[freq]
+    out: List[pd.DataFrame] = []
+    for device in devices:
+        codes = [tip_index[t] for t in DEVICE_INFECTIONS.get(device, ('', ()))[1] if t in tip_index]
+        ep = _episodes(frame, device, codes)
+        if ep.empty:
+            continue
+        # Expand each episode over the periods it overlaps and clip its days to each period.
+        start_p = (epoch + pd.to_timedelta(ep['start'], unit='D')).dt.to_period(period_alias)
+        end_p = (epoch + pd.to_timedelta(ep['end'], unit='D')).dt.to_period(period_alias)
+        span = (end_p.astype('int64') - start_p.astype('int64')).to_numpy() + 1
+        idx = np.repeat(np.arange(len(ep)), span)
+        offs = np.arange(len(idx)) - np.repeat(np.cumsum(span) - span, span)
+        p_ord = start_p.astype('int64').to_numpy()[idx] + offs
+        periods = pd.PeriodIndex.from_ordinals(p_ord, freq=start_p.dt.freq)
+        p_first = ((periods.start_time - epoch) // pd.Timedelta(days=1)).to_numpy()
+        p_last = ((periods.end_time.floor('D') - epoch) // pd.Timedelta(days=1)).to_numpy()
+        s = ep['start'].to_numpy()[idx]
+        e = ep['end'].to_numpy()[idx]
+        days = np.minimum(e, p_last) - np.maximum(s, p_first) + 1
+        inf = ep['inf_day'].to_numpy()[idx]
+        ev = (inf >= p_first) & (inf <= p_last)
+        exp = pd.DataFrame({'s': ep['sectie'].to_numpy()[idx], 'p': p_ord, 'zile_dispozitiv': days, 'evenimente': ev.astype('int64')})
+        agg = exp.groupby(['s', 'p'], sort=True, as_index=False)[['evenimente', 'zile_dispozitiv']].sum()
+        agg.insert(0, 'sectie', sectii[agg.pop('s').to_numpy()])
+        agg.insert(1, 'perioada', pd.PeriodIndex.from_ordinals(agg.pop('p').to_numpy(), freq=start_p.dt.freq).astype(str))
+        agg.insert(2, 'dispozitiv', device)
+        agg.insert(3, 'indicator', DEVICE_INFECTIONS.get(device, (device,))[0])
+        out.append(agg)
+    if not out:
+        return pd.DataFrame(columns=cols)
+    res = pd.concat(out, ignore_index=True)
+    ev = res['evenimente'].to_numpy()
+    dd = res['zile_dispozitiv'].to_numpy().astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        res['densitate_1000'] = np.where(dd > 0, ev / dd * 1000.0, np.nan)
+    res['ci95_inf'], res['ci95_sup'] = poisson_ci(ev, dd)
+    return res[cols]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind device-associated incidence density")
+    parser.add_argument("--root", default=str(SNAPSHOT_DIR), help="snapshot store directory")
+    parser.add_argument("--freq", choices=["W", "M", "Q", "Y"], default="M")
+    parser.add_argument("--sectie", default="")
+    parser.add_argument("--out", default="", help="CSV output (default: print)")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    root = Path(args.root)
+    frame = load_evaluation_frame(SnapshotStore(root), cohort=CohortStore.open(root / "cohort"))
+    if args.sectie:
+        frame = frame[frame['sectie'] == args.sectie]
+    t1 = time.perf_counter()
+    rates = incidence_density(frame, args.freq)
+    t2 = time.perf_counter()
+    if args.out:
+        rates.to_csv(args.out, index=False)
+    else:
+        print(rates.to_string(index=False))
+    print(f"{len(frame)} evaluări: încărcare {t1 - t0:.2f}s, calcul {t2 - t1:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
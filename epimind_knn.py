@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Similar-patient nearest-neighbour index over historical evaluations
+
+Each payload is encoded as the vector of score contributions `calculate_iaam_risk` uses
+(temporal, each device, culture, resistance, SOFA components, qSOFA, APACHE-like, urine,
+comorbidities, labs), so distances are measured in score points. Search is vectorised brute
+force over float32 blocks; for very large stores an optional partitioned (IVF-style) index
+probes only the lists whose centroids are nearest to the query. The index grows incrementally
+as evaluations arrive and catches up with the snapshot store on load.
+
+Build / refresh the persisted index and time a query:
+    python epimind_knn.py build
+    python epimind_knn.py bench --rows 1000000 --partitions 1024
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+
+KNN_DIR = SNAPSHOT_DIR / "knn"
+DEVICES = ['CVC', 'Ventilatie', 'Sonda urinara', 'Traheostomie', 'Drenaj', 'PEG']
+SOFA_COMPONENTS = ['Respirator', 'Coagulare', 'Hepatic', 'Cardiovascular', 'SNC', 'Renal']
+FEATURES = (
+    ['temporal'] + [f'disp_{d}' for d in DEVICES] + ['cultura', 'rezistenta']
+    + [f'sofa_{c}' for c in SOFA_COMPONENTS] + ['qsofa', 'apache', 'urina', 'comorbiditati', 'laborator']
+)
+BLOCK = 1 << 16
+# engine functions `encode_payload` takes the component points from
+ENGINE_COMPONENTS = ('current_rules', 'temporal_points', 'device_points', 'calculate_sofa_detailed', 'calculate_qsofa',
+                     'calculate_apache_like', 'analyze_urinary_sediment', 'calculate_charlson_like', 'score_laboratory_markers')
+
+
+def can_encode(engine: Any) -> bool:
+    """Whether an engine module exposes the per-component points `encode_payload` needs (older releases do not)."""
+    return all(hasattr(engine, f) for f in ENGINE_COMPONENTS)
+
+
+def encode_payload(payload: Dict[str, Any], engine: Any, rules: Any = None) -> np.ndarray:
+    """Score-contribution vector of one payload, from the engine's own component points; `engine` is the app
+    module (dashboard_iaam), `rules` its rule set (current unless given)."""
+    v = np.zeros(len(FEATURES), dtype=np.float32)
+    rules = rules or engine.current_rules()
+    v[0] = engine.temporal_points(payload.get("ore_spitalizare", 0) or 0)
+    disp = payload.get("dispozitive") or {}
+    for i, d in enumerate(DEVICES, start=1):
+        info = disp.get(d) or {}
+        if info.get("prezent"):
+            v[i] = engine.device_points(d, info.get("zile", 0) or 0, rules)
+    j = 1 + len(DEVICES)
+    if payload.get("cultura_pozitiva"):
+        v[j] = 15
+        v[j + 1] = sum(rules.rez_weight(r) for r in (payload.get("profil_rezistenta") or []))
+    j += 2
+    _, comp = engine.calculate_sofa_detailed(payload)
+    for i, c in enumerate(SOFA_COMPONENTS):
+        v[j + i] = 3 * comp.get(c, 0)
+    j += len(SOFA_COMPONENTS)
+    v[j] = 15 if engine.calculate_qsofa(payload) >= 2 else 0
+    v[j + 1] = int(engine.calculate_apache_like(payload) / 2)
+    if payload.get("analiza_urina"):
+        v[j + 2] = 10 if engine.analyze_urinary_sediment(payload.get('sediment', {}))[1] > 50 else 0
+    v[j + 3] = engine.calculate_charlson_like(payload.get("comorbiditati", {}), rules)
+    v[j + 4] = engine.score_laboratory_markers(payload.get('analize', {}), rules)[0]
+    return v
+
+
+class KnnIndex:
+    """Append-only vector index with per-row metadata (evaluation id, patient, score, level, time)."""
+
+    def __init__(self, dim: int = len(FEATURES), capacity: int = 1024):
+        self.dim = dim
+        self.n = 0
+        self._vecs = np.zeros((capacity, dim), dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._eval_ids = np.zeros(capacity, dtype=np.int64)
+        self._scores = np.zeros(capacity, dtype=np.int32)
+        self._pcodes = np.zeros(capacity, dtype=np.int32)
+        self._pcode_of: Dict[str, int] = {}
+        self.pacienti: Sequence[str] = []
+        self.niveluri: Sequence[str] = []
+        self.timestamps: Sequence[str] = []
+        # rows [0, _nbase) live in read-only columns mapped from the cohort store; the arrays above hold the rest
+        self._base: Dict[str, np.ndarray] = {}
+        self._nbase = 0
+        self.last_eval_id = 0
+        self.rules_digest = ''  # rule set the vectors were encoded with
+        self.retention_generation = 0  # snapshot-store retention the rows are in step with
+        # optional partitioned index
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._list_tail: List[List[int]] = []
+        self.nprobe = 8
+        self._sync_lock = threading.Lock()
+
+    # ---- growth ----
+
+    def _reserve(self, extra: int) -> None:
+        used = self.n - self._nbase
+        need = used + extra
+        if need <= len(self._vecs):
+            return
+        cap = max(need, 2 * len(self._vecs))
+        for name in ('_vecs', '_norms', '_eval_ids', '_scores', '_pcodes'):
+            old = getattr(self, name)
+            new = np.zeros((cap,) + old.shape[1:], dtype=old.dtype)
+            new[:used] = old[:used]
+            setattr(self, name, new)
+
+    def _slice(self, name: str, start: int, stop: int) -> np.ndarray:
+        """Rows [start, stop) of a column, across the mapped base and the in-memory rows."""
+        nb, own = self._nbase, getattr(self, name)
+        if stop <= nb:
+            return self._base[name][start:stop]
+        if start >= nb:
+            return own[start - nb:stop - nb]
+        return np.concatenate([self._base[name][start:], own[:stop - nb]])
+
+    def _take(self, name: str, idx: np.ndarray) -> np.ndarray:
+        """Rows `idx` of a column, across the mapped base and the in-memory rows."""
+        nb, own = self._nbase, getattr(self, name)
+        if not nb:
+            return own[idx]
+        in_base = idx < nb
+        out = np.empty((len(idx),) + own.shape[1:], dtype=own.dtype)
+        out[in_base] = self._base[name][idx[in_base]]
+        out[~in_base] = own[idx[~in_base] - nb]
+        return out
+
+    def add(self, vecs: np.ndarray, eval_ids: Sequence[int], pacienti: Sequence[str], scores: Sequence[int],
+            niveluri: Sequence[str], timestamps: Sequence[str]) -> None:
+        vecs = np.atleast_2d(np.asarray(vecs, dtype=np.float32))
+        m = len(vecs)
+        if m == 0:
+            return
+        self._reserve(m)
+        lo, hi = self.n, self.n + m
+        a, b = lo - self._nbase, hi - self._nbase
+        self._vecs[a:b] = vecs
+        self._norms[a:b] = np.einsum('ij,ij->i', vecs, vecs)
+        self._eval_ids[a:b] = eval_ids
+        self._scores[a:b] = scores
+        codes = self._pcode_of
+        self._pcodes[a:b] = [codes.setdefault(p, len(codes)) for p in pacienti]
+        self.pacienti.extend(pacienti)
+        self.niveluri.extend(niveluri)
+        self.timestamps.extend(timestamps)
+        self.n = hi
+        self.last_eval_id = max(self.last_eval_id, int(max(eval_ids)))
+        if self.centroids is not None:
+            assign = self._nearest_centroids(vecs, 1)[:, 0]
+            for row, c in zip(range(lo, hi), assign):
+                self._list_tail[c].append(row)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._slice('_vecs', 0, self.n)
+
+    # ---- search ----
+
+    def _topk_rows(self, q: np.ndarray, rows: Optional[np.ndarray], k: int, exclude: int) -> Tuple[np.ndarray, np.ndarray]:
+        qn = float(q @ q)
+        best_d = np.empty(0, dtype=np.float32)
+        best_i = np.empty(0, dtype=np.int64)
+        total = self.n if rows is None else len(rows)
+        for start in range(0, total, BLOCK):
+            if rows is None:
+                stop = min(start + BLOCK, total)
+                idx = np.arange(start, stop)
+                block, norms, pcodes = (self._slice(c, start, stop) for c in ('_vecs', '_norms', '_pcodes'))
+            else:
+                idx = rows[start:start + BLOCK]
+                block, norms, pcodes = (self._take(c, idx) for c in ('_vecs', '_norms', '_pcodes'))
+            d = norms - 2.0 * (block @ q) + qn
+            if exclude >= 0:
+                d[pcodes == exclude] = np.inf
+            if len(d) > k:
+                part = np.argpartition(d, k)[:k]
+                d, idx = d[part], idx[part]
+            best_d = np.concatenate([best_d, d])
+            best_i = np.concatenate([best_i, idx])
+            if len(best_d) > k:
+                part = np.argpartition(best_d, k)[:k]
+                best_d, best_i = best_d[part], best_i[part]
+        order = np.argsort(best_d, kind='stable')
+        best_d, best_i = best_d[order], best_i[order]
+        keep = np.isfinite(best_d)
+        return np.sqrt(np.maximum(best_d[keep], 0)), best_i[keep]
+
+    def search(self, q: np.ndarray, k: int = 5, exclude_pacient: Optional[str] = None,
+               rules_digest: Optional[str] = None) -> List[Dict[str, Any]]:
+        """k nearest historical evaluations (optionally excluding one patient's own evaluations).
+
+        With `rules_digest`, refuses an index encoded under other rules: its distances would mix scorings.
+        """
+        if rules_digest is not None and self.n and self.rules_digest != rules_digest:
+            raise ValueError(f"indexul a fost codificat cu reguli {self.rules_digest[:12]}, nu {rules_digest[:12]}; resincronizați")
+        if self.n == 0:
+            return []
+        q = np.asarray(q, dtype=np.float32)
+        exclude = self._pcode_of.get(exclude_pacient, -1) if exclude_pacient is not None else -1
+        rows = None
+        if self.centroids is not None:
+            probe = self._nearest_centroids(q[None, :], self.nprobe)[0]
+            rows = np.concatenate([self._lists[c] for c in probe] + [np.asarray(self._list_tail[c], dtype=np.int64) for c in probe])
+        dist, idx = self._topk_rows(q, rows, k, exclude)
+        eval_ids, scores = self._take('_eval_ids', idx), self._take('_scores', idx)
+        return [
+            {'eval_id': int(e), 'pacient': self.pacienti[i], 'scor': int(sc),
+             'nivel': self.niveluri[i], 'timestamp': self.timestamps[i], 'distanta': round(float(d), 2)}
+            for d, i, e, sc in zip(dist, idx, eval_ids, scores)
+        ]
+
+    # ---- optional partitioned index ----
+
+    def _nearest_centroids(self, x: np.ndarray, m: int) -> np.ndarray:
+        c = self.centroids
+        cn = np.einsum('ij,ij->i', c, c)[None, :]
+        m = min(m, len(c))
+        out = []
+        step = max(1, (1 << 22) // len(c))  # bound the distance matrix to ~16 MB per step
+        for s in range(0, len(x), step):
+            d = cn - 2.0 * (x[s:s + step] @ c.T)
+            if m == 1:
+                out.append(d.argmin(axis=1)[:, None])
+            else:  # copy: a slice would keep the whole distance matrix alive
+                out.append(np.argpartition(d, m - 1, axis=1)[:, :m].copy() if m < len(c) else np.argsort(d, axis=1))
+        return np.concatenate(out) if out else np.empty((0, m), dtype=np.int64)
+
+    def partition(self, nlist: int, nprobe: int = 8, iters: int = 8, sample: int = 100_000, seed: int = 0) -> None:
+        """Build an IVF-style partition with k-means centroids; search then probes `nprobe` lists."""
+        rng = np.random.default_rng(seed)
+        x = self.vectors
+        nlist = max(1, min(nlist, self.n))
+        pick = x[rng.choice(self.n, size=min(sample, self.n), replace=False)]
+        cent = pick[rng.choice(len(pick), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            self.centroids = cent
+            assign = self._nearest_centroids(pick, 1)[:, 0]
+            counts = np.bincount(assign, minlength=nlist)
+            sums = np.stack([np.bincount(assign, weights=pick[:, j], minlength=nlist) for j in range(self.dim)], axis=1)
+            nonempty = counts > 0
+            cent[nonempty] = sums[nonempty] / counts[nonempty, None]
+        self.centroids = cent
+        assign = self._nearest_centroids(x, 1)[:, 0]
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]].astype(np.int64) for c in range(nlist)]
+        self._list_tail = [[] for _ in range(nlist)]
+        self.nprobe = nprobe
+
+    # ---- persistence & catch-up ----
+
+    def save(self, directory: Path = KNN_DIR) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.savez(directory / "index.npz", vecs=self.vectors, eval_ids=self._slice('_eval_ids', 0, self.n), scores=self._slice('_scores', 0, self.n),
+                 pacienti=np.asarray(self.pacienti, dtype=str), niveluri=np.asarray(self.niveluri, dtype=str),
+                 timestamps=np.asarray(self.timestamps, dtype=str), last_eval_id=np.int64(self.last_eval_id),
+                 rules_digest=np.asarray(self.rules_digest), retention_generation=np.int64(self.retention_generation))
+
+    @classmethod
+    def load(cls, directory: Path = KNN_DIR, rules_digest: Optional[str] = None,
+             store: Optional[SnapshotStore] = None) -> "KnnIndex":
+        """Persisted index, or an empty one when it was encoded under rules other than `rules_digest`.
+
+        With `store`, evaluations its retention removed since the index was saved are dropped.
+        """
+        path = Path(directory) / "index.npz"
+        index = cls()
+        if not path.exists():
+            return index
+        with np.load(path) as z:
+            saved = str(z['rules_digest']) if 'rules_digest' in z.files else ''
+            if rules_digest is not None and saved != rules_digest:
+                return index
+            index.rules_digest = saved
+            keep = slice(None)
+            index.retention_generation = int(z['retention_generation']) if 'retention_generation' in z.files else 0
+            if store is not None and index.retention_generation != store.retention_generation():
+                keep = np.isin(z['eval_ids'], store.eval_ids())
+                index.retention_generation = store.retention_generation()
+            index.add(z['vecs'][keep], z['eval_ids'][keep], z['pacienti'][keep].tolist(), z['scores'][keep],
+                      z['niveluri'][keep].tolist(), z['timestamps'][keep].tolist())
+            index.last_eval_id = int(z['last_eval_id'])
+        return index
+
+    @classmethod
+    def from_cohort(cls, cohort) -> "KnnIndex":
+        """Index over a memory-mapped CohortStore, used in place: the columns stay shared through the page
+        cache across processes; evaluations added afterwards are kept in memory on top of them."""
+        index = cls()
+        if cohort.rows == 0:
+            return index
+        index._base = {'_vecs': cohort.column('features'), '_norms': cohort.column('norms'),
+                       '_eval_ids': cohort.column('eval_id'), '_scores': cohort.column('scor'),
+                       '_pcodes': cohort.column('pacient')}
+        index._nbase = index.n = cohort.rows
+        index._pcode_of = {p: i for i, p in enumerate(cohort.values('pacient'))}
+        index.pacienti, index.niveluri, index.timestamps = cohort.view('pacient'), cohort.view('nivel'), cohort.view('timestamp')
+        index.last_eval_id = cohort.last_eval_id
+        index.rules_digest = cohort.rules_digest
+        index.retention_generation = cohort.retention_generation
+        return index
+
+    def sync(self, store: SnapshotStore, engine: Any, batch: int = 4096) -> int:
+        """Add every evaluation of the snapshot store newer than the last indexed one.
+
+        After a rules reload the index is re-encoded from the whole store under the new rules and swapped in.
+        """
+        added = 0
+        buf: List[Tuple[Dict[str, Any], np.ndarray]] = []
+        with self._sync_lock:
+            rules = engine.current_rules()
+            if self.n and self.rules_digest != rules.digest:
+                fresh = type(self)(self.dim)
+                added = fresh.sync(store, engine, batch)
+                fresh.__dict__.pop('_sync_lock')
+                self.__dict__.update(fresh.__dict__)
+                return added
+            self.rules_digest = rules.digest
+            if not self.n:
+                self.retention_generation = store.retention_generation()
+            for row, payload in store.iter_payloads(self.last_eval_id):
+                buf.append((row, encode_payload(payload, engine, rules)))
+                if len(buf) >= batch:
+                    added += self._add_rows(buf); buf = []
+            added += self._add_rows(buf)
+        return added
+
+    def _add_rows(self, buf: List[Tuple[Dict[str, Any], np.ndarray]]) -> int:
+        if buf:
+            self.add(np.stack([v for _, v in buf]), [r['id'] for r, _ in buf], [r['pacient'] or '' for r, _ in buf],
+                     [r['scor'] or 0 for r, _ in buf], [r['nivel'] or '' for r, _ in buf], [r['timestamp'] for r, _ in buf])
+        return len(buf)
+
+
+def evolution(store: SnapshotStore, pacient: str, since: str) -> Dict[str, Any]:
+    """How a neighbour evolved after the matched evaluation: last and worst later score."""
+    later = store.history(pacient, since=since, limit=1000)
+    if not later:
+        return {'evaluari_ulterioare': 0}
+    scores = [r['scor'] or 0 for r in later]
+    worst = later[int(np.argmax(scores))]
+    return {'evaluari_ulterioare': len(later) - 1, 'scor_final': later[0]['scor'], 'nivel_final': later[0]['nivel'],
+            'scor_maxim': worst['scor'], 'nivel_maxim': worst['nivel']}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind similar-patient index")
+    parser.add_argument("--root", default=str(SNAPSHOT_DIR))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build", help="catch the persisted index up with the snapshot store")
+    b = sub.add_parser("bench", help="time top-k queries on random vectors")
+    b.add_argument("--rows", type=int, default=1_000_000)
+    b.add_argument("--partitions", type=int, default=0)
+    b.add_argument("--k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        from epimind_batch import load_engine
+        root = Path(args.root)
+        engine = load_engine()
+        store = SnapshotStore(root)
+        index = KnnIndex.load(root / "knn", engine.current_rules().digest, store)
+        t0 = time.perf_counter()
+        added = index.sync(store, engine)
+        index.save(root / "knn")
+        print(f"{added} evaluări adăugate, {index.n} în index ({time.perf_counter() - t0:.1f}s)")
+    else:
+        rng = np.random.default_rng(0)
+        index = KnnIndex(capacity=args.rows)
+        vecs = rng.integers(0, 30, size=(args.rows, len(FEATURES))).astype(np.float32)
+        index.add(vecs, np.arange(1, args.rows + 1), ['P'] * args.rows, np.zeros(args.rows, int), [''] * args.rows, [''] * args.rows)
+        if args.partitions:
+            t0 = time.perf_counter()
+            index.partition(args.partitions)
+            print(f"partiționare: {time.perf_counter() - t0:.1f}s")
+        times = []
+        for _ in range(20):
+            q = rng.integers(0, 30, size=len(FEATURES)).astype(np.float32)
+            t0 = time.perf_counter()
+            index.search(q, args.k)
+            times.append((time.perf_counter() - t0) * 1000)
+        print(f"{args.rows} rânduri: top-{args.k} median {np.median(times):.1f} ms, max {max(times):.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Concurrent-session load test for one app instance
+
+Drives N simulated clinicians through the app with Streamlit's headless AppTest, one thread per
+session in this process, which is how a single server instance runs its sessions (shared
+st.cache_resource objects, one GIL, one audit file). Each session repeats a realistic journey —
+patient entry, devices, severity, microbiology, labs, evaluate, then the results/history page
+and the ward list — and every widget change is one timed rerun, as in the browser.
+
+Reported: rerun latency p50/p95/p99 (overall and per step), throughput, process RSS and
+per-session state size, and audit-write contention (append_audit timings from epimind_metrics,
+plus a check that every evaluation landed exactly once, untorn, in the audit and the snapshot
+index). Everything runs in a scratch working directory, so the local audit is never touched.
+Each session has its own session id and mock runtime; st.cache_data storage, st.cache_resource and
+the compiled script are shared between sessions as in production.
+
+    python epimind_loadtest.py --sessions 8 --journeys 5 --out load.json
+    python epimind_loadtest.py --sessions 8 --journeys 5 --baseline load.json --max-regression 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+APP = Path(__file__).with_name('dashboard_iaam.py')
+SECTII = ['ATI', 'Chirurgie', 'Medicină Internă', 'Pediatrie', 'Neonatologie']
+DEVICES = ['CVC', 'Ventilatie', 'Sonda urinara', 'Traheostomie', 'Drenaj', 'PEG']
+AGENTS = {
+    'Klebsiella pneumoniae': ['ESBL', 'KPC', 'OXA-48'],
+    'Escherichia coli': ['ESBL', 'CRE'],
+    'Pseudomonas aeruginosa': ['MDR', 'XDR'],
+    'Staphylococcus aureus': ['MRSA'],
+}
+TIMEOUT = 120.0
+
+Step = Tuple[str, Callable[[Any], Any]]
+
+
+def _nav(page: str) -> Step:
+    return f'nav:{page}', lambda at: at.button(key=f'nav_{page}{page}').click().run(timeout=TIMEOUT)
+
+
+def journey(rng: random.Random, pacient: str) -> List[Step]:
+    """Widget interactions of one patient evaluation, in the order a clinician clicks through them."""
+    steps: List[Step] = [
+        _nav('patient'),
+        ('pacient', lambda at: at.text_input(key='nume_pacient').input(pacient).run(timeout=TIMEOUT)),
+        ('pacient', lambda at: at.selectbox(key='sectie').select(rng.choice(SECTII)).run(timeout=TIMEOUT)),
+        ('pacient', lambda at: at.number_input(key='ore_spitalizare').set_value(rng.choice([24, 60, 96, 200, 400])).run(timeout=TIMEOUT)),
+        _nav('devices'),
+    ]
+    for d in rng.sample(DEVICES, rng.randint(1, 3)):
+        steps.append(('dispozitive', lambda at, d=d: at.checkbox(key=f'disp_{d}').check().run(timeout=TIMEOUT)))
+        steps.append(('dispozitive', lambda at, d=d: at.number_input(key=f'zile_{d}').set_value(rng.randint(1, 14)).run(timeout=TIMEOUT)))
+    steps += [
+        _nav('severity'),
+        ('severitate', lambda at: at.number_input(key='pao2_fio2').set_value(rng.choice([400, 280, 180, 90])).run(timeout=TIMEOUT)),
+        ('severitate', lambda at: at.number_input(key='trombocite').set_value(rng.choice([250, 140, 70, 15])).run(timeout=TIMEOUT)),
+        ('severitate', lambda at: at.number_input(key='glasgow').set_value(rng.choice([15, 13, 9])).run(timeout=TIMEOUT)),
+        _nav('microbio'),
+    ]
+    if rng.random() < 0.4:
+        agent = rng.choice(sorted(AGENTS))
+        rez = rng.sample(AGENTS[agent], rng.randint(0, 1))
+        steps += [
+            ('microbiologie', lambda at: at.checkbox(key='cultura_pozitiva').check().run(timeout=TIMEOUT)),
+            ('microbiologie', lambda at: at.selectbox(key='bacterie').select(agent).run(timeout=TIMEOUT)),
+            ('microbiologie', lambda at: at.multiselect(key='profil_rezistenta').set_value(rez).run(timeout=TIMEOUT)),
+        ]
+    steps += [
+        _nav('analize'),
+        ('laborator', lambda at: at.number_input(key='lab_crp').set_value(rng.choice([5.0, 60.0, 150.0])).run(timeout=TIMEOUT)),
+        ('laborator', lambda at: at.number_input(key='lab_pct').set_value(rng.choice([0.1, 0.8, 3.0])).run(timeout=TIMEOUT)),
+        ('laborator', lambda at: at.number_input(key='lab_lactate').set_value(rng.choice([1.0, 2.5, 5.0])).run(timeout=TIMEOUT)),
+        ('evaluare', lambda at: at.button(key='compute_main').click().run(timeout=TIMEOUT)),
+        _nav('results'),
+        _nav('worklist'),
+    ]
+    return steps
+
+
+class _Recorder:
+    """Rerun timings and errors of every session, plus a process RSS sampler."""
+
+    def __init__(self):
+        self.samples: List[Tuple[str, float]] = []
+        self.errors: List[str] = []
+        self.evaluations = 0
+        self.rss: List[int] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def record(self, step: str, seconds: float, error: Optional[str]) -> None:
+        with self._lock:
+            self.samples.append((step, seconds))
+            if error:
+                self.errors.append(f'{step}: {error}')
+            elif step == 'evaluare':
+                self.evaluations += 1
+
+    def sample_rss(self, interval: float = 0.2) -> None:
+        while not self._stop.wait(interval):
+            self.rss.append(_rss_bytes())
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def _rss_bytes() -> int:
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+_SESSION = threading.local()  # id of the simulated session driving the current thread
+_RUNTIMES: Dict[str, Any] = {}  # session id -> that session's mock runtime
+
+
+def _session_id(idx: int) -> str:
+    return f'loadtest-{idx:03d}'
+
+
+def _share_runtime(sessions: int) -> None:
+    """Run concurrent AppTest sessions the way a server process runs its sessions.
+
+    AppTest is written for one run at a time: every rerun gives the script the same session id,
+    installs its own mock Runtime singleton and clears it when done (which pulls it from under the
+    other sessions' reruns), and builds a new ScriptCache, so each rerun re-parses the app (slow, and
+    not thread-safe on CPython 3.11). Sharing one mock runtime instead leaked state between sessions
+    (the session registry saw one session, and mocks are not thread-safe), failing reruns with
+    missing widget keys. Here every simulated session has its own id and its own mock runtime,
+    resolved from the running script's context; the managers a server shares between sessions
+    (media, cache storage, components) and a single ScriptCache are shared, as `streamlit run` does.
+    """
+    import streamlit.testing.v1.app_test as app_test
+    import streamlit.testing.v1.local_script_runner as local_script_runner
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    managers = {
+        'media_file_mgr': app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media")),
+        'dataframe_source_mgr': app_test.DataframeSourceManager(),
+        'cache_storage_manager': app_test.MemoryCacheStorageManager(),
+        'bidi_component_registry': app_test.BidiComponentManager(),
+    }
+
+    def runtime() -> Any:
+        mock = app_test.MagicMock(spec=Runtime)
+        for name, manager in managers.items():
+            setattr(mock, name, manager)
+        return mock
+
+    fallback = runtime()  # calls outside a script run (AppTest's own setup)
+
+    def instance(cls) -> Any:
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return _RUNTIMES.get(ctx.session_id, fallback) if ctx is not None else fallback
+
+    class SessionRunner(local_script_runner.LocalScriptRunner):
+        def __init__(self, *args: Any, **kwargs: Any):
+            super().__init__(*args, **kwargs)
+            self._session_id = getattr(_SESSION, 'id', self._session_id)
+
+    _RUNTIMES.clear()
+    _RUNTIMES.update({_session_id(i): runtime() for i in range(sessions)})
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: True)
+    app_test.LocalScriptRunner = SessionRunner
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+
+def _session(idx: int, journeys: int, think: float, seed: int, start: threading.Barrier, rec: _Recorder,
+             states: Dict[int, Any]) -> None:
+    from streamlit.testing.v1 import AppTest
+
+    _SESSION.id = _session_id(idx)
+    rng = random.Random(seed * 1000 + idx)
+    at = AppTest.from_file(str(APP), default_timeout=TIMEOUT)
+    start.wait()
+    steps: List[Step] = [('deschidere', lambda at: at.run(timeout=TIMEOUT))]
+    for j in range(journeys):
+        steps += journey(rng, f'LT{idx:03d}-{j:03d}')
+    for name, action in steps:
+        if think:
+            time.sleep(rng.expovariate(1.0 / think))
+        t0 = time.perf_counter()
+        error = None
+        try:
+            action(at)
+            if at.exception:
+                error = at.exception[0].message
+        except Exception as e:  # widget missing after a failed rerun, timeout, ...
+            error = f'{type(e).__name__}: {e}'
+        rec.record(name, time.perf_counter() - t0, error)
+    states[idx] = at.session_state
+
+
+def _percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not len(values):
+        return {'n': 0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000.0, [50, 95, 99])
+    return {'n': len(values), 'p50_ms': round(float(p50), 1), 'p95_ms': round(float(p95), 1),
+            'p99_ms': round(float(p99), 1), 'max_ms': round(1000.0 * max(values), 1)}
+
+
+def _audit_counts() -> Tuple[int, int, int]:
+    """(audit rows, torn audit rows with the wrong field count, evaluations in the snapshot index)."""
+    from epimind_snapshots import SnapshotStore
+
+    rows, torn = 0, 0
+    path = Path('epimind_audit.csv')
+    if path.exists():
+        with open(path, newline='', encoding='utf-8') as fh:
+            reader = csv.reader(fh)
+            width = len(next(reader, []))
+            for row in reader:
+                rows += 1
+                torn += len(row) != width
+    snapshots = SnapshotStore(Path('snapshots')).stats()['evaluari'] if Path('snapshots').exists() else 0
+    return rows, torn, snapshots
+
+
+def run(sessions: int, journeys: int, think: float = 0.0, seed: int = 0) -> Dict[str, Any]:
+    """Run the load test in the current working directory and return the report."""
+    import epimind_metrics as metrics
+    import epimind_session
+
+    metrics.ENABLED = True  # app functions decorated from now on are timed (append_audit, pages)
+    metrics.reset()
+    _share_runtime(sessions)
+    rec = _Recorder()
+    states: Dict[int, Any] = {}
+    rows_before, torn_before, snapshots_before = _audit_counts()
+    rss_start = _rss_bytes()
+    sampler = threading.Thread(target=rec.sample_rss, name='epimind-load-rss', daemon=True)
+    sampler.start()
+    start = threading.Barrier(sessions + 1)
+    threads = [threading.Thread(target=_session, args=(i, journeys, think, seed, start, rec, states), name=f'epimind-load-{i}')
+               for i in range(sessions)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    rec.stop()
+    rows, torn, snapshots = _audit_counts()
+
+    audit = metrics.histogram('io', 'append_audit')
+    _, audit_total, audit_n = audit.snapshot()
+    per_step: Dict[str, List[float]] = {}
+    for step, seconds in rec.samples:
+        per_step.setdefault(step, []).append(seconds)
+    state_bytes = [sum(size for _, size in epimind_session.key_footprint(s)) for s in states.values()]
+    return {
+        'sesiuni': sessions, 'parcursuri': sessions * journeys, 'durata_s': round(wall, 2), 'cpu': os.cpu_count(),
+        'rerun': _percentiles([s for _, s in rec.samples]),
+        'pasi': {step: _percentiles(v) for step, v in sorted(per_step.items())},
+        'debit': {'rerun_pe_s': round(len(rec.samples) / wall, 2), 'evaluari_pe_s': round(rec.evaluations / wall, 2)},
+        'erori': len(rec.errors), 'exemple_erori': rec.errors[:5],
+        'memorie': {
+            'rss_start_mib': round(rss_start / 2 ** 20, 1),
+            'rss_varf_mib': round(max(rec.rss + [_rss_bytes()]) / 2 ** 20, 1),
+            'rss_final_mib': round(_rss_bytes() / 2 ** 20, 1),
+            'stare_sesiune_kib': round(float(np.mean(state_bytes)) / 1024, 1) if state_bytes else 0.0,
+        },
+        'audit': {
+            'asteptate': rec.evaluations, 'randuri_audit': rows - rows_before, 'randuri_invalide': torn - torn_before,
+            'evaluari_snapshot': snapshots - snapshots_before,
+            'append_audit_n': audit_n,
+            'append_audit_mediu_ms': round(1000.0 * audit_total / audit_n, 2) if audit_n else 0.0,
+            'append_audit_p95_ms_max': 1000.0 * audit.quantile(0.95),
+            'append_audit_p99_ms_max': 1000.0 * audit.quantile(0.99),
+        },
+    }
+
+
+def format_report(r: Dict[str, Any]) -> str:
+    a, m, d = r['audit'], r['memorie'], r['rerun']
+    lines = [
+        f"Sesiuni: {r['sesiuni']} • parcursuri: {r['parcursuri']} • {r['durata_s']}s pe {r['cpu']} CPU • erori: {r['erori']}",
+        f"Latență rerun: p50 {d['p50_ms']} ms • p95 {d['p95_ms']} ms • p99 {d['p99_ms']} ms • max {d['max_ms']} ms (n={d['n']})",
+        f"Debit: {r['debit']['rerun_pe_s']} rerun/s • {r['debit']['evaluari_pe_s']} evaluări/s",
+        f"Memorie: RSS {m['rss_start_mib']} -> vârf {m['rss_varf_mib']} -> final {m['rss_final_mib']} MiB • stare/sesiune ~{m['stare_sesiune_kib']} KiB",
+        f"Audit: {a['randuri_audit']}/{a['asteptate']} rânduri, {a['randuri_invalide']} invalide, {a['evaluari_snapshot']} în indexul de snapshot-uri • "
+        f"append_audit mediu {a['append_audit_mediu_ms']} ms, p95 ≤ {a['append_audit_p95_ms_max']:g} ms, p99 ≤ {a['append_audit_p99_ms_max']:g} ms",
+        "",
+        f"{'pas':<16}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+    ]
+    for step, s in r['pasi'].items():
+        lines.append(f"{step:<16}{s['n']:>6}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    for e in r['exemple_erori']:
+        lines.append(f"eroare: {e}")
+    return "\n".join(lines)
+
+
+def regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Metrics worse than the baseline by more than `tolerance` (relative)."""
+    out = []
+    for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+        old, new = baseline['rerun'][key], report['rerun'][key]
+        if old and new > old * (1 + tolerance):
+            out.append(f"rerun {key}: {old} -> {new}")
+    old, new = baseline['debit']['rerun_pe_s'], report['debit']['rerun_pe_s']
+    if old and new < old * (1 - tolerance):
+        out.append(f"rerun/s: {old} -> {new}")
+    if report['erori'] > baseline['erori']:
+        out.append(f"erori: {baseline['erori']} -> {report['erori']}")
+    return out
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind concurrent-session load test")
+    parser.add_argument("--sessions", type=int, default=4, help="simultaneous simulated clinicians")
+    parser.add_argument("--journeys", type=int, default=3, help="patient evaluations per session")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between interactions (0 = stress)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default="", help="scratch directory for audit/snapshots (default: new temp dir)")
+    parser.add_argument("--out", default="", help="write the JSON report here")
+    parser.add_argument("--baseline", default="", help="JSON report of a previous run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="relative tolerance against --baseline")
+    args = parser.parse_args(argv)
+
+    out = Path(args.out).resolve() if args.out else None
+    baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8')) if args.baseline else None
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='epimind-load-'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)
+    sys.path.insert(0, str(APP.parent))
+    print(f"Director de lucru: {workdir}", file=sys.stderr)
+
+    report = run(args.sessions, args.journeys, args.think_ms / 1000.0, args.seed)
+    print(format_report(report))
+    if out:
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    failed = report['erori'] > 0 or report['audit']['randuri_audit'] != report['audit']['asteptate'] or report['audit']['randuri_invalide']
+    if baseline:
+        worse = regressions(report, baseline, args.max_regression)
+        for w in worse:
+            print(f"REGRESIE {w}", file=sys.stderr)
+        failed = failed or bool(worse)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
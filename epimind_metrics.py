@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Optional timing instrumentation
+
+Enabled with the environment variable EPIMIND_METRICS=1. Durations are aggregated into
+histograms (risk-engine stages, audit I/O, page renders) and exported in Prometheus text
+format to EPIMIND_METRICS_FILE (default: epimind_metrics.prom) every
+EPIMIND_METRICS_INTERVAL seconds, and on http://$EPIMIND_METRICS_HOST:$EPIMIND_METRICS_PORT/metrics
+when that port is set. The endpoint listens on 127.0.0.1 unless EPIMIND_METRICS_HOST names another
+interface (e.g. 0.0.0.0 for a scraper on another host).
+
+When disabled, `timed` returns the function unchanged and `stage_timer` returns a no-op, so
+the instrumented code pays at most one empty call per stage.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+ENABLED = os.environ.get("EPIMIND_METRICS", "").strip().lower() not in ("", "0", "false", "no")
+METRICS_FILE = os.environ.get("EPIMIND_METRICS_FILE", "epimind_metrics.prom")
+METRICS_INTERVAL = float(os.environ.get("EPIMIND_METRICS_INTERVAL", "15"))
+METRICS_PORT = os.environ.get("EPIMIND_METRICS_PORT", "")
+METRICS_HOST = os.environ.get("EPIMIND_METRICS_HOST", "127.0.0.1")
+
+METRIC_NAME = "epimind_duration_seconds"
+# Upper bounds in seconds: 50µs … 10s.
+BUCKETS: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (non-cumulative counts, cumulated on export)."""
+
+    __slots__ = ("counts", "total", "count", "_lock")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        i = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += seconds
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound containing quantile q (coarse, for reports)."""
+        counts, _, n = self.snapshot()
+        if n == 0:
+            return 0.0
+        target, acc = q * n, 0
+        for i, c in enumerate(counts):
+            acc += c
+            if acc >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+_REGISTRY: Dict[Tuple[str, str], Histogram] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def histogram(kind: str, name: str) -> Histogram:
+    key = (kind, name)
+    h = _REGISTRY.get(key)
+    if h is None:
+        with _REGISTRY_LOCK:
+            h = _REGISTRY.setdefault(key, Histogram())
+    return h
+
+
+def observe(kind: str, name: str, seconds: float) -> None:
+    histogram(kind, name).observe(seconds)
+
+
+def reset() -> None:
+    with _REGISTRY_LOCK:
+        _REGISTRY.clear()
+
+
+def timed(kind: str, name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """Decorator timing every call of the function; identity when metrics are disabled."""
+    def decorate(fn: Callable) -> Callable:
+        if not ENABLED:
+            return fn
+        hist = histogram(kind, name or fn.__name__)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - t0)
+        return wrapper
+    return decorate
+
+
+def _no_lap(name: str) -> None:
+    return None
+
+
+def stage_timer(kind: str = "stage") -> Callable[[str], None]:
+    """Return `lap(name)`: records the time elapsed since the previous lap under `name`.
+
+    Usage inside a function: `lap = stage_timer()` at the start, then `lap('devices')` after
+    each stage. When metrics are disabled this is a shared no-op.
+    """
+    if not ENABLED:
+        return _no_lap
+    last = [time.perf_counter()]
+
+    def lap(name: str) -> None:
+        now = time.perf_counter()
+        histogram(kind, name).observe(now - last[0])
+        last[0] = now
+    return lap
+
+
+# ---------------- Export ----------------
+
+def render_prometheus() -> str:
+    lines = [
+        f"# HELP {METRIC_NAME} EpiMind operation durations (risk stages, audit I/O, page renders).",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    with _REGISTRY_LOCK:
+        items = sorted(_REGISTRY.items())
+    for (kind, name), hist in items:
+        counts, total, n = hist.snapshot()
+        labels = f'kind="{kind}",name="{name}"'
+        acc = 0
+        for bound, c in zip(BUCKETS, counts):
+            acc += c
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {acc}')
+        lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {n}')
+        lines.append(f"{METRIC_NAME}_sum{{{labels}}} {total:.9f}")
+        lines.append(f"{METRIC_NAME}_count{{{labels}}} {n}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str = METRICS_FILE) -> None:
+    """Atomically replace `path` with the current metrics (node_exporter textfile style)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        fh.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _file_exporter() -> None:
+    while True:
+        time.sleep(METRICS_INTERVAL)
+        try:
+            write_prometheus(METRICS_FILE)
+        except OSError:
+            pass
+
+
+_started = False
+
+
+def start_exporters() -> None:
+    """Start the textfile writer (and HTTP endpoint if configured) once per process."""
+    global _started
+    if _started or not ENABLED:
+        return
+    _started = True
+    threading.Thread(target=_file_exporter, name="epimind-metrics-file", daemon=True).start()
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, int(METRICS_PORT)), _MetricsHandler)
+        except OSError:
+            return  # port taken by another worker process; the textfile export still runs
+        threading.Thread(target=server.serve_forever, name="epimind-metrics-http", daemon=True).start()
+
+
+start_exporters()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Streaming outbreak cluster detector
+
+Counts distinct patients per (sectie, bacterie, rezistență) in a sliding time window and raises
+an alert when a key reaches the configured threshold (e.g. 3 patients with K. pneumoniae KPC in
+ATI within 7 days). Each event costs O(1) amortised: one deque append plus the expiry of events
+that left the window. The detector is fed live by every evaluation and can be replayed over the
+whole audit history.
+
+Replay the audit:
+    python epimind_outbreak.py backfill --audit epimind_audit.csv --window-hours 168 --threshold 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: alert writes are not serialised across processes
+    fcntl = None
+
+ALERTS_CSV = "epimind_alerts.csv"
+WINDOW_HOURS = float(os.environ.get("EPIMIND_OUTBREAK_WINDOW_H", "168"))
+THRESHOLD = int(os.environ.get("EPIMIND_OUTBREAK_THRESHOLD", "3"))
+
+Key = Tuple[str, str, str]
+
+
+def _epoch(iso: str) -> float:
+    """Naive ISO audit timestamps are read as UTC so live and replayed events share one clock."""
+    return datetime.fromisoformat(iso).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat(timespec='seconds')
+
+
+class _WindowCounter:
+    """Distinct patients of one key within the sliding window."""
+
+    __slots__ = ("events", "patients", "alerted")
+
+    def __init__(self):
+        self.events: Deque[Tuple[float, str]] = deque()
+        self.patients: Dict[str, int] = {}
+        self.alerted = False
+
+    def add(self, ts: float, pacient: str) -> None:
+        self.events.append((ts, pacient))
+        self.patients[pacient] = self.patients.get(pacient, 0) + 1
+
+    def expire(self, horizon: float, threshold: int) -> None:
+        """Drop events older than `horizon`; a cluster that fell below `threshold` is re-armed."""
+        events, patients = self.events, self.patients
+        while events and events[0][0] < horizon:
+            _, p = events.popleft()
+            left = patients[p] - 1
+            if left:
+                patients[p] = left
+            else:
+                del patients[p]
+        if len(patients) < threshold:
+            self.alerted = False
+
+
+class OutbreakDetector:
+    """Sliding-window counters keyed by (sectie, bacterie, rezistență)."""
+
+    def __init__(self, window_hours: float = WINDOW_HOURS, threshold: int = THRESHOLD):
+        if threshold < 1:
+            raise ValueError("threshold trebuie să fie >= 1")
+        self.window = float(window_hours) * 3600.0
+        self.threshold = int(threshold)
+        self._counters: Dict[Key, _WindowCounter] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def keys_for(sectie: Any, bacterie: Any, rezistente: Iterable[str]) -> List[Key]:
+        """One key per resistance mechanism; an isolate without mechanisms counts under ''."""
+        rez = [r for r in rezistente if r] or [""]
+        return [(str(sectie or ""), str(bacterie), r) for r in rez]
+
+    def observe(self, ts: float, sectie: Any, pacient: Any, bacterie: Any, rezistente: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """Feed one positive isolate (epoch seconds). Returns the alerts it triggers."""
+        if not bacterie:
+            return []
+        alerts = []
+        horizon = ts - self.window
+        with self._lock:
+            for key in self.keys_for(sectie, bacterie, rezistente):
+                counter = self._counters.get(key)
+                if counter is None:
+                    counter = self._counters[key] = _WindowCounter()
+                counter.expire(horizon, self.threshold)
+                counter.add(ts, str(pacient))
+                n = len(counter.patients)
+                if n >= self.threshold and not counter.alerted:
+                    counter.alerted = True
+                    alerts.append({
+                        'timestamp': _iso(ts),
+                        'sectie': key[0], 'bacterie': key[1], 'rezistenta': key[2],
+                        'pacienti': n, 'fereastra_ore': self.window / 3600.0,
+                        'lista_pacienti': ','.join(sorted(counter.patients)),
+                    })
+        return alerts
+
+    def observe_payload(self, payload: Dict[str, Any], timestamp: str) -> List[Dict[str, Any]]:
+        """Feed one evaluation payload (only positive cultures are counted)."""
+        if not payload.get('cultura_pozitiva'):
+            return []
+        return self.observe(_epoch(timestamp), payload.get('sectie'), payload.get('nume_pacient'),
+                            payload.get('bacterie'), payload.get('profil_rezistenta') or [])
+
+    def active(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Keys currently at or above the threshold."""
+        now = _epoch(datetime.now().isoformat()) if now is None else now
+        out = []
+        with self._lock:
+            for key, counter in self._counters.items():
+                counter.expire(now - self.window, self.threshold)
+                if len(counter.patients) >= self.threshold:
+                    out.append({'sectie': key[0], 'bacterie': key[1], 'rezistenta': key[2], 'pacienti': len(counter.patients)})
+        return sorted(out, key=lambda a: a['pacienti'], reverse=True)
+
+    def backfill_audit(self, audit_csv: str, store: Optional[SnapshotStore] = None) -> List[Dict[str, Any]]:
+        """Replay the positive cultures of the audit CSV in time order and return every alert raised along the way."""
+        df = read_cultures(audit_csv, store)
+        if df.empty:
+            return []
+        ts = ((pd.to_datetime(df['timestamp'], format='ISO8601') - pd.Timestamp(0)) / pd.Timedelta(seconds=1)).to_numpy()
+        order = ts.argsort(kind='stable')
+        sectie = df['sectie'].fillna('').to_numpy()[order]
+        pacient = df['pacient'].fillna('').to_numpy()[order]
+        agent = df['agent'].to_numpy()[order]
+        rez = df['rezistente'].fillna('').to_numpy()[order]
+        ts = ts[order]
+        alerts: List[Dict[str, Any]] = []
+        observe = self.observe
+        for i in range(len(ts)):
+            found = observe(float(ts[i]), sectie[i], pacient[i], agent[i], rez[i].split(',') if rez[i] else ())
+            if found:
+                alerts.extend(found)
+        return alerts
+
+
+_CULTURE_FLAG = {'true': True, '1': True, '1.0': True, 'false': False, '0': False, '0.0': False}
+
+
+def read_cultures(audit_csv: str, store: Optional[SnapshotStore] = None, since: Optional[str] = None) -> pd.DataFrame:
+    """Audit rows of positive cultures (timestamp, pacient, sectie, agent, rezistente), optionally after `since`.
+
+    As on the live path, a row counts only when its evaluation had `cultura_pozitiva` set (the audit
+    records the chosen organism either way). Rows written before the audit had that column are
+    resolved from their snapshot when a store is given and left out otherwise.
+    """
+    columns = ['timestamp', 'pacient', 'sectie', 'agent', 'rezistente']
+    if not Path(audit_csv).exists():
+        return pd.DataFrame(columns=columns)
+    header = set(pd.read_csv(audit_csv, nrows=0).columns)
+    df = pd.read_csv(audit_csv, dtype=str,
+                     usecols=[c for c in columns + ['cultura_pozitiva', 'snapshot_id'] if c in header])
+    df = df[df['agent'].notna() & (df['agent'] != '')]
+    if since:
+        df = df[df['timestamp'] > since]
+    flag = df['cultura_pozitiva'].str.strip().str.lower().map(_CULTURE_FLAG) if 'cultura_pozitiva' in df \
+        else pd.Series(None, index=df.index, dtype=object)
+    unknown = flag.isna()
+    if unknown.any() and store is not None and 'snapshot_id' in df:
+        resolved: Dict[str, Optional[bool]] = {}
+        for i, sid in df.loc[unknown, 'snapshot_id'].items():
+            if isinstance(sid, str) and sid:
+                if sid not in resolved:
+                    try:
+                        resolved[sid] = bool(store.load(sid).get('cultura_pozitiva'))
+                    except (KeyError, ValueError):
+                        resolved[sid] = None
+                flag[i] = resolved[sid]
+    return df.loc[flag.fillna(False).astype(bool), columns]
+
+
+@contextmanager
+def alerts_lock(path: str = ALERTS_CSV):
+    """Serialise alert writers across sessions and server processes (lock file next to the CSV)."""
+    with open(str(path) + '.lock', 'a') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def append_alerts(alerts: Sequence[Dict[str, Any]], path: str = ALERTS_CSV) -> None:
+    if not alerts:
+        return
+    df = pd.DataFrame(list(alerts))
+    with alerts_lock(path):
+        df.to_csv(path, mode='a', header=not Path(path).exists(), index=False)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind outbreak cluster detector")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("backfill", help="replay the audit history and list alerts")
+    b.add_argument("--audit", default="epimind_audit.csv")
+    b.add_argument("--window-hours", type=float, default=WINDOW_HOURS)
+    b.add_argument("--threshold", type=int, default=THRESHOLD)
+    b.add_argument("--snapshots", default=str(SNAPSHOT_DIR), help="snapshot store resolving audit rows without cultura_pozitiva")
+    b.add_argument("--out", default="", help="also append the alerts to this CSV")
+    args = parser.parse_args(argv)
+
+    detector = OutbreakDetector(args.window_hours, args.threshold)
+    store = SnapshotStore(Path(args.snapshots)) if Path(args.snapshots).exists() else None
+    t0 = time.perf_counter()
+    alerts = detector.backfill_audit(args.audit, store)
+    elapsed = time.perf_counter() - t0
+    for a in alerts:
+        print(f"{a['timestamp']}  {a['sectie']}  {a['bacterie']} {a['rezistenta'] or '—'}: {a['pacienti']} pacienți")
+    print(f"{len(alerts)} alerte în {elapsed:.2f}s", file=sys.stderr)
+    if args.out:
+        append_alerts(alerts, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Ward-relative score percentiles per (sectie, month)
+
+IAAM scores are non-negative integers in a small range, so the sketch kept per (sectie, month)
+is an exact count histogram over score bins (scores above MAX_SCORE share the last bin) rather
+than an approximate t-digest/KLL: 2 KB per key, merged by adding counts, updated in O(1) on
+every evaluation and rebuilt from the audit history with one vectorised pass. Percentile queries
+read a cached cumulative array, so they cost O(1) regardless of how much history there is.
+
+Rebuild from the audit and query:
+    python epimind_quantiles.py rebuild --audit epimind_audit.csv
+    python epimind_quantiles.py query --sectie ATI --luna 2026-10 --scor 95
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+MAX_SCORE = 511
+Key = Tuple[str, str]
+
+
+def month_of(timestamp: str) -> str:
+    """'YYYY-MM' of an ISO timestamp."""
+    return str(timestamp)[:7]
+
+
+class ScoreSketch:
+    """Count histogram of integer scores 0..MAX_SCORE; mergeable and exact within that range."""
+
+    __slots__ = ("counts", "_cum")
+
+    def __init__(self, counts: Optional[np.ndarray] = None):
+        self.counts = np.zeros(MAX_SCORE + 1, dtype=np.uint32) if counts is None else counts.astype(np.uint32)
+        self._cum: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _bin(score: float) -> int:
+        return min(max(int(round(score)), 0), MAX_SCORE)
+
+    @property
+    def n(self) -> int:
+        return int(self._cumulative()[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes
+
+    def add(self, score: float, count: int = 1) -> None:
+        self.counts[self._bin(score)] += count
+        self._cum = None
+
+    def merge(self, other: "ScoreSketch") -> "ScoreSketch":
+        self.counts += other.counts
+        self._cum = None
+        return self
+
+    def _cumulative(self) -> np.ndarray:
+        if self._cum is None:
+            self._cum = np.cumsum(self.counts, dtype=np.int64)
+        return self._cum
+
+    def percentile(self, score: float) -> Optional[float]:
+        """Mid-rank percentile of `score` (0-100): scores below plus half of the ties."""
+        cum = self._cumulative()
+        total = cum[-1]
+        if not total:
+            return None
+        b = self._bin(score)
+        below = cum[b - 1] if b else 0
+        return float(100.0 * (below + 0.5 * self.counts[b]) / total)
+
+    def quantile(self, q: float) -> Optional[int]:
+        """Smallest score whose cumulative share reaches q (0-1)."""
+        cum = self._cumulative()
+        if not cum[-1]:
+            return None
+        return int(np.searchsorted(cum, q * cum[-1], side='left'))
+
+    def to_bytes(self) -> bytes:
+        return self.counts.astype('<u4').tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ScoreSketch":
+        return cls(np.frombuffer(data, dtype='<u4').copy())
+
+
+class WardPercentiles:
+    """One ScoreSketch per (sectie, month)."""
+
+    def __init__(self):
+        self._sketches: Dict[Key, ScoreSketch] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sketches)
+
+    def keys(self) -> List[Key]:
+        return sorted(self._sketches)
+
+    def get(self, sectie: str, luna: str) -> Optional[ScoreSketch]:
+        return self._sketches.get((str(sectie or ""), luna))
+
+    def observe(self, sectie: str, timestamp: str, scor: float) -> None:
+        key = (str(sectie or ""), month_of(timestamp))
+        with self._lock:
+            sketch = self._sketches.get(key)
+            if sketch is None:
+                sketch = self._sketches[key] = ScoreSketch()
+            sketch.add(scor)
+
+    def percentile(self, sectie: str, timestamp: str, scor: float) -> Tuple[Optional[float], int]:
+        """(percentile, n) of `scor` among the evaluations of that sectie in the same month."""
+        sketch = self.get(sectie, month_of(timestamp))
+        if sketch is None:
+            return None, 0
+        with self._lock:
+            return sketch.percentile(scor), sketch.n
+
+    def merged(self, sectie: Optional[str] = None, luna: Optional[str] = None) -> ScoreSketch:
+        """Sketch over every key matching the given sectie and/or month (e.g. a whole quarter by merging)."""
+        out = ScoreSketch()
+        with self._lock:
+            for (s, m), sketch in self._sketches.items():
+                if (sectie is None or s == sectie) and (luna is None or m == luna):
+                    out.merge(sketch)
+        return out
+
+    def rebuild_audit(self, audit_csv: str) -> int:
+        """Replace the sketches with counts from the audit CSV. Returns the number of rows read."""
+        sketches: Dict[Key, ScoreSketch] = {}
+        n = 0
+        if Path(audit_csv).exists():
+            df = pd.read_csv(audit_csv, usecols=['timestamp', 'sectie', 'scor'], dtype={'timestamp': str, 'sectie': str})
+            df = df[df['scor'].notna()]
+            n = len(df)
+            if n:
+                luna = df['timestamp'].str.slice(0, 7)
+                key_codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([df['sectie'].fillna(''), luna]))
+                bins = np.clip(np.rint(df['scor'].to_numpy(dtype=float)), 0, MAX_SCORE).astype(np.int64)
+                flat = np.bincount(key_codes * (MAX_SCORE + 1) + bins, minlength=len(uniques) * (MAX_SCORE + 1))
+                for i, key in enumerate(uniques):
+                    sketches[tuple(key)] = ScoreSketch(flat[i * (MAX_SCORE + 1):(i + 1) * (MAX_SCORE + 1)])
+        with self._lock:
+            self._sketches = sketches
+        return n
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind ward-relative score percentiles")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("rebuild", help="build the sketches from the audit and list them")
+    r.add_argument("--audit", default="epimind_audit.csv")
+    q = sub.add_parser("query", help="percentile of a score for a sectie and month")
+    q.add_argument("--audit", default="epimind_audit.csv")
+    q.add_argument("--sectie", required=True)
+    q.add_argument("--luna", required=True, help="YYYY-MM")
+    q.add_argument("--scor", type=float, required=True)
+    args = parser.parse_args(argv)
+
+    wards = WardPercentiles()
+    t0 = time.perf_counter()
+    n = wards.rebuild_audit(args.audit)
+    elapsed = time.perf_counter() - t0
+    if args.cmd == "rebuild":
+        for sectie, luna in wards.keys():
+            sk = wards.get(sectie, luna)
+            print(f"{sectie or '—'}  {luna}: n={sk.n}  p50={sk.quantile(0.5)}  p90={sk.quantile(0.9)}  p99={sk.quantile(0.99)}")
+        print(f"{n} evaluări, {len(wards)} schițe în {elapsed:.2f}s", file=sys.stderr)
+    else:
+        pct, count = wards.percentile(args.sectie, args.luna, args.scor)
+        if pct is None:
+            print(f"Nicio evaluare pentru {args.sectie} în {args.luna}")
+        else:
+            print(f"Scor {args.scor:g}: percentila {pct:.0f} pentru secția {args.sectie} în {args.luna} (n={count})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Engine-version replay and score-drift report
+
+Re-scores every evaluation in the snapshot store with two engines side by side and reports
+how many past patients would change risk level: the level transition matrix, drift per ward
+(sectie) and the score components that moved most.
+
+An engine is given as:
+  - `implicit`: the current dashboard_iaam engine as configured;
+  - a weight set `.json` (epimind_calibrate.py fit) applied to the current engine;
+  - another engine file `.py` exposing the same functions (e.g. an older release; one without a rule set
+    is compared on score and level only).
+
+The store is cut into id ranges that worker processes read and score on their own; partial
+aggregates are merged in id order and checkpointed after every range, so an interrupted run
+resumes where it stopped.
+
+Run:
+    python epimind_replay.py --a implicit --b weights/20261019-072343-98f4a2d3.json --workers 4 --out drift.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import hashlib
+import heapq
+import importlib.util
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from epimind_knn import FEATURES, can_encode, encode_payload
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+
+CHUNK = 5000
+TOP_CHANGES = 50
+
+_ENGINES: Tuple[Any, Any] = (None, None)
+_ROOT: Optional[Path] = None
+
+
+# ---------------- Engines ----------------
+
+def load_engine_spec(spec: str, name: str):
+    """Load an engine for `spec` ('implicit', a weight set .json or an engine .py) as module `name`."""
+    here = Path(__file__).resolve().parent
+    path = here / "dashboard_iaam.py"
+    weights = None
+    if spec.endswith(".py"):
+        path = Path(spec).resolve()
+    elif spec != "implicit":
+        weights = spec
+    logging.disable(logging.WARNING)  # bare-mode Streamlit warnings on import
+    try:
+        module_spec = importlib.util.spec_from_file_location(name, str(path))
+        engine = importlib.util.module_from_spec(module_spec)
+        sys.modules[name] = engine
+        module_spec.loader.exec_module(engine)
+    finally:
+        logging.disable(logging.NOTSET)
+    if weights:
+        engine.load_weight_set(weights)
+    return engine
+
+
+@functools.lru_cache(maxsize=None)
+def spec_fingerprint(spec: str) -> str:
+    """Identifies an engine spec by content (engine code and compiled rule set), so a checkpoint is only resumed
+    for the same engines."""
+    h = hashlib.sha256(spec.encode("utf-8"))
+    path = Path(spec).resolve() if spec.endswith(".py") else Path(__file__).resolve().parent / "dashboard_iaam.py"
+    h.update(path.read_bytes())
+    engine = load_engine_spec(spec, f"_epimind_engine_{h.hexdigest()[:8]}")
+    if hasattr(engine, "current_rules"):  # rules file, EPIMIND_WEIGHTS and the weight set all end up in the digest
+        h.update(engine.current_rules().digest.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def engine_rules(engine: Any) -> Optional[Any]:
+    """The engine's current RuleSet, or None for an older engine without `current_rules` (constants in the module)."""
+    return engine.current_rules() if hasattr(engine, "current_rules") else None
+
+
+def _score(engine: Any, rules: Optional[Any], payload: Dict[str, Any]) -> Tuple[int, str]:
+    scor, nivel, _, _ = engine.calculate_iaam_risk(payload, rules) if rules is not None else engine.calculate_iaam_risk(payload)
+    return scor, nivel
+
+
+def _init_worker(spec_a: str, spec_b: str, root: str) -> None:
+    global _ENGINES, _ROOT
+    _ENGINES = (load_engine_spec(spec_a, "_epimind_engine_a"), load_engine_spec(spec_b, "_epimind_engine_b"))
+    _ROOT = Path(root)
+
+
+# ---------------- Aggregates ----------------
+
+def empty_aggregate() -> Dict[str, Any]:
+    return {
+        'evaluari': 0, 'tranzitii': {}, 'sectii': {},
+        'contributori': {f: {'delta': 0.0, 'delta_abs': 0.0, 'schimbate': 0} for f in FEATURES},
+        'componente': True, 'top': [],
+    }
+
+
+def merge(into: Dict[str, Any], part: Dict[str, Any]) -> Dict[str, Any]:
+    into['evaluari'] += part['evaluari']
+    into['componente'] = into.get('componente', True) and part.get('componente', True)
+    for k, n in part['tranzitii'].items():
+        into['tranzitii'][k] = into['tranzitii'].get(k, 0) + n
+    for sectie, s in part['sectii'].items():
+        acc = into['sectii'].setdefault(sectie, {k: 0 for k in s})
+        for k, v in s.items():
+            acc[k] += v
+    for f, c in part['contributori'].items():
+        acc = into['contributori'][f]
+        for k, v in c.items():
+            acc[k] += v
+    into['top'] = heapq.nlargest(TOP_CHANGES, into['top'] + part['top'], key=lambda r: (abs(r['delta']), r['eval_id']))
+    return into
+
+
+def _replay_range(bounds: Tuple[int, int]) -> Dict[str, Any]:
+    """Score evaluations with lo < id <= hi with both engines.
+
+    Score components are compared only when both engines expose their component points (`can_encode`); an
+    older engine is replayed on score and level alone and the aggregate is marked `componente: False`.
+    """
+    lo, hi = bounds
+    engine_a, engine_b = _ENGINES
+    rules_a, rules_b = engine_rules(engine_a), engine_rules(engine_b)  # one rule version per engine for the range
+    components = can_encode(engine_a) and can_encode(engine_b)
+    levels = next((r.level_names for r in (rules_a, rules_b) if r is not None), None) or getattr(engine_a, 'NIVELURI', ())
+    rank = {level: i for i, level in enumerate(reversed(levels))}
+    agg = empty_aggregate()
+    agg['componente'] = components
+    rows: List[Dict[str, Any]] = []
+    vec_a: List[np.ndarray] = []
+    vec_b: List[np.ndarray] = []
+    for row, payload in SnapshotStore(_ROOT).iter_payloads(lo, hi):
+        sa, na = _score(engine_a, rules_a, payload)
+        sb, nb = _score(engine_b, rules_b, payload)
+        rows.append({'eval_id': row['id'], 'pacient': row['pacient'], 'sectie': row['sectie'] or '', 'timestamp': row['timestamp'],
+                     'scor_a': sa, 'scor_b': sb, 'nivel_a': na, 'nivel_b': nb, 'delta': sb - sa})
+        if components:
+            vec_a.append(encode_payload(payload, engine_a, rules_a))
+            vec_b.append(encode_payload(payload, engine_b, rules_b))
+    if not rows:
+        return agg
+    agg['evaluari'] = len(rows)
+    for r in rows:
+        key = f"{r['nivel_a']}|{r['nivel_b']}"
+        agg['tranzitii'][key] = agg['tranzitii'].get(key, 0) + 1
+        s = agg['sectii'].setdefault(r['sectie'], {'evaluari': 0, 'nivel_schimbat': 0, 'urcat': 0, 'coborat': 0, 'delta': 0, 'delta_abs': 0})
+        s['evaluari'] += 1
+        s['delta'] += r['delta']
+        s['delta_abs'] += abs(r['delta'])
+        if r['nivel_a'] != r['nivel_b']:
+            s['nivel_schimbat'] += 1
+            s['urcat' if rank.get(r['nivel_b'], -1) > rank.get(r['nivel_a'], -1) else 'coborat'] += 1
+    if components:
+        diff = np.vstack(vec_b) - np.vstack(vec_a)
+        for j, f in enumerate(FEATURES):
+            col = diff[:, j]
+            agg['contributori'][f] = {'delta': float(col.sum()), 'delta_abs': float(np.abs(col).sum()), 'schimbate': int(np.count_nonzero(col))}
+    agg['top'] = heapq.nlargest(TOP_CHANGES, rows, key=lambda r: (abs(r['delta']), r['eval_id']))
+    return agg
+
+
+# ---------------- Driver ----------------
+
+def _ranges(start: int, end: int, chunk: int) -> Iterator[Tuple[int, int]]:
+    lo = start
+    while lo < end:
+        yield lo, min(lo + chunk, end)
+        lo += chunk
+
+
+def _save_checkpoint(path: Path, state: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def replay(spec_a: str, spec_b: str, root: Path = SNAPSHOT_DIR, workers: int = 0, chunk: int = CHUNK,
+           checkpoint: Optional[Path] = None, progress=None) -> Dict[str, Any]:
+    """Aggregate report of engine B versus engine A over every stored evaluation, resuming from `checkpoint`."""
+    store = SnapshotStore(root)
+    end = store.max_eval_id()
+    fingerprint = {'a': spec_fingerprint(spec_a), 'b': spec_fingerprint(spec_b)}
+    state = {'motoare': {'a': spec_a, 'b': spec_b}, 'amprenta': fingerprint, 'ultimul_id': 0, 'agregat': empty_aggregate()}
+    if checkpoint and checkpoint.exists():
+        saved = json.loads(checkpoint.read_text(encoding="utf-8"))
+        if saved.get('amprenta') == fingerprint:
+            state = saved
+    ranges = _ranges(state['ultimul_id'], end, chunk)
+
+    def done(bounds: Tuple[int, int], part: Dict[str, Any]) -> None:
+        merge(state['agregat'], part)
+        state['ultimul_id'] = bounds[1]
+        if checkpoint:
+            _save_checkpoint(checkpoint, state)
+        if progress:
+            progress(state['ultimul_id'], end, state['agregat']['evaluari'])
+
+    if workers <= 1:
+        _init_worker(spec_a, spec_b, str(root))
+        for bounds in ranges:
+            done(bounds, _replay_range(bounds))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec_a, spec_b, str(root))) as pool:
+            pending: deque = deque()
+            for bounds in ranges:
+                pending.append((bounds, pool.submit(_replay_range, bounds)))
+                if len(pending) >= 2 * workers:
+                    b, fut = pending.popleft()
+                    done(b, fut.result())
+            while pending:
+                b, fut = pending.popleft()
+                done(b, fut.result())
+    state['complet'] = state['ultimul_id'] >= end
+    if checkpoint:
+        _save_checkpoint(checkpoint, state)
+    return state
+
+
+def format_report(state: Dict[str, Any]) -> str:
+    agg = state['agregat']
+    n = agg['evaluari']
+    lines = [f"Motor A: {state['motoare']['a']}   Motor B: {state['motoare']['b']}   Evaluări: {n}"]
+    changed = sum(v for k, v in agg['tranzitii'].items() if k.split('|')[0] != k.split('|')[1])
+    lines.append(f"Nivel schimbat: {changed} ({changed / max(n, 1):.1%})")
+    lines.append("\nTranziții de nivel (A -> B):")
+    for k, v in sorted(agg['tranzitii'].items(), key=lambda kv: -kv[1]):
+        a, b = k.split('|')
+        lines.append(f"  {a:<20} -> {b:<20} {v}")
+    lines.append("\nDrift pe secții:")
+    for sectie, s in sorted(agg['sectii'].items()):
+        lines.append(f"  {sectie or '—':<18} n={s['evaluari']:<7} schimbat={s['nivel_schimbat']:<6} "
+                     f"(↑{s['urcat']} ↓{s['coborat']})  Δ mediu={s['delta'] / max(s['evaluari'], 1):+.2f}")
+    lines.append("\nComponente cu cea mai mare modificare:")
+    if not agg.get('componente', True):
+        lines.append("  indisponibil: un motor nu expune punctele pe componente (versiune veche); comparație doar pe scor și nivel")
+        return "\n".join(lines)
+    contrib = sorted(agg['contributori'].items(), key=lambda kv: -kv[1]['delta_abs'])
+    for f, c in contrib[:10]:
+        if c['delta_abs']:
+            lines.append(f"  {f:<22} Σ|Δ|={c['delta_abs']:.0f}  Δ mediu={c['delta'] / max(n, 1):+.2f}  evaluări afectate={c['schimbate']}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind engine replay and score-drift report")
+    parser.add_argument("--a", default="implicit", help="reference engine: implicit | weights.json | engine.py")
+    parser.add_argument("--b", required=True, help="candidate engine: implicit | weights.json | engine.py")
+    parser.add_argument("--root", default=str(SNAPSHOT_DIR), help="snapshot store directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=CHUNK)
+    parser.add_argument("--checkpoint", default="", help="checkpoint file (default: <root>/replay/<a>-<b>.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--out", default="", help="write the full report (JSON)")
+    args = parser.parse_args(argv)
+
+    root = Path(args.root)
+    checkpoint = Path(args.checkpoint) if args.checkpoint else \
+        root / "replay" / f"{spec_fingerprint(args.a)}-{spec_fingerprint(args.b)}.json"
+    if args.restart and checkpoint.exists():
+        checkpoint.unlink()
+    t0 = time.perf_counter()
+
+    def progress(last: int, end: int, n: int) -> None:
+        el = time.perf_counter() - t0
+        print(f"\r{last}/{end} id-uri, {n} evaluări, {n / max(el, 1e-9):.0f}/s", end="", file=sys.stderr)
+
+    state = replay(args.a, args.b, root, args.workers, args.chunk, checkpoint, progress)
+    print(file=sys.stderr)
+    print(format_report(state))
+    if args.out:
+        Path(args.out).write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
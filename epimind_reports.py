@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Bulk per-patient ward reports
+
+Renders one report per patient of a ward (latest evaluation in the period, its score components
+and recommendations, and the patient's evaluation history) from the snapshot store, as JSON and
+as HTML through templates compiled once at import. Reports are produced one patient at a time
+from an index query ordered by patient, so memory stays bounded by a single patient's history:
+they are streamed into a zip (written entry by entry, also to non-seekable outputs such as
+stdout) or into NDJSON, one report per line. The zip ends with an index.html listing every
+patient by score.
+
+Weekly infection-control meeting pack:
+    python epimind_reports.py --sectie ATI --since 2026-10-12 --out ati.zip
+    python epimind_reports.py --sectie ATI --format ndjson --out - | gzip > ati.ndjson.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import html
+import json
+import re
+import sys
+import time
+import zipfile
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+from string import Template
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+
+_PAGE = Template("""<!DOCTYPE html>
+<html lang="ro"><head><meta charset="utf-8"><title>$title</title>
+<style>body{font-family:sans-serif;margin:2em;color:#1b2430}table{border-collapse:collapse}td,th{border:1px solid #ccd;padding:4px 8px;text-align:left}
+.nivel{font-weight:700}.muted{color:#667}</style></head>
+<body>$body</body></html>
+""")
+_PATIENT = Template("""<h2>$pacient <span class="muted">— secția $sectie</span></h2>
+$evaluare
+<h3>Istoric evaluări în perioadă</h3>
+<table><tr><th>Data</th><th>Scor</th><th>Nivel</th></tr>$istoric</table>
+<p class="muted">Generat $generat • EpiMind $versiune</p>
+""")
+_SCORE = Template("""<p>$titlu: scor <b>$scor</b>, nivel <span class="nivel">$nivel</span> <span class="muted">(reguli $reguli)</span></p>""")
+_COMPONENTS = Template("""<h3>Componente scor</h3><ul>$detalii</ul>
+<h3>Recomandări</h3><ol>$recomandari</ol>""")
+_RESCORED = ('<p class="muted">Evaluarea a fost calculată cu alt set de reguli, ale cărui componente nu sunt păstrate. '
+             'Re-evaluarea de mai jos folosește regulile curente și nu explică scorul înregistrat.</p>')
+_ITEM = Template("<li>$text</li>")
+_ROW = Template("<tr><td>$a</td><td>$b</td><td>$c</td></tr>")
+_INDEX_ROW = Template('<tr><td><a href="$fisier">$pacient</a></td><td>$scor</td><td>$nivel</td><td>$timestamp</td></tr>')
+_INDEX = Template("""<h2>Secția $sectie — $n pacienți</h2><p class="muted">Perioada $perioada • generat $generat</p>
+<table><tr><th>Pacient</th><th>Scor</th><th>Nivel</th><th>Ultima evaluare</th></tr>$randuri</table>
+""")
+
+
+def _e(value: Any) -> str:
+    return html.escape('' if value is None else str(value))
+
+
+def patient_report(payload: Dict[str, Any], result: Dict[str, Any], history: Sequence[Dict[str, Any]] = (),
+                   version: str = '') -> Dict[str, Any]:
+    """Report of one evaluation, in the shape of the single-patient JSON download plus the history."""
+    return {
+        'meta': {'timestamp': result.get('timestamp'), 'version': version, 'generat': datetime.now().isoformat(timespec='seconds')},
+        'pacient': payload,
+        'result': {k: result.get(k) for k in ('scor', 'nivel', 'detalii', 'recomandari', 'versiune_reguli', 'snapshot_id')},
+        'istoric': [{'timestamp': h['timestamp'], 'scor': h['scor'], 'nivel': h['nivel']} for h in history],
+    }
+
+
+def render_json(report: Dict[str, Any], indent: Optional[int] = 2) -> str:
+    return json.dumps(report, ensure_ascii=False, indent=indent, default=str)
+
+
+def _score_html(titlu: str, result: Dict[str, Any]) -> str:
+    return _SCORE.substitute(titlu=_e(titlu), scor=_e(result.get('scor')), nivel=_e(result.get('nivel')),
+                             reguli=_e(result.get('versiune_reguli') or '—'))
+
+
+def _components_html(result: Dict[str, Any]) -> str:
+    return _COMPONENTS.substitute(
+        detalii=''.join(_ITEM.substitute(text=_e(d)) for d in result.get('detalii') or ()),
+        recomandari=''.join(_ITEM.substitute(text=_e(r)) for r in result.get('recomandari') or ()),
+    )
+
+
+def render_html(report: Dict[str, Any]) -> str:
+    payload, result = report['pacient'], report['result']
+    blocks = [_score_html(f"Evaluare din {report['meta'].get('timestamp')}", result)]
+    current = result.get('curent')
+    if current:
+        blocks += [_RESCORED, _score_html('Re-evaluare cu regulile curente', current), _components_html(current)]
+    else:
+        blocks.append(_components_html(result))
+    body = _PATIENT.substitute(
+        pacient=_e(payload.get('nume_pacient')), sectie=_e(payload.get('sectie')), evaluare='\n'.join(blocks),
+        istoric=''.join(_ROW.substitute(a=_e(h['timestamp']), b=_e(h['scor']), c=_e(h['nivel'])) for h in report.get('istoric') or ()),
+        generat=_e(report['meta'].get('generat')), versiune=_e(report['meta'].get('version')),
+    )
+    return _PAGE.substitute(title=f"EpiMind — {_e(payload.get('nume_pacient'))}", body=body)
+
+
+def ward_reports(store: SnapshotStore, engine, sectie: Optional[str], since: Optional[str] = None,
+                 until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """One report per patient (latest evaluation in [since, until]), streamed in patient order.
+
+    The snapshot is re-scored with the current rules. When the evaluation was recorded under the
+    same rules (`version@digest`) and the re-score reproduces it, the report carries its components
+    and recommendations. Otherwise the recorded score and level are kept on their own (components
+    from other rules are not stored) and the re-score is reported separately under `curent`.
+    """
+    rules = engine.current_rules()
+    version = getattr(engine, 'VERSION', '')
+    rows = store.ward_evaluations(sectie, since, until)
+    for _, group in groupby(rows, key=lambda r: r['pacient']):
+        history: List[Dict[str, Any]] = list(group)
+        last = history[-1]
+        try:
+            payload = store.load(last['snapshot_id'])
+        except KeyError:
+            continue
+        scor, nivel, detalii, recomandari = engine.calculate_iaam_risk(payload, rules)
+        current = {'scor': scor, 'nivel': nivel, 'detalii': detalii, 'recomandari': list(recomandari), 'versiune_reguli': rules.label}
+        result = {'timestamp': last['timestamp'], 'scor': last['scor'], 'nivel': last['nivel'],
+                  'versiune_reguli': last.get('reguli') or '', 'snapshot_id': last['snapshot_id']}
+        same = result['versiune_reguli'] == rules.label and (scor, nivel) == (last['scor'], last['nivel'])
+        if same:
+            result.update(detalii=detalii, recomandari=current['recomandari'])
+        report = patient_report(payload, result, history, version)
+        if not same:
+            report['result']['curent'] = current
+        yield report
+
+
+def _file_stem(name: Any, taken: set) -> str:
+    stem = re.sub(r'[^\w.-]+', '_', str(name or 'pacient')).strip('._') or 'pacient'
+    candidate, i = stem, 1
+    while candidate in taken:
+        i += 1
+        candidate = f'{stem}_{i}'
+    taken.add(candidate)
+    return candidate
+
+
+def write_zip(out: BinaryIO, reports: Iterable[Dict[str, Any]], sectie: str = '', perioada: str = '',
+              formats: Sequence[str] = ('json', 'html')) -> int:
+    """Stream reports into a zip (one file per patient and format, plus index.html). Returns the patient count."""
+    taken: set = set()
+    index: List[Dict[str, Any]] = []
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for report in reports:
+            stem = _file_stem(report['pacient'].get('nume_pacient'), taken)
+            if 'json' in formats:
+                zf.writestr(f'{stem}.json', render_json(report))
+            if 'html' in formats:
+                zf.writestr(f'{stem}.html', render_html(report))
+            r = report['result']
+            index.append({'pacient': report['pacient'].get('nume_pacient'), 'scor': r['scor'], 'nivel': r['nivel'],
+                          'timestamp': report['meta']['timestamp'], 'fisier': f"{stem}.{'html' if 'html' in formats else 'json'}"})
+        index.sort(key=lambda i: (-(i['scor'] or 0), str(i['pacient'])))
+        randuri = ''.join(_INDEX_ROW.substitute({k: _e(v) for k, v in i.items()}) for i in index)
+        body = _INDEX.substitute(sectie=_e(sectie or 'toate'), n=len(index), perioada=_e(perioada or 'tot istoricul'),
+                                 generat=_e(datetime.now().isoformat(timespec='seconds')), randuri=randuri)
+        zf.writestr('index.html', _PAGE.substitute(title=f"EpiMind — secția {_e(sectie or 'toate')}", body=body))
+    return len(index)
+
+
+def write_ndjson(out: BinaryIO, reports: Iterable[Dict[str, Any]]) -> int:
+    """Stream reports as NDJSON (one compact JSON report per line). Returns the patient count."""
+    n = 0
+    for report in reports:
+        out.write(render_json(report, indent=None).encode('utf-8') + b'\n')
+        n += 1
+    return n
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind bulk ward reports")
+    parser.add_argument("--root", default=str(SNAPSHOT_DIR), help="snapshot store directory")
+    parser.add_argument("--sectie", default=None, help="ward (default: every ward)")
+    parser.add_argument("--since", default=None, help="ISO date/time, inclusive")
+    parser.add_argument("--until", default=None, help="ISO date/time, inclusive (a date alone covers the whole day)")
+    parser.add_argument("--format", choices=("zip", "ndjson"), default="zip")
+    parser.add_argument("--only", choices=("json", "html"), default=None, help="zip: a single format per patient")
+    parser.add_argument("--out", required=True, help="output file, or - for stdout")
+    args = parser.parse_args(argv)
+
+    from epimind_batch import load_engine
+
+    engine = load_engine()
+    store = SnapshotStore(Path(args.root))
+    reports = ward_reports(store, engine, args.sectie, args.since, args.until)
+    perioada = f"{args.since or '…'} – {args.until or '…'}"
+    t0 = time.perf_counter()
+    out = sys.stdout.buffer if args.out == '-' else open(args.out, 'wb')
+    try:
+        if args.format == 'zip':
+            n = write_zip(out, reports, args.sectie or '', perioada, (args.only,) if args.only else ('json', 'html'))
+        else:
+            n = write_ndjson(out, reports)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"{n} rapoarte în {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Versioned, hot-reloadable rule set for the IAAM engine
+
+Device weights, resistance points, laboratory cut-offs, comorbidity weights, level thresholds
+and recommendations live in a versioned JSON (or YAML, if PyYAML is installed) file. It is
+parsed and validated once into a `RuleSet` of lookup tables and NumPy arrays shared by the
+scalar engine and the vectorised tools. `RuleSetLoader.current()` re-checks the file's mtime at
+most once per CHECK_INTERVAL seconds and swaps in the newly compiled rule set as a single
+reference, so an evaluation always sees one complete version; a file that fails validation is
+reported and the previous rule set stays active.
+
+Check a rules file:
+    python epimind_rules.py check epimind_rules.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import yaml
+except ImportError:  # YAML rule files are optional
+    yaml = None
+
+RULES_FILE = Path(os.environ.get("EPIMIND_RULES", str(Path(__file__).resolve().parent / "epimind_rules.json")))
+CHECK_INTERVAL = float(os.environ.get("EPIMIND_RULES_CHECK_S", "1.0"))
+LEVEL_ORDER = ['CRITIC', 'FOARTE ÎNALT', 'ÎNALT', 'MODERAT']  # levels with a threshold, highest first
+LOWEST_LEVEL = 'SCĂZUT'
+MERGED_SECTIONS = ('device_weights', 'rezistenta_puncte', 'laborator', 'comorbiditati', 'praguri', 'recomandari')
+
+log = logging.getLogger("epimind.rules")
+
+Tiers = Tuple[Tuple[float, int], ...]
+
+
+def _tiers(raw: Any, what: str, descending: bool) -> Tiers:
+    try:
+        tiers = tuple((t, int(p)) for t, p in raw)
+        [float(t) for t, _ in tiers]
+    except (TypeError, ValueError):
+        raise ValueError(f"{what}: se așteaptă o listă de perechi [prag, puncte]")
+    thresholds = [float(t) for t, _ in tiers]
+    if thresholds != sorted(thresholds, reverse=descending) or len(set(thresholds)) != len(thresholds):
+        raise ValueError(f"{what}: pragurile trebuie să fie strict {'descrescătoare' if descending else 'crescătoare'}")
+    return tiers
+
+
+class LabRule:
+    """Cut-offs of one laboratory marker: 'peste' tiers (value >= prag, highest first), 'sub' tiers (value < prag, lowest first)."""
+
+    __slots__ = ("above", "below", "positive")
+
+    def __init__(self, raw: Dict[str, Any], marker: str):
+        self.above: Tiers = _tiers(raw.get('peste', ()), f"laborator.{marker}.peste", descending=True)
+        self.below: Tiers = _tiers(raw.get('sub', ()), f"laborator.{marker}.sub", descending=False)
+        self.positive = int(raw.get('pozitiv', 0))
+
+    def match_above(self, value: float) -> Optional[Tuple[int, Any, int]]:
+        """(tier index, threshold, points) of the highest 'peste' tier reached, or None."""
+        for i, (t, p) in enumerate(self.above):
+            if value >= t:
+                return i, t, p
+        return None
+
+    def match_below(self, value: float) -> Optional[Tuple[int, Any, int]]:
+        for i, (t, p) in enumerate(self.below):
+            if value < t:
+                return i, t, p
+        return None
+
+
+class RuleSet:
+    """Compiled, read-only rule set. Build with `compile_rules`."""
+
+    def __init__(self, raw: Dict[str, Any], source: str = ""):
+        missing = [k for k in ('versiune', 'device_weights', 'rezistenta_puncte', 'laborator', 'comorbiditati', 'praguri')
+                   if k not in raw]
+        if missing:
+            raise ValueError(f"set de reguli invalid: lipsesc {', '.join(missing)}")
+        self.raw = raw
+        self.source = source
+        self.version = str(raw['versiune'])
+        self.digest = hashlib.sha256(json.dumps(raw, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+        self.label = f"{self.version}@{self.digest}"  # what evaluations record: the version name alone can be reused
+        self.device_weights: Dict[str, int] = {str(k): int(v) for k, v in raw['device_weights'].items()}
+        self.device_default = int(raw.get('dispozitiv_implicit', 5))
+        self.rez_points: Dict[str, int] = {str(k): int(v) for k, v in raw['rezistenta_puncte'].items()}
+        self.rez_default = int(raw.get('rezistenta_implicita', 10))
+        self.lab: Dict[str, LabRule] = {m: LabRule(r, m) for m, r in raw['laborator'].items()}
+        self.comorbiditati: Dict[str, Dict[str, Any]] = raw['comorbiditati']
+        self.comorbidity_default = int(raw.get('comorbiditate_implicita', 5))
+        self._comorbidity = {(cat, cond): m for cat, conds in self.comorbiditati.items() for cond, m in conds.items()}
+        for (cat, cond), m in self._comorbidity.items():
+            values = m.values() if isinstance(m, dict) else [m]
+            if not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+                raise ValueError(f"comorbiditati.{cat}.{cond}: se așteaptă puncte întregi (sau severitate -> puncte)")
+        praguri = raw['praguri']
+        thresholds = [float(praguri[lvl]) for lvl in LEVEL_ORDER if lvl in praguri]
+        if thresholds != sorted(thresholds, reverse=True) or len(set(thresholds)) != len(thresholds):
+            raise ValueError("praguri: trebuie să fie strict descrescătoare de la CRITIC la MODERAT")
+        recs = raw.get('recomandari') or {}
+        self.levels: Tuple[Tuple[float, str, Tuple[str, ...]], ...] = tuple(
+            [(praguri[lvl], lvl, tuple(recs.get(lvl, ()))) for lvl in LEVEL_ORDER if lvl in praguri]
+            + [(float('-inf'), LOWEST_LEVEL, tuple(recs.get(LOWEST_LEVEL, ())))]
+        )
+        self.level_names: Tuple[str, ...] = tuple(lvl for _, lvl, _ in self.levels)
+        self.level_thresholds = np.array([t for t, _, _ in self.levels][::-1], dtype=float)  # ascending
+
+    def device_weight(self, device: str) -> int:
+        return self.device_weights.get(device, self.device_default)
+
+    def rez_weight(self, mechanism: str) -> int:
+        return self.rez_points.get(mechanism, self.rez_default)
+
+    def comorbidity_points(self, cat: str, cond: str, sev: Any) -> int:
+        mapping = self._comorbidity.get((cat, cond))
+        if isinstance(mapping, dict):
+            return int(mapping.get(sev, self.comorbidity_default)) if isinstance(sev, str) else self.comorbidity_default
+        if isinstance(mapping, int):
+            return mapping
+        return self.comorbidity_default
+
+    def level_of(self, score: float) -> Tuple[str, Tuple[str, ...]]:
+        for prag, level, recs in self.levels:
+            if score >= prag:
+                return level, recs
+        return self.levels[-1][1], self.levels[-1][2]
+
+    def level_index(self, scores: np.ndarray) -> np.ndarray:
+        """Vectorised index into `levels` (0 = highest) for an array of scores."""
+        return len(self.levels) - np.searchsorted(self.level_thresholds, np.floor(scores), side='right')
+
+
+def _parse(path: Path) -> Dict[str, Any]:
+    text = path.read_text(encoding='utf-8')
+    if path.suffix.lower() in ('.yaml', '.yml'):
+        if yaml is None:
+            raise ValueError(f"{path}: fișierele YAML necesită PyYAML (pip install pyyaml)")
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+def merge_rules(base: Dict[str, Any], overlay: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply a partial rule set (e.g. a calibrated weight set) on top of a full one."""
+    if not overlay:
+        return base
+    out = dict(base)
+    for key, value in overlay.items():
+        if key in MERGED_SECTIONS and isinstance(value, dict):
+            out[key] = {**(base.get(key) or {}), **value}
+        elif key != 'versiune':
+            out[key] = value
+    out['versiune'] = f"{base.get('versiune')}+{overlay.get('versiune', 'local')}"
+    return out
+
+
+def compile_rules(raw: Dict[str, Any], source: str = "") -> RuleSet:
+    return RuleSet(raw, source)
+
+
+def load_rules(path: Path, overlay: Optional[Dict[str, Any]] = None) -> RuleSet:
+    return compile_rules(merge_rules(_parse(Path(path)), overlay), str(path))
+
+
+class RuleSetLoader:
+    """Current compiled rule set for one file, recompiled when the file's mtime changes."""
+
+    def __init__(self, path: Path = RULES_FILE, check_interval: float = CHECK_INTERVAL):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self.overlay: Optional[Dict[str, Any]] = None
+        self.overlay_source = ""
+        self.error: Optional[str] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._rules: RuleSet = self._load()
+
+    def _file_stamp(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self) -> RuleSet:
+        stamp = self._file_stamp()
+        rules = load_rules(self.path, self.overlay)
+        self._stamp = stamp
+        self.error = None
+        return rules
+
+    def set_overlay(self, overlay: Optional[Dict[str, Any]], source: str = "") -> RuleSet:
+        """Install a partial rule set on top of the file (kept across reloads) and recompile now."""
+        with self._lock:
+            previous = self.overlay, self.overlay_source
+            self.overlay, self.overlay_source = overlay, source
+            try:
+                self._rules = self._load()
+            except Exception:
+                self.overlay, self.overlay_source = previous
+                raise
+            return self._rules
+
+    def current(self) -> RuleSet:
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._rules
+        with self._lock:
+            if now < self._next_check:
+                return self._rules
+            self._next_check = now + self.check_interval
+            try:
+                if self._file_stamp() != self._stamp:
+                    self._rules = self._load()
+                    log.warning("Set de reguli reîncărcat: %s (%s)", self._rules.version, self.path)
+            except Exception as e:  # keep serving the last good rule set until the file is fixed
+                self.error = f"{self.path}: {e}"
+                try:
+                    self._stamp = self._file_stamp()
+                except OSError:
+                    self._stamp = None
+                log.error("Set de reguli invalid, se păstrează versiunea %s: %s", self._rules.version, e)
+        return self._rules
+
+
+_SHARED: Dict[Tuple[str, str], RuleSetLoader] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_loader(path: Path = RULES_FILE, owner: str = "") -> RuleSetLoader:
+    """One loader per (file, owner module), kept across Streamlit script reruns."""
+    key = (str(Path(path).resolve()), owner)
+    with _SHARED_LOCK:
+        loader = _SHARED.get(key)
+        if loader is None:
+            loader = _SHARED[key] = RuleSetLoader(path)
+        return loader
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind rule set tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("check", help="validate and summarise a rules file")
+    c.add_argument("path", nargs="?", default=str(RULES_FILE))
+    c.add_argument("--overlay", default="", help="partial rule set (e.g. calibrated weights) applied on top")
+    args = parser.parse_args(argv)
+
+    try:
+        overlay = _parse(Path(args.overlay)) if args.overlay else None
+        rules = load_rules(Path(args.path), overlay)
+    except Exception as e:
+        print(f"INVALID: {e}", file=sys.stderr)
+        return 1
+    print(f"versiune {rules.version} (amprentă {rules.digest})")
+    print(f"  dispozitive: {len(rules.device_weights)}, rezistențe: {len(rules.rez_points)}, markeri: {len(rules.lab)}, "
+          f"comorbidități: {len(rules._comorbidity)}")
+    print("  praguri: " + ", ".join(f"{lvl} >= {prag:g}" for prag, lvl, _ in rules.levels[:-1]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Session memory accounting and idle-session eviction
+
+Keeps a process-wide registry of live Streamlit sessions (by session id; their state is looked up
+through the Streamlit runtime's session manager, so the registry never keeps a session alive),
+estimates the approximate bytes held per session and per key, and clears sessions that have
+been idle for longer than EPIMIND_SESSION_TTL seconds (default 3600, 0 disables eviction) and
+closes them through the runtime.
+The diagnostics view is shown in the app when EPIMIND_DIAG=1.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+SESSION_TTL = float(os.environ.get("EPIMIND_SESSION_TTL", "3600"))
+DIAGNOSTICS = os.environ.get("EPIMIND_DIAG", "").strip().lower() not in ("", "0", "false", "no")
+# Eviction sweeps run at most this often, whichever session triggers them.
+SWEEP_INTERVAL = 60.0
+
+
+def approx_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """Approximate deep size in bytes of containers, strings, numbers, NumPy arrays and DataFrames."""
+    if _seen is None:
+        _seen = set()
+    oid = id(obj)
+    if oid in _seen:
+        return 0
+    _seen.add(oid)
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):  # numpy arrays
+        return sys.getsizeof(obj) if getattr(obj, "base", None) is not None else nbytes + 112
+    memory_usage = getattr(obj, "memory_usage", None)
+    if callable(memory_usage) and hasattr(obj, "columns"):  # pandas DataFrame
+        try:
+            return int(memory_usage(deep=True).sum())
+        except Exception:
+            pass
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += approx_size(k, _seen) + approx_size(v, _seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for v in obj:
+            size += approx_size(v, _seen)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += approx_size(vars(obj), _seen)
+    return size
+
+
+def state_items(state: Any) -> Dict[str, Any]:
+    """User-visible keys of a session state object (SafeSessionState or a plain mapping)."""
+    filtered = getattr(state, "filtered_state", None)
+    return dict(filtered) if filtered is not None else dict(state)
+
+
+def key_footprint(state: Any) -> List[Tuple[str, int]]:
+    """(key, approximate bytes) of one session, largest first."""
+    sizes = [(k, approx_size(v)) for k, v in state_items(state).items()]
+    return sorted(sizes, key=lambda kv: kv[1], reverse=True)
+
+
+def _runtime() -> Any:
+    """The Streamlit server runtime of this process, or None (bare scripts, AppTest's mocked runtime)."""
+    try:
+        from streamlit.runtime import Runtime
+    except ImportError:
+        return None
+    runtime = Runtime.instance() if Runtime.exists() else None
+    return runtime if hasattr(runtime, '_session_mgr') else None
+
+
+class SessionRegistry:
+    """Live sessions by id with their last activity time.
+
+    Session state is resolved by id through the runtime's session manager on every sweep or report:
+    the state object handed to the script (`ctx.session_state`) is a per-run wrapper that does not
+    outlive the run. Without a runtime the state passed to `touch` is held until the session is evicted.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+        self._seen: Dict[str, float] = {}
+        self._states: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def touch(self, session_id: str, state: Any = None) -> None:
+        """Record activity of a session; runs an eviction sweep when one is due."""
+        now = time.time()
+        standalone = state is not None and _runtime() is None
+        with self._lock:
+            self._seen[session_id] = now
+            if standalone:
+                self._states[session_id] = state
+            due = self.ttl > 0 and now - self._last_sweep >= SWEEP_INTERVAL
+            if due:
+                self._last_sweep = now
+        if due:
+            self.evict_idle(now)
+
+    def forget(self, session_id: str) -> None:
+        with self._lock:
+            self._seen.pop(session_id, None)
+            self._states.pop(session_id, None)
+
+    def _state(self, session_id: str) -> Any:
+        runtime = _runtime()
+        if runtime is None:
+            return self._states.get(session_id)
+        info = runtime._session_mgr.get_session_info(session_id)
+        return info.session.session_state if info is not None else None
+
+    def _live(self) -> List[Tuple[str, Any, float]]:
+        """(id, state, last activity) of registered sessions; sessions the runtime no longer knows are dropped."""
+        with self._lock:
+            seen = list(self._seen.items())
+        live = []
+        for sid, last in seen:
+            state = self._state(sid)
+            if state is None:
+                self.forget(sid)
+            else:
+                live.append((sid, state, last))
+        return live
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Clear and close sessions idle longer than the TTL. Returns the number of sessions evicted."""
+        now = time.time() if now is None else now
+        evicted = 0
+        for sid, state, seen in self._live():
+            if now - seen < self.ttl:
+                continue
+            for key in list(state_items(state)):
+                try:
+                    del state[key]
+                except Exception:
+                    pass
+            runtime = _runtime()
+            if runtime is not None:
+                # Runtime.close_session must run on the runtime's event loop, not on this script thread
+                runtime._get_async_objs().eventloop.call_soon_threadsafe(runtime.close_session, sid)
+            self.forget(sid)
+            evicted += 1
+        return evicted
+
+    def report(self) -> List[Dict[str, Any]]:
+        """One row per live session: id, idle seconds, number of keys and approximate bytes."""
+        now = time.time()
+        rows = []
+        for sid, state, seen in self._live():
+            items = state_items(state)
+            rows.append({
+                "sesiune": sid[:8],
+                "inactiv_s": round(now - seen, 1),
+                "chei": len(items),
+                "octeti": sum(approx_size(v) for v in items.values()),
+            })
+        return sorted(rows, key=lambda r: r["octeti"], reverse=True)
+
+
+REGISTRY = SessionRegistry()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Content-addressed payload snapshot store
+
+Every evaluation keeps the full `collect_payload()` JSON so it can be replayed or re-opened.
+Payloads are canonicalised (sorted keys, compact separators) and stored once per SHA-256
+content hash as zlib-compressed blobs; identical snapshots of the same patient are written only
+once. A small SQLite index maps each evaluation to its snapshot and answers lookups by patient
+and time.
+
+Maintenance:
+    python epimind_snapshots.py stats
+    python epimind_snapshots.py gc --keep-days 365 [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SNAPSHOT_DIR = Path("snapshots")
+_BLOB_MAGIC = b"EZ1"  # format tag: zlib-compressed canonical JSON
+# put() writes a blob just before its index row: younger unindexed blobs may still be in flight
+ORPHAN_GRACE_S = 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id TEXT PRIMARY KEY,
+    raw_size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    snapshot_id TEXT NOT NULL REFERENCES snapshots(id),
+    pacient TEXT,
+    sectie TEXT,
+    timestamp TEXT NOT NULL,
+    scor INTEGER,
+    nivel TEXT,
+    reguli TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_eval_pacient_ts ON evaluations (pacient, timestamp);
+CREATE INDEX IF NOT EXISTS ix_eval_ts ON evaluations (timestamp);
+CREATE INDEX IF NOT EXISTS ix_eval_sectie_ts ON evaluations (sectie, timestamp);
+CREATE INDEX IF NOT EXISTS ix_eval_snapshot ON evaluations (snapshot_id);
+CREATE INDEX IF NOT EXISTS ix_eval_snapshot ON evaluations (snapshot_id);
+"""
+
+
+def canonicalize(payload: Dict[str, Any]) -> bytes:
+    """Canonical UTF-8 JSON: sorted keys, no whitespace, non-JSON values rendered with str()."""
+    return json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def snapshot_id_of(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(canonicalize(payload)).hexdigest()
+
+
+class SnapshotStore:
+    """Deduplicated, compressed payload blobs plus an evaluation index."""
+
+    def __init__(self, root: Path = SNAPSHOT_DIR):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.sqlite3"
+        self._lock = threading.Lock()
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+            cols = {r[1] for r in con.execute("PRAGMA table_info(evaluations)")}
+            if "reguli" not in cols:  # index created before rule versions were recorded
+                con.execute("ALTER TABLE evaluations ADD COLUMN reguli TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(str(self.index_path), timeout=10)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.row_factory = sqlite3.Row
+            yield con
+            con.commit()
+        finally:
+            con.close()
+
+    def _blob_path(self, sid: str) -> Path:
+        return self.objects / sid[:2] / sid[2:]
+
+    # ---- blobs ----
+
+    def _write_blob(self, sid: str, raw: bytes) -> int:
+        """Write the blob of `sid` unless present (then only refresh its mtime, so the orphan sweep's grace
+        period restarts). Returns the stored size."""
+        path = self._blob_path(sid)
+        if path.exists():
+            os.utime(path)
+            return path.stat().st_size
+        blob = _BLOB_MAGIC + zlib.compress(raw, 6)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(blob)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return len(blob)
+
+    def _put(self, con: sqlite3.Connection, payload: Dict[str, Any]) -> str:
+        """Blob and snapshot row of a payload, inside the caller's write transaction (BEGIN IMMEDIATE): a
+        concurrent `gc` either ran before, and the blob is rewritten, or waits until the row is referenced."""
+        raw = canonicalize(payload)
+        sid = hashlib.sha256(raw).hexdigest()
+        stored = self._write_blob(sid, raw)
+        con.execute(
+            "INSERT OR IGNORE INTO snapshots (id, raw_size, stored_size, created_at) VALUES (?, ?, ?, ?)",
+            (sid, len(raw), stored, datetime.now().isoformat()),
+        )
+        return sid
+
+    def put(self, payload: Dict[str, Any]) -> str:
+        """Store a payload and return its snapshot id; an existing identical snapshot is reused."""
+        with self._lock, self._connect() as con:
+            con.execute("BEGIN IMMEDIATE")
+            return self._put(con, payload)
+
+    def load(self, sid: str) -> Dict[str, Any]:
+        """Return the payload of a snapshot id (KeyError if unknown)."""
+        path = self._blob_path(sid)
+        if not path.exists():
+            raise KeyError(sid)
+        blob = path.read_bytes()
+        if not blob.startswith(_BLOB_MAGIC):
+            raise ValueError(f"format snapshot necunoscut: {sid}")
+        return json.loads(zlib.decompress(blob[len(_BLOB_MAGIC):]).decode("utf-8"))
+
+    # ---- evaluations ----
+
+    def record(self, result: Dict[str, Any]) -> str:
+        """Store the payload of an evaluation result and index the evaluation. Returns the snapshot id."""
+        payload = result["payload"]
+        with self._lock, self._connect() as con:
+            con.execute("BEGIN IMMEDIATE")  # snapshot row and evaluation in one transaction
+            sid = self._put(con, payload)
+            con.execute(
+                "INSERT INTO evaluations (snapshot_id, pacient, sectie, timestamp, scor, nivel, reguli) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (sid, payload.get("nume_pacient"), payload.get("sectie"), result["timestamp"], result.get("scor"), result.get("nivel"),
+                 result.get("versiune_reguli")),
+            )
+        return sid
+
+    def history(
+        self, pacient: str, since: Optional[str] = None, until: Optional[str] = None, limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Evaluations of one patient within [since, until], newest first (ISO timestamps)."""
+        sql = "SELECT id, snapshot_id, pacient, sectie, timestamp, scor, nivel, reguli FROM evaluations WHERE pacient = ?"
+        params: List[Any] = [pacient]
+        if since:
+            sql += " AND timestamp >= ?"; params.append(since)
+        if until:
+            sql += " AND timestamp <= ?"; params.append(until)
+        sql += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(int(limit))
+        with self._connect() as con:
+            return [dict(r) for r in con.execute(sql, params).fetchall()]
+
+    def evaluations(self, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream all evaluation index rows in time order."""
+        sql = "SELECT id, snapshot_id, pacient, sectie, timestamp, scor, nivel, reguli FROM evaluations"
+        where, params = [], []
+        if since:
+            where.append("timestamp >= ?"); params.append(since)
+        if until:
+            where.append("timestamp <= ?"); params.append(until)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp"
+        with self._connect() as con:
+            for r in con.execute(sql, params):
+                yield dict(r)
+
+    def ward_evaluations(self, sectie: Optional[str] = None, since: Optional[str] = None,
+                         until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream the index rows of one sectie (every sectie when None) ordered by patient, then time."""
+        where, params = self._window(None, sectie, since, until)
+        sql = f"SELECT id, snapshot_id, pacient, sectie, timestamp, scor, nivel, reguli FROM evaluations{where} ORDER BY pacient, timestamp"
+        with self._connect() as con:
+            for r in con.execute(sql, params):
+                yield dict(r)
+
+    @staticmethod
+    def _window(pacient: Optional[str], sectie: Optional[str], since: Optional[str],
+                until: Optional[str]) -> Tuple[str, List[Any]]:
+        where, params = [], []
+        if pacient is not None:
+            where.append("pacient = ?"); params.append(pacient)
+        if sectie is not None:
+            where.append("sectie = ?"); params.append(sectie)
+        if since:
+            where.append("timestamp >= ?"); params.append(since)
+        if until and len(until) == 10:  # a date alone: up to the end of that day
+            where.append("timestamp < ?"); params.append((date.fromisoformat(until) + timedelta(days=1)).isoformat())
+        elif until:
+            where.append("timestamp <= ?"); params.append(until)
+        return (" WHERE " + " AND ".join(where)) if where else "", params
+
+    def score_series(self, pacient: Optional[str] = None, sectie: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None) -> List[Tuple[str, int]]:
+        """(timestamp, scor) of the evaluations in [since, until] for a patient and/or sectie, in time order."""
+        where, params = self._window(pacient, sectie, since, until)
+        with self._connect() as con:
+            return [(r[0], r[1]) for r in con.execute(f"SELECT timestamp, scor FROM evaluations{where} ORDER BY timestamp", params)]
+
+    def daily_scores(self, sectie: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None) -> List[Tuple[str, float, int, int]]:
+        """(day, mean, max, count) of the scores per calendar day in [since, until], aggregated in SQLite."""
+        where, params = self._window(None, sectie, since, until)
+        sql = (f"SELECT substr(timestamp, 1, 10) AS zi, AVG(scor), MAX(scor), COUNT(*) FROM evaluations{where} "
+               "GROUP BY zi ORDER BY zi")
+        with self._connect() as con:
+            return [tuple(r) for r in con.execute(sql, params)]
+
+    def last_evaluation_id(self, pacient: Optional[str] = None, sectie: Optional[str] = None) -> int:
+        """Highest evaluation id for a patient and/or sectie (0 if none): changes whenever one is recorded."""
+        where, params = self._window(pacient, sectie, None, None)
+        with self._connect() as con:
+            return int(con.execute(f"SELECT COALESCE(MAX(id), 0) FROM evaluations{where}", params).fetchone()[0])
+
+    def iter_payloads(self, after_id: int = 0, until_id: Optional[int] = None) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Stream (evaluation row, payload) for evaluations with after_id < id <= until_id, in id order.
+
+        Consecutive evaluations sharing a snapshot are decoded once.
+        """
+        sql = ("SELECT id, snapshot_id, pacient, sectie, timestamp, scor, nivel, reguli FROM evaluations "
+               "WHERE id > ? AND id <= ? ORDER BY id")
+        last_sid, last_payload = None, None
+        with self._connect() as con:
+            for r in con.execute(sql, (int(after_id), int(until_id) if until_id is not None else 2 ** 63 - 1)):
+                row = dict(r)
+                if row["snapshot_id"] != last_sid:
+                    try:
+                        last_payload = self.load(row["snapshot_id"])
+                    except KeyError:
+                        continue
+                    last_sid = row["snapshot_id"]
+                yield row, last_payload
+
+    def max_eval_id(self) -> int:
+        with self._connect() as con:
+            return int(con.execute("SELECT COALESCE(MAX(id), 0) FROM evaluations").fetchone()[0])
+
+    def eval_ids(self) -> List[int]:
+        """Ids of every evaluation still in the index, ascending."""
+        with self._connect() as con:
+            return [r[0] for r in con.execute("SELECT id FROM evaluations ORDER BY id")]
+
+    def retention_generation(self) -> int:
+        """Bumped by every `gc` that removes evaluations. Stores derived from the index (flat frame cache,
+        k-NN index, cohort) record it and drop the evaluations removed since when it moves."""
+        with self._connect() as con:
+            r = con.execute("SELECT value FROM meta WHERE key = 'retention_generation'").fetchone()
+            return int(r[0]) if r else 0
+
+    # ---- maintenance ----
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as con:
+            n_eval = con.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+            n_snap, raw, stored = con.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(stored_size), 0) FROM snapshots"
+            ).fetchone()
+        return {"evaluari": n_eval, "snapshoturi": n_snap, "octeti_brut": raw, "octeti_stocati": stored}
+
+    def _orphan_blobs(self, older_than: float) -> Iterator[Path]:
+        """Blob files (and stale temp files) neither a snapshot row nor an evaluation references, last written
+        before `older_than`."""
+        for sub in sorted(p for p in self.objects.iterdir() if p.is_dir()):
+            bounds = (sub.name, sub.name + "\uffff")
+            with self._connect() as con:
+                known = {r[0] for r in con.execute("SELECT id FROM snapshots WHERE id >= ? AND id < ? UNION "
+                                                     "SELECT snapshot_id FROM evaluations WHERE snapshot_id >= ? AND snapshot_id < ?",
+                                                     bounds + bounds)}
+            for path in sub.iterdir():
+                if sub.name + path.name not in known and path.stat().st_mtime < older_than:
+                    yield path
+
+    def gc(self, keep_days: int, dry_run: bool = False) -> Tuple[int, int]:
+        """Drop evaluations older than `keep_days` and delete snapshots no evaluation references.
+
+        Blobs left without an index row by an interrupted `put` are swept as well. Removing evaluations
+        bumps `retention_generation`, so derived stores drop them on their next load or sync.
+        Returns (evaluations removed, snapshots removed).
+        """
+        cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat()
+        with self._lock, self._connect() as con:
+            if not dry_run:  # hold the write lock from the reference check to the unlink: no `record` in between
+                con.execute("BEGIN IMMEDIATE")
+            n_eval = con.execute("SELECT COUNT(*) FROM evaluations WHERE timestamp < ?", (cutoff,)).fetchone()[0]
+            if not dry_run and n_eval:
+                con.execute("DELETE FROM evaluations WHERE timestamp < ?", (cutoff,))
+                con.execute("INSERT INTO meta (key, value) VALUES ('retention_generation', '1') ON CONFLICT(key) "
+                            "DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+            unreferenced = [
+                r[0] for r in con.execute(
+                    "SELECT s.id FROM snapshots s WHERE NOT EXISTS "
+                    "(SELECT 1 FROM evaluations e WHERE e.snapshot_id = s.id" + (" AND e.timestamp >= ?)" if dry_run else ")"),
+                    (cutoff,) if dry_run else (),
+                )
+            ]
+            if not dry_run:
+                for sid in unreferenced:
+                    path = self._blob_path(sid)
+                    if path.exists():
+                        path.unlink()
+                con.executemany("DELETE FROM snapshots WHERE id = ?", [(sid,) for sid in unreferenced])
+        orphans = list(self._orphan_blobs(time.time() - ORPHAN_GRACE_S))
+        if not dry_run:
+            for path in orphans:
+                path.unlink(missing_ok=True)
+        return n_eval, len(unreferenced) + len(orphans)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind payload snapshot store")
+    parser.add_argument("--root", default=str(SNAPSHOT_DIR))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="number of evaluations, snapshots and bytes on disk")
+    g = sub.add_parser("gc", help="apply retention and delete unreferenced snapshots")
+    g.add_argument("--keep-days", type=int, required=True)
+    g.add_argument("--dry-run", action="store_true")
+    s = sub.add_parser("show", help="print the payload of a snapshot id")
+    s.add_argument("snapshot_id")
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(Path(args.root))
+    if args.cmd == "stats":
+        for k, v in store.stats().items():
+            print(f"{k}: {v}")
+    elif args.cmd == "gc":
+        n_eval, n_snap = store.gc(args.keep_days, dry_run=args.dry_run)
+        prefix = "[dry-run] " if args.dry_run else ""
+        print(f"{prefix}evaluări eliminate: {n_eval}, snapshoturi eliminate: {n_snap}")
+    elif args.cmd == "show":
+        print(json.dumps(store.load(args.snapshot_id), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
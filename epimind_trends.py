@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Score trend series for charts, downsampled server-side
+
+Trend charts read only the visible time window from the snapshot index (per-patient scores, or
+per-ward daily aggregates computed in SQLite) and reduce it to at most MAX_POINTS points with
+Largest-Triangle-Three-Buckets before anything is sent to the browser. LTTB keeps the first and
+last point and, in every bucket, the point forming the largest triangle with the previous pick
+and the next bucket's mean, so peaks and drops survive where plain striding would drop them.
+Series are plain lists, small enough to cache per (patient or ward, window) in the dashboard.
+
+Check a series from the command line:
+    python epimind_trends.py pacient --nume Pacient_001 --days 90
+    python epimind_trends.py sectie --sectie ATI --days 365
+    python epimind_trends.py bench --n 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+
+MAX_POINTS = 1000  # per trace; what the bedside tablets render smoothly with WebGL
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the points kept by Largest-Triangle-Three-Buckets (x ascending)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # n-2 inner points split into threshold-2 buckets; first and last point are always kept
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        # twice the triangle area (a, candidate, next-bucket mean); the constant factor does not matter
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def _seconds(timestamps: Sequence[str]) -> np.ndarray:
+    """Seconds since the epoch of ISO timestamps (the x axis LTTB works on)."""
+    return pd.to_datetime(pd.Series(timestamps), format='ISO8601').to_numpy(dtype='datetime64[s]').astype(np.int64).astype(float)
+
+
+def patient_trend(store: SnapshotStore, pacient: str, since: Optional[str] = None, until: Optional[str] = None,
+                  max_points: int = MAX_POINTS) -> Dict[str, Any]:
+    """Score trajectory of one patient in [since, until]: {'x', 'y', 'n'} with n the raw evaluation count."""
+    rows = store.score_series(pacient=pacient, since=since, until=until)
+    if not rows:
+        return {'x': [], 'y': [], 'n': 0}
+    scored = [r for r in rows if r[1] is not None]
+    y = np.array([r[1] for r in scored], dtype=float)
+    idx = lttb(_seconds([r[0] for r in scored]), y, max_points) if scored else []
+    return {'x': [scored[i][0] for i in idx], 'y': [float(y[i]) for i in idx], 'n': len(rows)}
+
+
+def ward_trend(store: SnapshotStore, sectie: Optional[str], since: Optional[str] = None, until: Optional[str] = None,
+               max_points: int = MAX_POINTS) -> Dict[str, Any]:
+    """Daily mean/max score of a ward (every ward when None): {'x', 'medie', 'max', 'evaluari', 'n'}.
+
+    Downsampling is driven by the daily mean; the max and count series follow the same picks.
+    """
+    rows = store.daily_scores(sectie=sectie, since=since, until=until)
+    if not rows:
+        return {'x': [], 'medie': [], 'max': [], 'evaluari': [], 'n': 0}
+    days = [r[0] for r in rows]
+    medie = np.array([r[1] for r in rows], dtype=float)
+    idx = lttb(_seconds(days), medie, max_points)
+    return {
+        'x': [days[i] for i in idx],
+        'medie': [round(float(medie[i]), 1) for i in idx],
+        'max': [rows[i][2] for i in idx],
+        'evaluari': [rows[i][3] for i in idx],
+        'n': len(rows),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind score trend series")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_pat = sub.add_parser("pacient", help="downsampled score trajectory of a patient")
+    p_pat.add_argument("--nume", required=True)
+    p_ward = sub.add_parser("sectie", help="downsampled daily trend of a ward")
+    p_ward.add_argument("--sectie", default=None)
+    for p in (p_pat, p_ward):
+        p.add_argument("--root", default=str(SNAPSHOT_DIR))
+        p.add_argument("--days", type=int, default=None, help="window ending now (default: all history)")
+        p.add_argument("--points", type=int, default=MAX_POINTS)
+    p_bench = sub.add_parser("bench", help="LTTB timing on a synthetic series")
+    p_bench.add_argument("--n", type=int, default=200_000)
+    p_bench.add_argument("--points", type=int, default=MAX_POINTS)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "bench":
+        rng = np.random.default_rng(0)
+        x = np.arange(args.n, dtype=float)
+        y = np.cumsum(rng.normal(0, 1, args.n))
+        t0 = time.perf_counter()
+        idx = lttb(x, y, args.points)
+        print(f"{args.n} -> {len(idx)} puncte în {(time.perf_counter() - t0) * 1000:.1f} ms "
+              f"(min {y.min():.1f}/{y[idx].min():.1f}, max {y.max():.1f}/{y[idx].max():.1f})")
+        return 0
+
+    since = (pd.Timestamp.now() - pd.Timedelta(days=args.days)).isoformat() if args.days else None
+    store = SnapshotStore(Path(args.root))
+    t0 = time.perf_counter()
+    if args.cmd == "pacient":
+        series = patient_trend(store, args.nume, since, max_points=args.points)
+        values = series['y']
+    else:
+        series = ward_trend(store, args.sectie, since, max_points=args.points)
+        values = series['medie']
+    print(f"{series['n']} -> {len(series['x'])} puncte în {(time.perf_counter() - t0) * 1000:.1f} ms")
+    for x, v in zip(series['x'], values):
+        print(f"  {x}  {v}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Monte Carlo uncertainty for evaluations with pending results
+
+Inputs listed in `payload['inputuri_lipsa']` (e.g. PCT, lactate, cultures not back yet) are
+sampled from the empirical distribution of that input in the patient's sectie (the whole
+hospital when the ward has too few observations). The engine is additive across the components
+these inputs feed (SOFA x3, laboratory markers, culture), so each missing input is turned once
+into a table of score deltas over representative values of its distribution; the draws are then
+plain array indexing and a sum, fully vectorised. The result is the score distribution, the
+probability of each risk level and, per missing input, how much knowing it would reduce the
+uncertainty about the level (expected information gain, in bits).
+
+Time a ward of synthetic patients:
+    python epimind_uncertainty.py bench --patients 40 --draws 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from epimind_snapshots import SnapshotStore, SNAPSHOT_DIR
+
+# name -> (label, path in payload, engine component it feeds)
+UNCERTAIN_INPUTS: Dict[str, Tuple[str, Tuple[str, ...], str]] = {
+    'pao2_fio2': ('PaO2/FiO2', ('pao2_fio2',), 'sofa'),
+    'trombocite': ('Trombocite', ('trombocite',), 'sofa'),
+    'bilirubina': ('Bilirubină', ('bilirubina',), 'sofa'),
+    'creatinina': ('Creatinină', ('creatinina',), 'sofa'),
+    'wbc': ('Leucocite (WBC)', ('analize', 'wbc'), 'laborator'),
+    'crp': ('CRP', ('analize', 'crp'), 'laborator'),
+    'esr': ('VSH / ESR', ('analize', 'esr'), 'laborator'),
+    'pct': ('Procalcitonină', ('analize', 'pct'), 'laborator'),
+    'presepsin': ('Presepsină', ('analize', 'presepsin'), 'laborator'),
+    'lactate': ('Lactat', ('analize', 'lactate'), 'laborator'),
+    'blood_culture_positive': ('Hemocultură', ('analize', 'blood_culture_positive'), 'laborator'),
+    'cultura_pozitiva': ('Cultură', ('cultura_pozitiva',), 'cultura'),
+}
+DRAWS = 4000
+GRID = 64            # representative values per input (quantiles of its empirical distribution)
+RESERVOIR = 4096     # observations kept per (sectie, input)
+MIN_WARD_POOL = 30   # below this the hospital-wide distribution is used
+
+
+def _get(payload: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    value: Any = payload
+    for k in path:
+        value = (value or {}).get(k)
+    return value
+
+
+def _with(payload: Dict[str, Any], path: Tuple[str, ...], value: Any) -> Dict[str, Any]:
+    if len(path) == 1:
+        return {**payload, path[0]: value}
+    return {**payload, path[0]: {**(payload.get(path[0]) or {}), path[1]: value}}
+
+
+def _points(engine, rules, component: str, payload: Dict[str, Any], path: Tuple[str, ...]) -> Callable[[Any], int]:
+    """Score points the input's component adds to `calculate_iaam_risk`, as a function of the input value."""
+    if component == 'laborator':
+        # Laboratory markers add up independently: score the marker on its own.
+        return lambda v: engine.score_laboratory_markers({path[-1]: v}, rules)[0]
+    if component == 'sofa':
+        return lambda v: 3 * engine.calculate_sofa_detailed(_with(payload, path, v))[0]
+    return lambda v: engine.calculate_iaam_risk(_with(payload, path, v), rules)[0]
+
+
+class EmpiricalPools:
+    """Bounded reservoir of observed values per (sectie, input), fed from the snapshot store.
+
+    `defaults` is a payload holding the form's widget defaults: a numeric input exactly at its default
+    was most likely never entered and is not pooled. Checkbox inputs are always pooled, since an
+    untouched box cannot be told apart from a negative result.
+    """
+
+    def __init__(self, reservoir: int = RESERVOIR, seed: int = 0, defaults: Optional[Dict[str, Any]] = None):
+        self.reservoir = reservoir
+        self.defaults = defaults or {}
+        self.last_eval_id = 0
+        self._values: Dict[Tuple[str, str], List[float]] = {}
+        self._seen: Dict[Tuple[str, str], int] = {}
+        self._cache: Dict[Tuple[str, str], np.ndarray] = {}
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def _push(self, key: Tuple[str, str], value: float) -> None:
+        vals = self._values.setdefault(key, [])
+        seen = self._seen.get(key, 0) + 1
+        self._seen[key] = seen
+        if len(vals) < self.reservoir:
+            vals.append(value)
+        else:
+            j = int(self._rng.integers(0, seen))
+            if j < self.reservoir:
+                vals[j] = value
+        self._cache.pop(key, None)
+
+    def add(self, payload: Dict[str, Any]) -> None:
+        """Record the measured (not pending, not left at the widget default) inputs of one evaluation under its
+        sectie and hospital-wide ('')."""
+        lipsa = set(payload.get('inputuri_lipsa') or ())
+        sectie = str(payload.get('sectie') or '')
+        with self._lock:
+            for name, (_, path, _) in UNCERTAIN_INPUTS.items():
+                if name in lipsa:
+                    continue
+                value = _get(payload, path)
+                if value is None or value == '':
+                    continue
+                try:
+                    v = float(value)
+                except (TypeError, ValueError):
+                    continue
+                default = _get(self.defaults, path)
+                if default is not None and not isinstance(default, bool) and v == float(default):
+                    continue
+                self._push((sectie, name), v)
+                if sectie:
+                    self._push(('', name), v)
+
+    def sync(self, store: SnapshotStore) -> int:
+        """Add every evaluation recorded since the last sync. Returns the number added.
+
+        Serialised: two sessions syncing at once would otherwise both read from the same last id and pool
+        those evaluations twice.
+        """
+        added = 0
+        with self._sync_lock:
+            for row, payload in store.iter_payloads(self.last_eval_id):
+                self.add(payload)
+                self.last_eval_id = row['id']
+                added += 1
+        return added
+
+    def pool(self, sectie: Any, name: str) -> Tuple[np.ndarray, str]:
+        """Observed values for the ward, else hospital-wide; the second item names the source."""
+        for key, source in (((str(sectie or ''), name), 'secție'), (('', name), 'spital')):
+            with self._lock:
+                arr = self._cache.get(key)
+                if arr is None and key in self._values:
+                    arr = self._cache[key] = np.sort(np.asarray(self._values[key], dtype=float))
+            if arr is not None and (len(arr) >= MIN_WARD_POOL or source == 'spital') and len(arr):
+                return arr, source
+        return np.empty(0), 'indisponibil'
+
+
+def _grid(pool: np.ndarray, size: int = GRID) -> np.ndarray:
+    """Equiprobable representative values: observed values at the mid-quantiles of the pool."""
+    if len(pool) <= size:
+        return pool
+    q = (np.arange(size) + 0.5) / size
+    return np.quantile(pool, q, method='inverted_cdf')
+
+
+def _entropy(counts: np.ndarray) -> np.ndarray:
+    total = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.where(total > 0, counts / total, 0.0)
+        return -np.sum(np.where(p > 0, p * np.log2(p), 0.0), axis=-1)
+
+
+def simulate(payload: Dict[str, Any], pools: EmpiricalPools, engine, draws: int = DRAWS, seed: Optional[int] = 0) -> Dict[str, Any]:
+    """Score distribution, level probabilities and fetch priorities for one payload."""
+    rules = engine.current_rules()
+    scor, nivel, _, _ = engine.calculate_iaam_risk(payload, rules)
+    levels = list(rules.level_names)
+    lipsa = [n for n in (payload.get('inputuri_lipsa') or ()) if n in UNCERTAIN_INPUTS]
+    result: Dict[str, Any] = {
+        'scor': scor, 'nivel': nivel, 'inputuri_lipsa': lipsa, 'extrageri': 0,
+        'scor_p05': scor, 'scor_p50': scor, 'scor_p95': scor, 'scor_mediu': float(scor),
+        'probabilitati': {lvl: float(lvl == nivel) for lvl in levels}, 'prioritate': [],
+    }
+    if not lipsa or nivel not in levels:  # nothing pending, or excluded by the temporal criterion
+        return result
+
+    rng = np.random.default_rng(seed)
+    total = np.full(draws, float(scor))
+    codes: List[Tuple[Dict[str, Any], np.ndarray, np.ndarray]] = []
+    for name in lipsa:
+        label, path, component = UNCERTAIN_INPUTS[name]
+        pool, source = pools.pool(payload.get('sectie'), name)
+        info = {'input': name, 'eticheta': label, 'sursa': source, 'n': int(len(pool))}
+        if not len(pool):
+            codes.append((info, np.zeros(draws, dtype=np.int64), np.zeros(1)))
+            continue
+        values = _grid(pool)
+        points = _points(engine, rules, component, payload, path)
+        current = points(_get(payload, path))
+        as_bool = name in ('blood_culture_positive', 'cultura_pozitiva')
+        distinct, slot = np.unique(values, return_inverse=True)
+        delta = np.array([points(bool(v) if as_bool else float(v)) - current for v in distinct], dtype=float)[slot]
+        # Inputs only matter through the distinct deltas they produce: group draws by those.
+        uniq, inverse = np.unique(delta, return_inverse=True)
+        pick = inverse[rng.integers(0, len(values), draws)]
+        total += uniq[pick]
+        codes.append((info, pick, uniq))
+
+    level_idx = rules.level_index(total)
+    k = len(levels)
+    counts = np.bincount(level_idx, minlength=k).astype(float)
+    h_total = float(_entropy(counts))
+    for info, pick, uniq in codes:
+        joint = np.bincount(pick * k + level_idx, minlength=len(uniq) * k).reshape(len(uniq), k).astype(float)
+        weights = joint.sum(axis=1) / draws
+        gain = h_total - float(np.sum(weights * _entropy(joint)))
+        info['informatie_biti'] = round(max(0.0, gain), 3)
+        info['dispersie_puncte'] = round(float(np.sqrt(np.sum(weights * (uniq - np.sum(weights * uniq)) ** 2))), 2)
+        result['prioritate'].append(info)
+    result['prioritate'].sort(key=lambda r: (r['informatie_biti'], r['dispersie_puncte']), reverse=True)
+
+    p05, p50, p95 = np.percentile(total, [5, 50, 95])
+    result.update({
+        'extrageri': draws,
+        'scor_p05': int(p05), 'scor_p50': int(p50), 'scor_p95': int(p95), 'scor_mediu': float(total.mean()),
+        'probabilitati': {lvl: float(c / draws) for lvl, c in zip(levels, counts)},
+    })
+    return result
+
+
+def simulate_ward(payloads: Sequence[Dict[str, Any]], pools: EmpiricalPools, engine, draws: int = DRAWS) -> List[Dict[str, Any]]:
+    """`simulate` for every patient of a ward (reproducible: seeded by position)."""
+    return [simulate(p, pools, engine, draws, seed=i) for i, p in enumerate(payloads)]
+
+
+def _synthetic(rng: np.random.Generator, i: int) -> Dict[str, Any]:
+    sectii = ['ATI', 'Chirurgie', 'Medicină Internă', 'Pediatrie', 'Neonatologie']
+    return {
+        'nume_pacient': f'P{i:05d}', 'sectie': sectii[i % len(sectii)], 'ore_spitalizare': int(rng.integers(48, 600)),
+        'dispozitive': {'CVC': {'prezent': bool(rng.random() < 0.5), 'zile': int(rng.integers(0, 15))}},
+        'pao2_fio2': int(rng.normal(300, 90)), 'trombocite': int(rng.normal(200, 80)),
+        'bilirubina': float(rng.lognormal(0, 0.6)), 'glasgow': 15, 'creatinina': float(rng.lognormal(0, 0.5)),
+        'tas': 120, 'fr': 18, 'cultura_pozitiva': bool(rng.random() < 0.3), 'profil_rezistenta': [],
+        'analize': {
+            'wbc': float(rng.lognormal(2.2, 0.4)), 'crp': float(rng.lognormal(3.5, 1.0)), 'esr': float(rng.normal(30, 15)),
+            'pct': float(rng.lognormal(-1, 1.2)), 'presepsin': float(rng.lognormal(5.5, 0.7)),
+            'lactate': float(rng.lognormal(0.4, 0.5)), 'blood_culture_positive': bool(rng.random() < 0.15),
+        },
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind Monte Carlo uncertainty for pending inputs")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="simulate a synthetic ward with PCT, lactate and cultures pending")
+    b.add_argument("--patients", type=int, default=40)
+    b.add_argument("--draws", type=int, default=DRAWS)
+    b.add_argument("--history", type=int, default=5000, help="synthetic evaluations feeding the pools")
+    s = sub.add_parser("pools", help="observations available per input in the snapshot store")
+    s.add_argument("--root", default=str(SNAPSHOT_DIR))
+    args = parser.parse_args(argv)
+
+    from epimind_batch import load_engine
+    engine = load_engine()
+    pools = EmpiricalPools()
+    if args.cmd == "pools":
+        from pathlib import Path
+        pools.sync(SnapshotStore(Path(args.root)))
+        for name, (label, _, _) in UNCERTAIN_INPUTS.items():
+            arr, source = pools.pool('', name)
+            print(f"{label:<20} n={len(arr):<6} sursa={source}")
+        return 0
+
+    rng = np.random.default_rng(0)
+    for i in range(args.history):
+        pools.add(_synthetic(rng, i))
+    ward = []
+    for i in range(args.patients):
+        p = _synthetic(rng, i)
+        p['inputuri_lipsa'] = ['pct', 'lactate', 'presepsin', 'cultura_pozitiva', 'blood_culture_positive']
+        ward.append(p)
+    t0 = time.perf_counter()
+    results = simulate_ward(ward, pools, engine, args.draws)
+    elapsed = time.perf_counter() - t0
+    r = results[0]
+    print(f"{ward[0]['nume_pacient']}: scor {r['scor']} -> p05 {r['scor_p05']} / p50 {r['scor_p50']} / p95 {r['scor_p95']}")
+    print("  " + ", ".join(f"{k} {v:.0%}" for k, v in r['probabilitati'].items()))
+    print("  de obținut întâi: " + ", ".join(f"{p['eticheta']} ({p['informatie_biti']} biți)" for p in r['prioritate']))
+    print(f"{args.patients} pacienți x {args.draws} extrageri în {elapsed * 1000:.1f} ms "
+          f"({elapsed * 1000 / max(args.patients, 1):.2f} ms/pacient)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
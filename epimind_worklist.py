@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+EpiMind — Ward worklist store
+
+Persistent SQLite store holding the latest payload, score and level for every current
+patient. The worklist page reads it with server-side sort, filter and pagination, while an
+evaluation only upserts the row of the evaluated patient (no other patient is rescored).
+
+Benchmark the list latency for a ward of 500 patients:
+    python epimind_worklist.py bench --patients 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+WORKLIST_DB = "epimind_worklist.sqlite3"
+# Opening one worklist page (count + page query) must stay below this budget for 500 patients.
+LIST_LATENCY_BUDGET_MS = 50.0
+SORT_COLUMNS = {
+    "scor": "scor",
+    "actualizat": "updated_at",
+    "pacient": "pacient",
+    "ore_spitalizare": "ore_spitalizare",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    pacient TEXT PRIMARY KEY,
+    sectie TEXT,
+    ore_spitalizare INTEGER,
+    scor INTEGER NOT NULL,
+    nivel TEXT NOT NULL,
+    agent TEXT,
+    payload_hash TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_patients_scor ON patients (scor);
+CREATE INDEX IF NOT EXISTS ix_patients_sectie_scor ON patients (sectie, scor);
+CREATE INDEX IF NOT EXISTS ix_patients_updated ON patients (updated_at);
+"""
+
+
+def payload_digest(payload: Dict[str, Any]) -> str:
+    """Stable hash of a payload, used to skip rewrites when the inputs did not change."""
+    canon = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(canon.encode("utf-8")).hexdigest()
+
+
+class PatientStore:
+    """Latest evaluation per patient, keyed by `nume_pacient`."""
+
+    def __init__(self, path: str = WORKLIST_DB):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.path, timeout=10)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.row_factory = sqlite3.Row
+            yield con
+            con.commit()
+        finally:
+            con.close()
+
+    def upsert(self, payload: Dict[str, Any], scor: int, nivel: str, timestamp: Optional[str] = None) -> bool:
+        """Store the latest evaluation of one patient. Returns False when nothing changed."""
+        pacient = payload.get("nume_pacient")
+        if not pacient:
+            raise ValueError("payload fără 'nume_pacient'")
+        digest = payload_digest(payload)
+        row = (
+            pacient, payload.get("sectie"), payload.get("ore_spitalizare"), int(scor), nivel,
+            payload.get("bacterie"), digest, json.dumps(payload, ensure_ascii=False, default=str),
+            timestamp or datetime.now().isoformat(),
+        )
+        with self._lock, self._connect() as con:
+            prev = con.execute("SELECT payload_hash, scor, nivel FROM patients WHERE pacient = ?", (pacient,)).fetchone()
+            if prev and prev["payload_hash"] == digest and prev["scor"] == int(scor) and prev["nivel"] == nivel:
+                return False
+            con.execute(
+                "INSERT INTO patients (pacient, sectie, ore_spitalizare, scor, nivel, agent, payload_hash, payload, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(pacient) DO UPDATE SET sectie=excluded.sectie, ore_spitalizare=excluded.ore_spitalizare, "
+                "scor=excluded.scor, nivel=excluded.nivel, agent=excluded.agent, payload_hash=excluded.payload_hash, "
+                "payload=excluded.payload, updated_at=excluded.updated_at",
+                row,
+            )
+        return True
+
+    def get(self, pacient: str) -> Optional[Dict[str, Any]]:
+        """Return the stored payload of one patient, or None."""
+        with self._connect() as con:
+            row = con.execute("SELECT payload FROM patients WHERE pacient = ?", (pacient,)).fetchone()
+        return json.loads(row["payload"]) if row else None
+
+    def remove(self, pacient: str) -> None:
+        """Drop a discharged patient from the worklist (the snapshot history is kept)."""
+        with self._lock, self._connect() as con:
+            con.execute("DELETE FROM patients WHERE pacient = ?", (pacient,))
+
+    def query(
+        self,
+        sectie: Optional[str] = None,
+        niveluri: Optional[Sequence[str]] = None,
+        search: str = "",
+        order_by: str = "scor",
+        descending: bool = True,
+        limit: int = 25,
+        offset: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """One worklist page (summary columns only) plus the total number of matching patients."""
+        where: List[str] = []
+        params: List[Any] = []
+        if sectie:
+            where.append("sectie = ?"); params.append(sectie)
+        if niveluri:
+            where.append("nivel IN (%s)" % ",".join("?" * len(niveluri))); params.extend(niveluri)
+        if search:
+            # a prefix match: LIKE wildcards typed in the search box are matched literally
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("pacient LIKE ? ESCAPE '\\'"); params.append(f"{escaped}%")
+        clause = (" WHERE " + " AND ".join(where)) if where else ""
+        column = SORT_COLUMNS.get(order_by, "scor")
+        direction = "DESC" if descending else "ASC"
+        with self._connect() as con:
+            total = con.execute(f"SELECT COUNT(*) FROM patients{clause}", params).fetchone()[0]
+            rows = con.execute(
+                f"SELECT pacient, sectie, ore_spitalizare, scor, nivel, agent, updated_at FROM patients{clause} "
+                f"ORDER BY {column} {direction}, pacient ASC LIMIT ? OFFSET ?",
+                params + [int(limit), int(offset)],
+            ).fetchall()
+        return [dict(r) for r in rows], int(total)
+
+
+# ---------------- CLI: latency benchmark ----------------
+
+def _synthetic_payload(i: int, rng: random.Random) -> Dict[str, Any]:
+    return {
+        "nume_pacient": f"Pacient_{i:04d}",
+        "sectie": rng.choice(["ATI", "Chirurgie", "Medicină Internă", "Pediatrie", "Neonatologie"]),
+        "ore_spitalizare": rng.randint(0, 2000),
+        "bacterie": rng.choice(["", "Klebsiella pneumoniae", "Escherichia coli"]),
+    }
+
+
+def bench(patients: int, repeats: int = 50) -> float:
+    """Seed a temporary store and return the worst page-open latency in milliseconds."""
+    rng = random.Random(0)
+    levels = ["SCĂZUT", "MODERAT", "ÎNALT", "FOARTE ÎNALT", "CRITIC"]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PatientStore(str(Path(tmp) / "bench.sqlite3"))
+        for i in range(patients):
+            store.upsert(_synthetic_payload(i, rng), rng.randint(0, 200), rng.choice(levels))
+        worst = 0.0
+        for r in range(repeats):
+            t0 = time.perf_counter()
+            store.query(sectie="ATI" if r % 2 else None, limit=25, offset=(r % 4) * 25)
+            worst = max(worst, (time.perf_counter() - t0) * 1000)
+    return worst
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EpiMind ward worklist store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="measure worklist page latency")
+    b.add_argument("--patients", type=int, default=500)
+    args = parser.parse_args(argv)
+    if args.cmd == "bench":
+        worst = bench(args.patients)
+        print(f"{args.patients} pacienți: latență maximă {worst:.1f} ms (țintă {LIST_LATENCY_BUDGET_MS:.0f} ms)")
+        return 0 if worst <= LIST_LATENCY_BUDGET_MS else 1
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())